@@ -1,9 +1,15 @@
 from app.api import bp
-from flask import jsonify, request
-from app.models import db, Producteur, Produit, Etape
-from app.blockchain import get_contract, get_web3
+from flask import jsonify, request, current_app, Response
+from app.models import db, Producteur, Produit, Etape, SyncBloc, SyncCurseur
+from app.blockchain import get_web3, get_batch_caller, lire_evenements
+from reconcile import reconcile
+from blockchain import DataSecurity
+from sharded_chain import ShardedDataSecurity
+from product_authentication import ProductAuthenticator
+from prix_historique import PrixHistorique
+from journal_evenements import cle, etapes_par_produit, hex_hash, indexer_etapes, point_de_fork
 import pandas as pd
-from datetime import datetime
+from datetime import datetime, timedelta
 from sqlalchemy import func
 import os
 import matplotlib
@@ -11,85 +17,165 @@ matplotlib.use('Agg')  # Pour générer des graphiques sans interface graphique
 import matplotlib.pyplot as plt
 import seaborn as sns
 
+EVENEMENTS_SYNC = ('ProducteurAjoute', 'ProduitEnregistre', 'EtapeAjoutee')
+
+def lire_curseurs():
+    # Mêmes curseurs que oracle_service : -1 pour un événement jamais synchronisé
+    curseurs = dict(db.session.query(SyncCurseur.evenement, SyncCurseur.dernier_bloc)
+                    .filter(SyncCurseur.evenement.in_(EVENEMENTS_SYNC)))
+    return {nom: curseurs.get(nom, -1) for nom in EVENEMENTS_SYNC}
+
+def avancer_curseurs(bloc):
+    # Le curseur ne recule jamais : l'oracle peut l'avancer de son côté
+    for nom in EVENEMENTS_SYNC:
+        curseur = db.session.get(SyncCurseur, nom, with_for_update=True)
+        if curseur is None:
+            db.session.add(SyncCurseur(evenement=nom, dernier_bloc=bloc, date_maj=datetime.now()))
+        elif curseur.dernier_bloc < bloc:
+            curseur.dernier_bloc = bloc
+            curseur.date_maj = datetime.now()
+
+def verifier_reorganisation(web3):
+    """
+    Même contrôle que oracle_service : si un bloc enregistré n'est plus sur la
+    chaîne, les lignes des blocs postérieurs au dernier bloc commun sont
+    supprimées et les curseurs y sont ramenés. Retourne ce bloc, ou None.
+    """
+    def hash_chaine(numeros):
+        return {numero: hex_hash(web3.eth.get_block(numero)['hash']) for numero in numeros}
+    
+    fork = point_de_fork(db.session.query(SyncBloc.numero, SyncBloc.hash).all(), hash_chaine)
+    if fork is not None:
+        for modele in (Etape, Produit, Producteur):
+            modele.query.filter(modele.bloc > fork).delete(synchronize_session=False)
+        SyncCurseur.query.filter(SyncCurseur.dernier_bloc > fork).update(
+            {'dernier_bloc': fork, 'date_maj': datetime.now()}, synchronize_session=False)
+        SyncBloc.query.filter(SyncBloc.numero > fork).delete(synchronize_session=False)
+        db.session.commit()
+    return fork
+
+def enregistrer_blocs(blocs):
+    # Hash {numéro: hash} des blocs ingérés, visibles aussi du contrôle de réorganisation de l'oracle
+    for numero, hash_bloc in blocs.items():
+        db.session.merge(SyncBloc(numero=numero, hash=hex_hash(hash_bloc)))
+    SyncBloc.query.filter(
+        SyncBloc.numero < max(blocs) - current_app.config['BLOCS_CONSERVES']).delete(synchronize_session=False)
+
 # Route pour synchroniser les données de la blockchain
 @bp.route('/sync', methods=['GET'])
 def sync_blockchain():
     try:
-        contract = get_contract()
         web3 = get_web3()
+        batch_caller = get_batch_caller()
+        
+        # Lignes issues de blocs orphelins annulées avant de reprendre depuis les curseurs
+        verifier_reorganisation(web3)
+        
+        # Seuls les blocs ayant assez de confirmations sont lus : une réorganisation plus courte ne les touche pas
+        tete = web3.eth.block_number - current_app.config['CONFIRMATIONS']
+        curseurs = lire_curseurs()
+        depuis = min(curseurs.values()) + 1
+        if tete < depuis:
+            return jsonify({'status': 'success', 'message': 'Aucun bloc confirmé à synchroniser'})
         
-        # Synchroniser les producteurs
-        producteur_filter = contract.events.ProducteurAjoute.createFilter(fromBlock=0)
-        producteur_events = producteur_filter.get_all_entries()
+        # Journaux des trois événements depuis le plus ancien curseur, lus par fenêtres de blocs
+        # parallèles et remis dans l'ordre de la chaîne ; chaque type reprend après son propre curseur
+        evenements = lire_evenements(EVENEMENTS_SYNC, depuis, tete)
+        evenements = {nom: [event for event in events if event['blockNumber'] > curseurs[nom]]
+                      for nom, events in evenements.items()}
+        
+        # Synchroniser les producteurs (identifiants déjà en base lus en une requête)
+        producteur_events = evenements['ProducteurAjoute']
+        ids = list({event['args']['id'] for event in producteur_events})
+        existants = {pid for (pid,) in db.session.query(Producteur.id).filter(Producteur.id.in_(ids))}
         
         for event in producteur_events:
             args = event['args']
-            producteur = Producteur.query.get(args['id'])
-            if not producteur:
+            if args['id'] not in existants:
+                existants.add(args['id'])
                 producteur = Producteur(
                     id=args['id'],
                     nom=args['nom'],
                     region=args['region'],
-                    date_ajout=datetime.now()
+                    date_ajout=datetime.now(),
+                    bloc=event['blockNumber']
                 )
                 db.session.add(producteur)
         
         # Synchroniser les produits
-        produit_filter = contract.events.ProduitEnregistre.createFilter(fromBlock=0)
-        produit_events = produit_filter.get_all_entries()
+        produit_events = evenements['ProduitEnregistre']
         
+        ids = list({event['args']['id'] for event in produit_events})
+        existants = {pid for (pid,) in db.session.query(Produit.id).filter(Produit.id.in_(ids))}
+        nouveaux = {}
         for event in produit_events:
             args = event['args']
-            produit = Produit.query.get(args['id'])
-            if not produit:
-                # Récupérer les détails du produit depuis le contrat
-                produit_details = contract.functions.obtenirProduit(args['id']).call()
-                
-                produit = Produit(
-                    id=args['id'],
-                    nom=args['nom'],
-                    producteur_id=args['idProducteur'],
-                    region=produit_details[3],  # Indice de région dans le retour de la fonction
-                    date_recolte=datetime.fromtimestamp(produit_details[4]),  # Timestamp Unix
-                    est_bio=produit_details[5]  # Est biologique
-                )
-                db.session.add(produit)
+            if args['id'] not in nouveaux and args['id'] not in existants:
+                nouveaux[args['id']] = event
+        
+        # Récupérer les détails des produits depuis le contrat, par requêtes batch
+        details = batch_caller.call_many('obtenirProduit', [(produit_id,) for produit_id in nouveaux])
+        for event, produit_details in zip(nouveaux.values(), details):
+            args = event['args']
+            produit = Produit(
+                id=args['id'],
+                nom=args['nom'],
+                producteur_id=args['idProducteur'],
+                region=produit_details[3],  # Indice de région dans le retour de la fonction
+                date_recolte=datetime.fromtimestamp(produit_details[4]),  # Timestamp Unix
+                est_bio=produit_details[5],  # Est biologique
+                bloc=event['blockNumber']
+            )
+            db.session.add(produit)
+            # Étape 0 (récolte), ajoutée par enregistrerProduit : identifiée par le log ProduitEnregistre
+            bloc, bloc_hash, tx_hash, log_index = cle(event)
+            db.session.add(Etape(
+                produit_id=args['id'],
+                date=datetime.fromtimestamp(produit_details[4]),
+                operation='Recolte',
+                operateur=args['idProducteur'],
+                lieu=produit_details[3],
+                temperature=25.0,
+                humidite=60.0,
+                bloc=bloc, bloc_hash=bloc_hash, tx_hash=tx_hash, log_index=log_index
+            ))
         
         # Synchroniser les étapes
-        etape_filter = contract.events.EtapeAjoutee.createFilter(fromBlock=0)
-        etape_events = etape_filter.get_all_entries()
+        etape_events = evenements['EtapeAjoutee']
         
-        for event in etape_events:
-            args = event['args']
-            # Vous devrez récupérer les détails de l'étape depuis le contrat
-            produit_id = args['idProduit']
-            etapes_count = contract.functions.nombreEtapes(produit_id).call()
-            
-            # Récupérer toutes les étapes du produit
-            for i in range(etapes_count):
-                etape_details = contract.functions.obtenirEtape(produit_id, i).call()
-                
-                # Vérifier si cette étape existe déjà
-                existing_etape = Etape.query.filter_by(
-                    produit_id=produit_id, 
-                    operation=etape_details[1],
-                    operateur=etape_details[2],
-                    lieu=etape_details[3]
-                ).first()
-                
-                if not existing_etape:
-                    etape = Etape(
-                        produit_id=produit_id,
-                        date=datetime.fromtimestamp(etape_details[0]),
-                        operation=etape_details[1],
-                        operateur=etape_details[2],
-                        lieu=etape_details[3],
-                        # Données supplémentaires (fictives pour l'exemple)
-                        temperature=25.0,
-                        humidite=60.0
-                    )
-                    db.session.add(etape)
+        # Une étape est identifiée par son log (bloc, transaction, indice) et non par son contenu :
+        # deux opérations identiques restent deux étapes, un même log n'est écrit qu'une fois
+        produit_ids = list(dict.fromkeys(event['args']['idProduit'] for event in etape_events))
+        # L'étape 0 de chaque produit vient de son log ProduitEnregistre, même pour les lignes déjà en base
+        # Les étapes antérieures à l'identité par log (colonnes NULL) comptent en tête, dans leur ordre d'écriture
+        connues = etapes_par_produit(
+            db.session.query(Etape.produit_id, Etape.bloc, Etape.bloc_hash, Etape.tx_hash, Etape.log_index)
+            .filter(Etape.produit_id.in_(produit_ids)).order_by(Etape.id))
+        for event in produit_events:
+            connues.setdefault(event['args']['id'], []).append(cle(event))
+        nouvelles = indexer_etapes(connues, etape_events)
         
+        appels = [(event['args']['idProduit'], indice) for event, indice in nouvelles]
+        for (event, _), etape_details in zip(nouvelles, batch_caller.call_many('obtenirEtape', appels)):
+            bloc, bloc_hash, tx_hash, log_index = cle(event)
+            etape = Etape(
+                produit_id=event['args']['idProduit'],
+                date=datetime.fromtimestamp(etape_details[0]),
+                operation=etape_details[1],
+                operateur=etape_details[2],
+                lieu=etape_details[3],
+                # Données supplémentaires (fictives pour l'exemple)
+                temperature=25.0,
+                humidite=60.0,
+                bloc=bloc, bloc_hash=bloc_hash, tx_hash=tx_hash, log_index=log_index
+            )
+            db.session.add(etape)
+        
+        # Les curseurs avancent dans la même transaction que les insertions et les hash des blocs lus
+        blocs = {event['blockNumber']: event['blockHash'] for events in evenements.values() for event in events}
+        blocs[tete] = web3.eth.get_block(tete)['hash']
+        enregistrer_blocs(blocs)
+        avancer_curseurs(tete)
         db.session.commit()
         return jsonify({'status': 'success', 'message': 'Données synchronisées avec succès'})
     
@@ -97,6 +183,72 @@ def sync_blockchain():
         db.session.rollback()
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
+# Route pour réconcilier les data_hash de la base avec la blockchain
+@bp.route('/reconciliation', methods=['GET'])
+def reconciliation():
+    try:
+        rapport = reconcile(
+            db.engine,
+            current_app.config['BLOCKCHAIN_STORAGE_PATH'],
+            chunk_size=request.args.get('chunk_size', 100000, type=int),
+            sample_size=request.args.get('sample_size', 100, type=int)
+        )
+        return jsonify(rapport)
+
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+def get_product_authenticator():
+    # Un service par processus, créé à la première requête et partagé ensuite
+    authenticator = current_app.extensions.get('product_authenticator')
+    if authenticator is None:
+        # Lecture seule : la chaîne est écrite par le tableau de bord, jamais par cette route
+        storage_path = current_app.config['BLOCKCHAIN_STORAGE_PATH']
+        if current_app.config.get('BLOCKCHAIN_SHARDED'):
+            data_security = ShardedDataSecurity(storage_path, read_only=True)
+        else:
+            data_security = DataSecurity(storage_path, read_only=True)
+        authenticator = ProductAuthenticator(data_security, db.engine,
+                                             refresh_interval=current_app.config['AUTH_REFRESH_INTERVAL'])
+        current_app.extensions['product_authenticator'] = authenticator
+    return authenticator
+
+# Route publique d'authentification d'un produit (hash scanné ou identifiant)
+@bp.route('/authentification/<identifiant>', methods=['GET'])
+def authentification(identifiant):
+    entry = get_product_authenticator().lookup(identifiant)
+    headers = {
+        'ETag': entry.etag,
+        'Cache-Control': f'public, max-age={entry.max_age}'
+    }
+    # Comparaison faible, étiquette par étiquette (W/"..." et * compris)
+    if request.if_none_match.contains_weak(entry.etag.strip('"')):
+        return Response(status=304, headers=headers)
+    return Response(entry.body, status=entry.status, mimetype='application/json', headers=headers)
+
+# Route pour l'historique des prix d'un produit (agrégat choisi selon la résolution demandée)
+@bp.route('/prix/<produit_id>', methods=['GET'])
+def historique_prix(produit_id):
+    try:
+        fin = datetime.fromisoformat(request.args['fin']) if 'fin' in request.args else datetime.now()
+        debut = datetime.fromisoformat(request.args['debut']) if 'debut' in request.args else fin - timedelta(days=30)
+        conn = db.engine.raw_connection()
+        try:
+            historique = PrixHistorique.pour_connexion(conn.driver_connection)
+            serie = historique.historique(
+                conn, produit_id, debut, fin,
+                pas=request.args.get('pas', type=float),
+                points=request.args.get('points', 500, type=int)
+            )
+        finally:
+            conn.close()
+        return jsonify({'produit_id': produit_id, 'debut': debut.isoformat(), 'fin': fin.isoformat(), **serie})
+
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
 # Route pour obtenir des statistiques par région
 @bp.route('/stats/regions', methods=['GET'])
 def stats_regions():
@@ -2,9 +2,13 @@ from web3 import Web3
 from flask import current_app
 import json
 import os
+from rpc_batch import BatchCaller, contract_events, log_topic
+from recuperation_journaux import RecuperateurJournaux
 
 _web3 = None
 _contract = None
+_batch_caller = None
+_recuperateur = None
 
 def get_web3():
     global _web3
@@ -18,7 +22,7 @@ def get_contract():
         web3 = get_web3()
         
         # Charger l'ABI du contrat
-        contract_json_path = os.path.join(
+        contract_json_path = current_app.config.get('CONTRACT_ARTIFACT') or os.path.join(
             os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
             'build/contracts/TracabiliteAgricoleMaroc.json'
         )
@@ -31,4 +35,41 @@ def get_contract():
         
         _contract = web3.eth.contract(address=contract_address, abi=contract_abi)
     
-    return _contract
\ No newline at end of file
+    return _contract
+
+def get_batch_caller():
+    # Lectures view du contrat regroupées en requêtes JSON-RPC batch
+    global _batch_caller
+    if _batch_caller is None:
+        _batch_caller = BatchCaller(get_contract(), current_app.config['RPC_BATCH_SIZE'])
+    return _batch_caller
+
+def get_recuperateur():
+    # Journaux lus par fenêtres de blocs parallèles, taille de fenêtre gardée entre deux requêtes
+    global _recuperateur
+    if _recuperateur is None:
+        _recuperateur = RecuperateurJournaux(current_app.config['LOGS_FENETRE'], current_app.config['LOGS_WORKERS'])
+    return _recuperateur
+
+def lire_evenements(noms, depuis, jusqua):
+    """
+    Événements `noms` du contrat entre les blocs `depuis` et `jusqua`, en un
+    seul parcours des journaux : {nom: [événement décodé, ...]} dans l'ordre de la chaîne
+    """
+    web3, contract = get_web3(), get_contract()
+    decodeurs = {decodeur.topic: decodeur for nom, decodeur in contract_events(contract.abi).items() if nom in noms}
+    
+    def get_logs(debut, fin):
+        return web3.eth.get_logs({'address': contract.address, 'fromBlock': debut, 'toBlock': fin,
+                                  'topics': [list(decodeurs)]})
+    
+    evenements = {nom: [] for nom in noms}
+    for log in get_recuperateur().recuperer(get_logs, depuis, jusqua):
+        event = decodeurs[log_topic(log)].decode(log)
+        evenements[event['event']].append(event)
+    return evenements
+
+def fermer_ressources():
+    # Oublie le fournisseur, le contrat et les caches associés (changement de nœud)
+    global _web3, _contract, _batch_caller, _recuperateur
+    _web3 = _contract = _batch_caller = _recuperateur = None
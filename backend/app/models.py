@@ -9,6 +9,7 @@ class Producteur(db.Model):
         est_verifie = db.Column(db.Boolean, default=False)
         date_ajout = db.Column(db.DateTime, default=datetime.utcnow)
         coordonnees_gps = db.Column(db.String(64))
+        bloc = db.Column(db.BigInteger)  # Bloc du log ProducteurAjoute
         produits = db.relationship('Produit', backref='producteur_relation', lazy=True)
         
         def to_dict(self):
@@ -30,6 +31,7 @@ class Produit(db.Model):
         est_bio = db.Column(db.Boolean, default=False)
         qualite_score = db.Column(db.Float)
         prix_marche = db.Column(db.Float)
+        bloc = db.Column(db.BigInteger)  # Bloc du log ProduitEnregistre
         etapes = db.relationship('Etape', backref='produit_relation', lazy=True)
         
         def to_dict(self):
@@ -53,6 +55,12 @@ class Etape(db.Model):
         lieu = db.Column(db.String(128), nullable=False)
         temperature = db.Column(db.Float)
         humidite = db.Column(db.Float)
+        # Identité du log d'origine (ProduitEnregistre pour l'étape 0, EtapeAjoutee ensuite)
+        bloc = db.Column(db.BigInteger)
+        bloc_hash = db.Column(db.String(66))
+        tx_hash = db.Column(db.String(66))
+        log_index = db.Column(db.Integer)
+        __table_args__ = (db.Index('etape_log_idx', 'bloc_hash', 'tx_hash', 'log_index', unique=True),)
         
         def to_dict(self):
             return {
@@ -66,3 +74,15 @@ class Etape(db.Model):
                 'humidite': self.humidite
             }
     
+class SyncCurseur(db.Model):
+        # Table partagée avec oracle_service : dernier bloc entièrement traité par type d'événement
+        __tablename__ = 'sync_curseur'
+        evenement = db.Column(db.String(64), primary_key=True)
+        dernier_bloc = db.Column(db.BigInteger, nullable=False)
+        date_maj = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+class SyncBloc(db.Model):
+        # Table partagée avec oracle_service : hash des blocs ingérés, pour détecter les réorganisations
+        __tablename__ = 'sync_bloc'
+        numero = db.Column(db.BigInteger, primary_key=True)
+        hash = db.Column(db.String(66), nullable=False)
@@ -0,0 +1,548 @@
+"""
+Service d'oracle asynchrone (asyncio).
+
+- Client JSON-RPC asynchrone (aiohttp) : eth_getLogs et lectures du contrat
+  en requêtes batch, avec un nombre borné de requêtes en vol.
+- Les trois flux d'événements (producteurs, produits, étapes) sont
+  synchronisés en parallèle. Chaque flux découpe (curseur + 1 .. tête) en
+  fenêtres de blocs récupérées concurremment, puis les transmet dans
+  l'ordre à son écrivain via une file bornée : si la base ralentit, la
+  récupération s'arrête (contre-pression).
+- Chaque fenêtre est écrite en une transaction qui fait aussi avancer le
+  curseur du flux. Un flux n'écrit une fenêtre qu'une fois ses dépendances
+  (producteur -> produit -> étape) écrites jusqu'au même bloc.
+- La mise à jour des prix tourne dans sa propre tâche : une synchronisation
+  lente ne la retarde pas.
+
+Base : PostgreSQL via asyncpg, ou SQLite (écritures dans un thread) si
+ORACLE_SQLITE_PATH est défini.
+
+Usage :
+    python async_oracle.py [--window 5000] [--concurrency 8]
+"""
+import argparse
+import asyncio
+import sqlite3
+import time
+from collections import deque
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence
+
+import aiohttp
+
+from bulk_upsert import ADDED_COLUMNS, OBSOLETE_INDEXES, UNIQUE_INDEXES, BulkWriter, SQLiteBulkWriter
+from journal_evenements import etapes_par_produit, indexer_etapes, point_de_fork
+from prix_historique import PrixHistorique
+from rpc_batch import BatchCallError, contract_events, contract_functions
+import oracle_service
+
+try:
+    import asyncpg
+except ImportError:
+    asyncpg = None
+
+
+# ----------------------------------------------------------------------
+# Client JSON-RPC asynchrone
+# ----------------------------------------------------------------------
+class AsyncRPC:
+    def __init__(self, url: str, batch_size: int = 100, concurrency: int = 8, timeout: float = 30):
+        self.url = url
+        self.batch_size = batch_size
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._timeout = aiohttp.ClientTimeout(total=timeout)
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._next_id = 0
+        self.requests_sent = 0
+
+    async def __aenter__(self):
+        self._session = aiohttp.ClientSession(timeout=self._timeout)
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def _payload(self, method: str, params: list) -> Dict:
+        self._next_id += 1
+        return {'jsonrpc': '2.0', 'id': self._next_id, 'method': method, 'params': params}
+
+    async def _post(self, payload):
+        async with self._semaphore:
+            self.requests_sent += 1
+            async with self._session.post(self.url, json=payload) as response:
+                response.raise_for_status()
+                return await response.json(content_type=None)
+
+    async def request(self, method: str, params: list):
+        reply = await self._post(self._payload(method, params))
+        if reply.get('error'):
+            raise BatchCallError(reply['error'])
+        return reply['result']
+
+    async def batch(self, calls: Sequence[tuple]) -> List:
+        """
+        Exécute [(méthode, params), ...] en requêtes batch concurrentes ; résultats dans l'ordre
+        """
+        chunks = [calls[i:i + self.batch_size] for i in range(0, len(calls), self.batch_size)]
+        replies = await asyncio.gather(*(self._batch_chunk(chunk) for chunk in chunks))
+        return [result for chunk in replies for result in chunk]
+
+    async def _batch_chunk(self, calls) -> List:
+        payload = [self._payload(method, params) for method, params in calls]
+        body = await self._post(payload)
+        if isinstance(body, dict):
+            raise BatchCallError(body.get('error', body))
+        replies = {item['id']: item for item in body}
+        results = []
+        for request in payload:
+            reply = replies.get(request['id'])
+            if reply is None:
+                raise BatchCallError(f"Réponse manquante pour l'appel {request['id']}")
+            if reply.get('error'):
+                raise BatchCallError(reply['error'])
+            results.append(reply['result'])
+        return results
+
+
+class AsyncContract:
+    def __init__(self, rpc: AsyncRPC, address: str, abi: List[Dict]):
+        self.rpc = rpc
+        self.address = address
+        self.functions = contract_functions(abi)
+        self.events = contract_events(abi)
+
+    async def block_number(self) -> int:
+        result = await self.rpc.request('eth_blockNumber', [])
+        return int(result, 16) if isinstance(result, str) else int(result)
+
+    async def block_hashes(self, numbers: Sequence[int]) -> Dict[int, str]:
+        blocks = await self.rpc.batch([('eth_getBlockByNumber', [hex(number), False]) for number in numbers])
+        return {number: block['hash'] for number, block in zip(numbers, blocks) if block}
+
+    async def call_many(self, fn_name: str, args_list: Sequence[Sequence]) -> List:
+        function = self.functions[fn_name]
+        calls = [('eth_call', [{'to': self.address, 'data': function.encode(args)}, 'latest'])
+                 for args in args_list]
+        return [function.decode(result) for result in await self.rpc.batch(calls)]
+
+    async def get_events(self, event_name: str, from_block: int, to_block: int) -> List[Dict]:
+        event = self.events[event_name]
+        logs = await self.rpc.request('eth_getLogs', [{
+            'address': self.address,
+            'topics': [event.topic],
+            'fromBlock': hex(from_block),
+            'toBlock': hex(to_block)
+        }])
+        return [event.decode(log) for log in logs]
+
+
+# ----------------------------------------------------------------------
+# Écrivains
+# ----------------------------------------------------------------------
+class AsyncPostgresWriter:
+    backend = 'postgresql'
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.stats: Dict[str, Dict[str, float]] = {}
+        self.historique = PrixHistorique('postgresql', '$')
+
+    @classmethod
+    async def connect(cls, db_params: Dict, min_size: int = 2, max_size: int = 10):
+        if asyncpg is None:
+            raise RuntimeError("asyncpg est requis pour l'oracle asynchrone sur PostgreSQL")
+        pool = await asyncpg.create_pool(
+            database=db_params['dbname'], user=db_params['user'], password=db_params['password'],
+            host=db_params['host'], min_size=min_size, max_size=max_size
+        )
+        return cls(pool)
+
+    async def ensure_schema(self):
+        async with self.pool.acquire() as conn:
+            await conn.execute(
+                """CREATE TABLE IF NOT EXISTS sync_curseur (
+                       evenement VARCHAR(64) PRIMARY KEY,
+                       dernier_bloc BIGINT NOT NULL,
+                       date_maj TIMESTAMP NOT NULL
+                   )"""
+            )
+            await conn.execute(
+                """CREATE TABLE IF NOT EXISTS sync_bloc (
+                       numero BIGINT PRIMARY KEY,
+                       hash VARCHAR(66) NOT NULL
+                   )"""
+            )
+            for table, column, column_type in ADDED_COLUMNS:
+                await conn.execute(f"ALTER TABLE IF EXISTS {table} ADD COLUMN IF NOT EXISTS {column} {column_type}")
+            for name in OBSOLETE_INDEXES:
+                await conn.execute(f"DROP INDEX IF EXISTS {name}")
+            for name, table, columns in UNIQUE_INDEXES:
+                await conn.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS {name} ON {table} ({', '.join(columns)})")
+            for query in self.historique.schema():
+                await conn.execute(query)
+
+    async def read_cursor(self, evenement: str) -> int:
+        async with self.pool.acquire() as conn:
+            value = await conn.fetchval("SELECT dernier_bloc FROM sync_curseur WHERE evenement = $1", evenement)
+        return -1 if value is None else value
+
+    async def existing(self, table: str, column: str, values: Sequence) -> set:
+        if not values:
+            return set()
+        async with self.pool.acquire() as conn:
+            rows = await conn.fetch(f"SELECT {column} FROM {table} WHERE {column} = ANY($1::text[])", list(values))
+        return {row[0] for row in rows}
+
+    async def etapes_connues(self, produit_ids: Sequence[str]) -> Dict[str, List]:
+        if not produit_ids:
+            return {}
+        async with self.pool.acquire() as conn:
+            rows = await conn.fetch("SELECT produit_id, bloc, bloc_hash, tx_hash, log_index FROM etape "
+                                    "WHERE produit_id = ANY($1::text[]) ORDER BY id", list(produit_ids))
+        return etapes_par_produit(rows)
+
+    async def blocs_enregistres(self) -> List:
+        async with self.pool.acquire() as conn:
+            return [tuple(row) for row in await conn.fetch("SELECT numero, hash FROM sync_bloc")]
+
+    async def enregistrer_bloc(self, numero: int, hash_bloc: str):
+        async with self.pool.acquire() as conn:
+            async with conn.transaction():
+                await conn.execute("""INSERT INTO sync_bloc (numero, hash) VALUES ($1, $2)
+                                      ON CONFLICT (numero) DO UPDATE SET hash = EXCLUDED.hash""", numero, hash_bloc)
+                await conn.execute("DELETE FROM sync_bloc WHERE numero < $1",
+                                   numero - oracle_service.BLOCS_CONSERVES)
+
+    async def annuler_blocs(self, bloc: int):
+        async with self.pool.acquire() as conn:
+            async with conn.transaction():
+                for table in ('etape', 'produit', 'producteur'):
+                    await conn.execute(f"DELETE FROM {table} WHERE bloc > $1", bloc)
+                await conn.execute("UPDATE sync_curseur SET dernier_bloc = $1 WHERE dernier_bloc > $1", bloc)
+                await conn.execute("DELETE FROM sync_bloc WHERE numero > $1", bloc)
+
+    async def write(self, evenement: str, ecritures: List[tuple], bloc: int):
+        """
+        Insère les lignes [(table, colonnes, lignes), ...] (doublons ignorés)
+        et avance le curseur dans la même transaction
+        """
+        async with self.pool.acquire() as conn:
+            async with conn.transaction():
+                for table, columns, rows in ecritures:
+                    if not rows:
+                        continue
+                    started = time.perf_counter()
+                    column_list = ', '.join(columns)
+                    staging = f"staging_{table}"
+                    await conn.execute(f"DROP TABLE IF EXISTS {staging}")
+                    await conn.execute(f"CREATE TEMP TABLE {staging} ON COMMIT DROP AS "
+                                       f"SELECT {column_list} FROM {table} WITH NO DATA")
+                    await conn.copy_records_to_table(staging, records=rows, columns=list(columns))
+                    status = await conn.execute(f"INSERT INTO {table} ({column_list}) "
+                                                f"SELECT {column_list} FROM {staging} ON CONFLICT DO NOTHING")
+                    self._record(table, len(rows), int(status.split()[-1]), time.perf_counter() - started)
+                await conn.execute(
+                    """INSERT INTO sync_curseur (evenement, dernier_bloc, date_maj) VALUES ($1, $2, $3)
+                       ON CONFLICT (evenement) DO UPDATE
+                       SET dernier_bloc = GREATEST(sync_curseur.dernier_bloc, EXCLUDED.dernier_bloc),
+                           date_maj = EXCLUDED.date_maj""",
+                    evenement, bloc, datetime.now()
+                )
+
+    def _record(self, table, rows, inserted, elapsed):
+        stats = self.stats.setdefault(table, {'rows': 0, 'inserted': 0, 'elapsed': 0.0})
+        stats['rows'] += rows
+        stats['inserted'] += inserted
+        stats['elapsed'] += elapsed
+
+    report = BulkWriter.report
+
+    async def update_prices(self) -> int:
+        # Un tick de l'historique des prix (ticks bruts, agrégats, dernier prix), en une transaction
+        async with self.pool.acquire() as conn:
+            async with conn.transaction():
+                for query, params, many in self.historique.tick(datetime.now()):
+                    if many:
+                        await conn.executemany(query, params)
+                    else:
+                        status = await conn.execute(query, *params)
+        return int(status.split()[-1])
+
+    async def close(self):
+        await self.pool.close()
+
+
+class AsyncSQLiteWriter(AsyncPostgresWriter):
+    """
+    Même interface sur SQLite : les écritures passent par SQLiteBulkWriter
+    dans un thread, une à la fois.
+    """
+    backend = 'sqlite'
+
+    def __init__(self, path: str):
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.writer = SQLiteBulkWriter(self.conn)
+        self.stats = self.writer.stats
+        self.historique = PrixHistorique('sqlite', '?')
+        self._lock = asyncio.Lock()
+
+    async def _run(self, fn, *args):
+        async with self._lock:
+            return await asyncio.to_thread(fn, *args)
+
+    async def ensure_schema(self):
+        def run():
+            oracle_service.init_curseurs(self.writer)
+            self.writer.ensure_schema()
+            self.historique.creer_schema(self.conn)
+            self.conn.commit()
+        await self._run(run)
+
+    async def read_cursor(self, evenement):
+        return await self._run(oracle_service.lire_curseur, self.writer, evenement)
+
+    async def existing(self, table, column, values):
+        return await self._run(self.writer.existing, table, column, list(values))
+
+    async def etapes_connues(self, produit_ids):
+        return await self._run(oracle_service.etapes_connues, self.writer, list(produit_ids))
+
+    async def blocs_enregistres(self):
+        return await self._run(oracle_service.blocs_enregistres, self.writer)
+
+    async def enregistrer_bloc(self, numero, hash_bloc):
+        await self._transaction(oracle_service.enregistrer_bloc, self.writer, numero, hash_bloc)
+
+    async def annuler_blocs(self, bloc):
+        await self._transaction(oracle_service.annuler_blocs, self.writer, bloc)
+
+    async def write(self, evenement, ecritures, bloc):
+        def run():
+            for table, columns, rows in ecritures:
+                self.writer.upsert(table, columns, rows)
+            oracle_service.avancer_curseur(self.writer, evenement, bloc)
+        await self._transaction(run)
+
+    async def _transaction(self, fn, *args):
+        def run():
+            try:
+                fn(*args)
+                self.conn.commit()
+            except Exception:
+                self.conn.rollback()
+                raise
+        await self._run(run)
+
+    async def update_prices(self):
+        def run():
+            ts = self.historique.enregistrer_tick(self.conn)
+            self.conn.commit()
+            return self.conn.execute("SELECT COUNT(*) FROM prix_historique WHERE ts = ?", (ts,)).fetchone()[0]
+        return await self._run(run)
+
+    async def close(self):
+        self.conn.close()
+
+
+# ----------------------------------------------------------------------
+# Décodage des événements en lignes
+# ----------------------------------------------------------------------
+async def lignes_producteurs(contract, writer, events):
+    return [('producteur', oracle_service.COLONNES_PRODUCTEUR, oracle_service.lignes_producteurs(events))]
+
+
+async def lignes_produits(contract, writer, events):
+    nouveaux = oracle_service.nouveaux_produits(events)
+    for produit_id in await writer.existing('produit', 'id', list(nouveaux)):
+        del nouveaux[produit_id]
+    details = await contract.call_many('obtenirProduit', [(produit_id,) for produit_id in nouveaux])
+    return [('produit', oracle_service.COLONNES_PRODUIT, oracle_service.lignes_produits(nouveaux, details)),
+            ('etape', oracle_service.COLONNES_ETAPE, oracle_service.lignes_recoltes(nouveaux, details))]
+
+
+async def lignes_etapes(contract, writer, events):
+    # Dépend des étapes déjà en base : calculé une fois les produits de la fenêtre écrits
+    connues = await writer.etapes_connues(oracle_service.produits_des_etapes(events))
+    nouvelles = indexer_etapes(connues, events)
+    etapes = await contract.call_many('obtenirEtape', oracle_service.appels_etapes(nouvelles))
+    return [('etape', oracle_service.COLONNES_ETAPE, oracle_service.lignes_etapes(nouvelles, etapes))]
+
+
+class Flux:
+    __slots__ = ('evenement', 'lignes', 'depend_de', 'differe')
+
+    def __init__(self, evenement, lignes, depend_de=None, differe=False):
+        self.evenement = evenement
+        self.lignes = lignes
+        self.depend_de = depend_de
+        # Lignes calculées après l'attente des dépendances plutôt qu'à la récupération
+        self.differe = differe
+
+
+# Mêmes flux que oracle_service.EVENEMENTS, avec leurs dépendances explicites
+FLUX = [
+    Flux('ProducteurAjoute', lignes_producteurs),
+    Flux('ProduitEnregistre', lignes_produits, depend_de='ProducteurAjoute'),
+    Flux('EtapeAjoutee', lignes_etapes, depend_de='ProduitEnregistre', differe=True),
+]
+
+
+# ----------------------------------------------------------------------
+# Orchestration
+# ----------------------------------------------------------------------
+class AsyncOracle:
+    def __init__(self, contract: AsyncContract, writer, window: int = 5000,
+                 fetch_concurrency: int = 4, queue_size: int = 8):
+        self.contract = contract
+        self.writer = writer
+        self.window = window
+        self.fetch_concurrency = fetch_concurrency
+        self.queue_size = queue_size
+        self.progress: Dict[str, int] = {}
+        self._progress_changed = asyncio.Condition()
+
+    async def _fetch(self, flux: Flux, start: int, stop: int):
+        events = await self.contract.get_events(flux.evenement, start, stop)
+        ecritures = None if flux.differe else await flux.lignes(self.contract, self.writer, events)
+        return stop, events, ecritures
+
+    async def _producer(self, flux: Flux, start: int, head: int, queue: asyncio.Queue):
+        # Fenêtres récupérées concurremment, transmises dans l'ordre des blocs
+        in_flight = deque()
+        try:
+            for window_start in range(start, head + 1, self.window):
+                window_stop = min(window_start + self.window - 1, head)
+                in_flight.append(asyncio.create_task(self._fetch(flux, window_start, window_stop)))
+                if len(in_flight) >= self.fetch_concurrency:
+                    await queue.put(await in_flight.popleft())
+            while in_flight:
+                await queue.put(await in_flight.popleft())
+        finally:
+            for task in in_flight:
+                task.cancel()
+        await queue.put(None)
+
+    async def _wait_for(self, evenement: str, bloc: int):
+        async with self._progress_changed:
+            await self._progress_changed.wait_for(lambda: self.progress[evenement] >= bloc)
+
+    async def _consumer(self, flux: Flux, queue: asyncio.Queue, counts: Dict[str, int]):
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            stop, events, ecritures = item
+            if flux.depend_de:
+                await self._wait_for(flux.depend_de, stop)
+            if ecritures is None:
+                ecritures = await flux.lignes(self.contract, self.writer, events)
+            await self.writer.write(flux.evenement, ecritures, stop)
+            counts[flux.evenement] += len(events)
+            async with self._progress_changed:
+                self.progress[flux.evenement] = stop
+                self._progress_changed.notify_all()
+
+    async def sync(self) -> Dict[str, int]:
+        """
+        Synchronise les trois flux jusqu'à la tête confirmée.
+        Retourne le nombre d'événements traités par flux.
+        """
+        await self._verifier_reorganisation()
+        head = await self.contract.block_number() - oracle_service.CONFIRMATIONS
+        counts = {flux.evenement: 0 for flux in FLUX}
+        for flux in FLUX:
+            self.progress[flux.evenement] = await self.writer.read_cursor(flux.evenement)
+
+        tasks = []
+        for flux in FLUX:
+            start = self.progress[flux.evenement] + 1
+            if start > head:
+                # Flux à jour : ses dépendants peuvent écrire jusqu'à la tête
+                self.progress[flux.evenement] = max(self.progress[flux.evenement], head)
+                continue
+            queue = asyncio.Queue(maxsize=self.queue_size)
+            tasks.append(asyncio.create_task(self._producer(flux, start, head, queue)))
+            tasks.append(asyncio.create_task(self._consumer(flux, queue, counts)))
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            # Une erreur arrête tous les flux : un consommateur n'attend pas indéfiniment son producteur
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+        if head >= 0:
+            await self.writer.enregistrer_bloc(head, (await self.contract.block_hashes([head]))[head])
+        return counts
+
+    async def _verifier_reorganisation(self) -> Optional[int]:
+        # Même contrôle que oracle_service.verifier_reorganisation, avec les hash lus en un batch
+        blocs = await self.writer.blocs_enregistres()
+        if not blocs:
+            return None
+        hashes = await self.contract.block_hashes([max(blocs)[0]])
+        if hashes.get(max(blocs)[0]) != max(blocs)[1]:
+            hashes = await self.contract.block_hashes([numero for numero, _ in blocs])
+        fork = point_de_fork(blocs, lambda numeros: hashes)
+        if fork is not None:
+            await self.writer.annuler_blocs(fork)
+            print(f"Réorganisation détectée : lignes postérieures au bloc {fork} annulées")
+        return fork
+
+
+async def sync_loop(oracle: AsyncOracle, interval: float):
+    while True:
+        started = time.perf_counter()
+        try:
+            counts = await oracle.sync()
+            print(f"Synchronisation terminée en {time.perf_counter() - started:.1f}s : {counts}")
+        except Exception as e:
+            print(f"Erreur lors de la synchronisation: {e}")
+        await asyncio.sleep(interval)
+
+
+async def prix_loop(writer, interval: float):
+    while True:
+        try:
+            print(f"Prix de marché mis à jour ({await writer.update_prices()} produits)")
+        except Exception as e:
+            print(f"Erreur lors de la mise à jour des prix: {e}")
+        await asyncio.sleep(interval)
+
+
+async def run(window: int, concurrency: int, sync_interval: float = 300, prix_interval: float = 3600):
+    abi = oracle_service.load_contract_abi()
+    if not abi:
+        return
+    if oracle_service.SQLITE_PATH:
+        writer = AsyncSQLiteWriter(oracle_service.SQLITE_PATH)
+    else:
+        writer = await AsyncPostgresWriter.connect(oracle_service.DB_PARAMS, max_size=concurrency + 2)
+    await writer.ensure_schema()
+
+    async with AsyncRPC(oracle_service.WEB3_PROVIDER, oracle_service.RPC_BATCH_SIZE, concurrency) as rpc:
+        contract = AsyncContract(rpc, oracle_service.CONTRACT_ADDRESS, abi)
+        oracle = AsyncOracle(contract, writer, window=window, fetch_concurrency=concurrency)
+        try:
+            # Deux tâches indépendantes : une synchronisation lente ne bloque pas les prix
+            await asyncio.gather(sync_loop(oracle, sync_interval), prix_loop(writer, prix_interval))
+        finally:
+            await writer.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Service d'oracle asynchrone")
+    parser.add_argument('--window', type=int, default=5000, help="Blocs par requête eth_getLogs")
+    parser.add_argument('--concurrency', type=int, default=8, help="Requêtes RPC en vol au maximum")
+    args = parser.parse_args()
+    print("Démarrage du service d'oracle asynchrone...")
+    asyncio.run(run(args.window, args.concurrency))
+
+
+if __name__ == '__main__':
+    main()
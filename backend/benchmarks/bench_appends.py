@@ -0,0 +1,69 @@
+"""
+Débit d'ajouts durables avec N écrivains concurrents : un fsync par appel
+contre le commit groupé de DataSecurity.secure_data.
+
+Usage (depuis backend/) :
+    python -m benchmarks.bench_appends --writers 32 --appends 200
+"""
+import argparse
+import shutil
+import tempfile
+import threading
+import time
+
+from blockchain import DataSecurity
+
+
+def run(writers, appends, append_fn):
+    barrier = threading.Barrier(writers + 1)
+
+    def worker(worker_id):
+        barrier.wait()
+        for i in range(appends):
+            append_fn({"type": "produit", "nom": f"Produit {worker_id}-{i}"})
+
+    threads = [threading.Thread(target=worker, args=(w,)) for w in range(writers)]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    return writers * appends / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--writers', type=int, default=32)
+    parser.add_argument('--appends', type=int, default=200)
+    args = parser.parse_args()
+
+    path = tempfile.mkdtemp()
+    try:
+        data_security = DataSecurity(f"{path}/unitaire")
+        blockchain = data_security.blockchain
+        lock = threading.Lock()
+
+        def durable_append(data):
+            with lock:
+                blockchain.add_block(data)
+                blockchain.chain.store.flush()
+
+        rate = run(args.writers, args.appends, durable_append)
+        print(f"un fsync par ajout : {rate:10.0f} ajouts/s")
+        assert data_security.is_valid()
+        blockchain.close()
+
+        data_security = DataSecurity(f"{path}/groupe")
+        rate = run(args.writers, args.appends, data_security.secure_data)
+        commit = data_security.group_commit
+        print(f"commit groupé      : {rate:10.0f} ajouts/s "
+              f"({commit.committed / max(commit.batches, 1):.1f} blocs par lot)")
+        assert data_security.is_valid()
+        data_security.blockchain.close()
+    finally:
+        shutil.rmtree(path)
+
+
+if __name__ == '__main__':
+    main()
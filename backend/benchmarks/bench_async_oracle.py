@@ -0,0 +1,91 @@
+"""
+Rattrapage d'un historique par l'oracle asynchrone : fenêtres de blocs
+traitées une à une contre fenêtres récupérées en parallèle, sur le nœud de
+substitution local avec une latence réseau simulée. Pendant la
+synchronisation, une tâche de prix tourne à intervalle fixe ; on compte ses
+mises à jour pour vérifier qu'elle n'est pas bloquée.
+
+Usage (depuis backend/) :
+    python -m benchmarks.bench_async_oracle --producteurs 5 --produits 3 --etapes 2 --latence 0.1
+"""
+import argparse
+import asyncio
+import os
+import sqlite3
+import tempfile
+import time
+
+from async_oracle import AsyncContract, AsyncOracle, AsyncRPC, AsyncSQLiteWriter
+from benchmarks.rpc_standin import StandInNode
+
+SCHEMA = [
+    "CREATE TABLE producteur (id VARCHAR(64) PRIMARY KEY, nom TEXT, region TEXT, est_verifie BOOLEAN, "
+    "date_ajout TIMESTAMP)",
+    "CREATE TABLE produit (id VARCHAR(64) PRIMARY KEY, nom TEXT, producteur_id VARCHAR(64), region TEXT, "
+    "date_recolte TIMESTAMP, est_bio BOOLEAN, qualite_score FLOAT, prix_marche FLOAT)",
+    "CREATE TABLE etape (id INTEGER PRIMARY KEY, produit_id VARCHAR(64), date TIMESTAMP, operation TEXT, "
+    "operateur TEXT, lieu TEXT, temperature FLOAT, humidite FLOAT)",
+]
+
+
+def create_database(path):
+    conn = sqlite3.connect(path)
+    for statement in SCHEMA:
+        conn.execute(statement)
+    conn.commit()
+    conn.close()
+
+
+async def run(node, path, window, concurrency):
+    writer = AsyncSQLiteWriter(path)
+    await writer.ensure_schema()
+    mises_a_jour = 0
+
+    async def prix():
+        nonlocal mises_a_jour
+        while True:
+            await writer.update_prices()
+            mises_a_jour += 1
+            await asyncio.sleep(0.1)
+
+    async with AsyncRPC(node.url, concurrency=concurrency) as rpc:
+        contract = AsyncContract(rpc, node.contract.address, node.abi)
+        oracle = AsyncOracle(contract, writer, window=window, fetch_concurrency=concurrency)
+        prix_task = asyncio.create_task(prix())
+        started = time.perf_counter()
+        counts = await oracle.sync()
+        elapsed = time.perf_counter() - started
+        prix_task.cancel()
+        requests_sent = rpc.requests_sent
+    await writer.close()
+    return counts, elapsed, requests_sent, mises_a_jour
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--producteurs', type=int, default=5)
+    parser.add_argument('--produits', type=int, default=3)
+    parser.add_argument('--etapes', type=int, default=2)
+    parser.add_argument('--fenetre', type=int, default=10, help="Blocs par requête eth_getLogs")
+    parser.add_argument('--concurrence', type=int, default=8)
+    parser.add_argument('--latence', type=float, default=0.1, help="Latence simulée par requête HTTP (s)")
+    args = parser.parse_args()
+
+    node = StandInNode().start()
+    try:
+        node.seed(args.producteurs, args.produits, args.etapes)
+        node.latency = args.latence
+        with tempfile.TemporaryDirectory() as directory:
+            for label, concurrency in (('une à une', 1), ('parallèle', args.concurrence)):
+                path = os.path.join(directory, f"oracle_{concurrency}.db")
+                create_database(path)
+                counts, elapsed, requests_sent, mises_a_jour = asyncio.run(
+                    run(node, path, args.fenetre, concurrency))
+                print(f"{label:<10}: {sum(counts.values()):6d} événements en {elapsed:6.2f}s "
+                      f"({requests_sent} requêtes HTTP, {mises_a_jour} mises à jour de prix pendant la synchro)")
+    finally:
+        node.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+"""
+Charge sur la route publique d'authentification /api/authentification/<identifiant>.
+
+Sans --url, l'application Flask est appelée directement en WSGI (un seul
+cœur, sans serveur HTTP) sur une chaîne et une base temporaires : scans
+répétés des mêmes produits (cache chaud), hash inconnus, et requêtes
+conditionnelles If-None-Match.
+Avec --url, des clients HTTP keep-alive visent un serveur déjà démarré
+(ex. gunicorn -w 1 run:app) avec les hash passés par --hash.
+
+Usage (depuis backend/) :
+    python -m benchmarks.bench_auth --products 2000 --requests 20000
+    python -m benchmarks.bench_auth --url http://localhost:5000 --hash <h> --clients 16
+"""
+import argparse
+import http.client
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+from urllib.parse import urlparse
+
+
+def run_inprocess(products, requests):
+    from sqlalchemy import create_engine, text
+    from werkzeug.test import EnvironBuilder
+
+    from app import create_app
+    from config import Config
+    from blockchain import DataSecurity
+
+    path = tempfile.mkdtemp()
+    try:
+        storage = os.path.join(path, 'chaine')
+        database = f"sqlite:///{os.path.join(path, 'bench.db')}"
+        data_security = DataSecurity(storage)
+        hashes = [data_security.secure_data({"type": "produit", "nom": f"Produit {i}", "region": "Souss-Massa"})
+                  for i in range(products)]
+        data_security.blockchain.close()
+
+        engine = create_engine(database)
+        with engine.begin() as conn:
+            conn.execute(text("CREATE TABLE produit (id VARCHAR(64) PRIMARY KEY, data_hash VARCHAR(64))"))
+            conn.execute(text("INSERT INTO produit (id, data_hash) VALUES (:id, :h)"),
+                         [{"id": str(i), "h": h} for i, h in enumerate(hashes)])
+
+        class BenchConfig(Config):
+            SQLALCHEMY_DATABASE_URI = database
+            BLOCKCHAIN_STORAGE_PATH = storage
+            BLOCKCHAIN_SHARDED = False
+
+        app = create_app(BenchConfig)
+        statuses = []
+
+        def start_response(status, headers):
+            statuses.append(status)
+
+        def call(environ):
+            b''.join(app(dict(environ), start_response))
+
+        def environ(path, headers=None):
+            return EnvironBuilder(path=path, headers=headers).get_environ()
+
+        hot = hashes[:max(1, products // 20)]  # 5 % des produits concentrent les scans
+
+        def measure(label, paths, headers=None):
+            environs = [environ(p, headers) for p in paths]
+            for e in environs:
+                call(e)  # chauffe du cache
+            started = time.perf_counter()
+            for i in range(requests):
+                call(environs[i % len(environs)])
+            rate = requests / (time.perf_counter() - started)
+            print(f"{label:<28}: {rate:10.0f} requêtes/s ({statuses[-1]})")
+
+        measure("hash, cache chaud", [f"/api/authentification/{h}" for h in hot])
+        measure("identifiant produit", [f"/api/authentification/{i}" for i in range(len(hot))])
+        etag = app.test_client().get(f"/api/authentification/{hot[0]}").headers['ETag']
+        measure("If-None-Match (304)", [f"/api/authentification/{hot[0]}"], {'If-None-Match': etag})
+        measure("hash inconnu", [f"/api/authentification/{random.getrandbits(256):064x}" for _ in range(100)])
+
+        environs = [environ(f"/api/authentification/{h}") for h in hashes]
+        started = time.perf_counter()
+        for e in environs:
+            call(e)
+        print(f"{'premier scan (cache froid)':<28}: {products / (time.perf_counter() - started):10.0f} requêtes/s")
+    finally:
+        shutil.rmtree(path)
+
+
+def run_http(url, hashes, clients, requests):
+    target = urlparse(url)
+    per_client = requests // clients
+    barrier = threading.Barrier(clients + 1)
+    errors = []
+
+    def worker():
+        conn = http.client.HTTPConnection(target.hostname, target.port or 80)
+        barrier.wait()
+        for i in range(per_client):
+            conn.request('GET', f"{target.path.rstrip('/')}/api/authentification/{hashes[i % len(hashes)]}")
+            response = conn.getresponse()
+            response.read()
+            if response.status >= 500:
+                errors.append(response.status)
+        conn.close()
+
+    threads = [threading.Thread(target=worker) for _ in range(clients)]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    rate = clients * per_client / (time.perf_counter() - started)
+    print(f"{clients} clients HTTP : {rate:10.0f} requêtes/s, {len(errors)} erreurs")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--products', type=int, default=2000)
+    parser.add_argument('--requests', type=int, default=20000)
+    parser.add_argument('--url', default=None)
+    parser.add_argument('--hash', action='append', default=[])
+    parser.add_argument('--clients', type=int, default=16)
+    args = parser.parse_args()
+
+    if args.url:
+        if not args.hash:
+            parser.error("--hash est requis avec --url")
+        run_http(args.url, args.hash, args.clients, args.requests)
+    else:
+        run_inprocess(args.products, args.requests)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""
+Mesure de la mémoire par bloc et du débit de hachage, avant/après le bloc compact.
+
+Usage (depuis backend/) :
+    python -m benchmarks.bench_block --blocks 1000000
+"""
+import argparse
+import gc
+import hashlib
+import json
+import time
+import tracemalloc
+
+from blockchain import Block
+
+
+class LegacyBlock:
+    """
+    Ancienne représentation : objet à __dict__, hash JSON recalculé à chaque appel
+    """
+    def __init__(self, index, data, timestamp, previous_hash):
+        self.index = index
+        self.timestamp = timestamp
+        self.data = data
+        self.previous_hash = previous_hash
+        self.hash = self.calculate_hash()
+
+    def calculate_hash(self):
+        block_string = json.dumps({
+            "index": self.index,
+            "timestamp": self.timestamp,
+            "data": self.data,
+            "previous_hash": self.previous_hash
+        }, sort_keys=True).encode()
+        return hashlib.sha256(block_string).hexdigest()
+
+
+def sample_data(i):
+    return {
+        "type": "produit",
+        "nom": f"Produit {i}",
+        "region": "Souss-Massa",
+        "qualite_score": 8.5,
+        "producteur_id": i % 1000,
+        "est_bio": bool(i % 2),
+        "timestamp": "2024-05-01T10:00:00"
+    }
+
+
+def measure(block_cls, count):
+    gc.collect()
+    tracemalloc.start()
+    previous_hash = "0"
+    chain = []
+    started = time.perf_counter()
+    for i in range(count):
+        block = block_cls(i, sample_data(i), 1714557600.0 + i, previous_hash)
+        previous_hash = block.hash
+        chain.append(block)
+    build_time = time.perf_counter() - started
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    started = time.perf_counter()
+    for block in chain:
+        block.calculate_hash()
+    hash_time = time.perf_counter() - started
+    return {
+        'bytes_per_block': current / count,
+        'build_per_second': count / build_time,
+        'hash_per_second': count / hash_time
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--blocks', type=int, default=1000000)
+    args = parser.parse_args()
+
+    for name, block_cls in (('avant (LegacyBlock)', LegacyBlock), ('après (Block)', Block)):
+        result = measure(block_cls, args.blocks)
+        print(f"{name:22s} {result['bytes_per_block']:8.0f} octets/bloc  "
+              f"{result['build_per_second']:10.0f} créations/s  {result['hash_per_second']:10.0f} hash/s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""
+Lecture de l'historique des journaux du contrat : une requête eth_getLogs
+sur toute la chaîne, fenêtres de blocs lues une à une, et fenêtres lues en
+parallèle. Le nœud de substitution refuse, comme les fournisseurs publics,
+les réponses de plus de `--max-logs` journaux ; la fenêtre de départ est
+volontairement trop grande pour exercer la réduction adaptative.
+
+eth-tester traite les requêtes une à une (et eth_getLogs y coûte du CPU) :
+seul le temps réseau simulé se recouvre entre fenêtres parallèles.
+
+Usage (depuis backend/) :
+    python -m benchmarks.bench_logs --producteurs 5 --produits 3 --etapes 3 --latence 0.3
+"""
+import argparse
+import time
+
+from web3 import Web3
+
+from benchmarks.rpc_standin import StandInNode
+from recuperation_journaux import RecuperateurJournaux
+from rpc_batch import contract_events
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--producteurs', type=int, default=5)
+    parser.add_argument('--produits', type=int, default=3)
+    parser.add_argument('--etapes', type=int, default=3)
+    parser.add_argument('--latence', type=float, default=0.3, help="Latence simulée par requête HTTP (s)")
+    parser.add_argument('--max-logs', type=int, default=20, help="Journaux au plus par réponse eth_getLogs")
+    parser.add_argument('--fenetre', type=int, default=40, help="Blocs par requête au départ")
+    parser.add_argument('--workers', type=int, default=8)
+    args = parser.parse_args()
+
+    node = StandInNode().start()
+    try:
+        node.seed(args.producteurs, args.produits, args.etapes)
+        node.latency = args.latence
+        node.max_logs = args.max_logs
+        web3 = Web3(Web3.HTTPProvider(node.url))
+        tete = web3.eth.block_number
+        topics = [decodeur.topic for decodeur in contract_events(node.abi).values()]
+
+        def get_logs(debut, fin):
+            return web3.eth.get_logs({'address': node.contract.address, 'fromBlock': debut, 'toBlock': fin,
+                                      'topics': [topics]})
+
+        try:
+            started = time.perf_counter()
+            logs = get_logs(0, tete)
+            print(f"{'une requête':<12}: {len(logs)} journaux en {time.perf_counter() - started:.2f}s")
+        except Exception as e:
+            print(f"{'une requête':<12}: refusée ({e})")
+
+        for label, workers in (('une à une', 1), ('parallèle', args.workers)):
+            recuperateur = RecuperateurJournaux(fenetre=args.fenetre, workers=workers)
+            started = time.perf_counter()
+            logs = recuperateur.recuperer(get_logs, 0, tete)
+            elapsed = time.perf_counter() - started
+            print(f"{label:<12}: {len(logs)} journaux de {tete + 1} blocs en {elapsed:.2f}s {recuperateur.stats()}")
+    finally:
+        node.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""
+Coût de mise en place d'une exécution planifiée de l'oracle : ressources
+recréées à chaque exécution (lecture de l'artefact, fournisseur Web3,
+contrat, connexion à la base) contre ressources gardées (contrat chargé une
+fois, session HTTP keep-alive, pool de connexions).
+
+Chaque exécution lit la tête de chaîne et fait une requête triviale, pour
+mesurer la mise en place et non le travail de synchronisation.
+
+Usage (depuis backend/) :
+    python -m benchmarks.bench_oracle_setup --runs 200
+    python -m benchmarks.bench_oracle_setup --runs 200 --postgres "dbname=scratch user=postgres"
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+from web3 import Web3
+
+import oracle_service
+from benchmarks.rpc_standin import CONTRACT_ARTIFACT, StandInNode
+
+
+def par_execution():
+    # Comportement d'origine : tout est recréé
+    with open(oracle_service.CONTRACT_ARTIFACT, 'r') as f:
+        abi = json.load(f)['abi']
+    web3 = Web3(Web3.HTTPProvider(oracle_service.WEB3_PROVIDER))
+    web3.eth.contract(address=oracle_service.CONTRACT_ADDRESS, abi=abi)
+    conn = oracle_service.connect_db()
+    web3.eth.block_number
+    cur = conn.cursor()
+    cur.execute("SELECT 1")
+    cur.close()
+    conn.close()
+
+
+def ressources_gardees():
+    web3, _ = oracle_service.init_contract()
+    with oracle_service.get_pool().connection() as conn:
+        web3.eth.block_number
+        cur = conn.cursor()
+        cur.execute("SELECT 1")
+        cur.close()
+
+
+def measure(label, fn, runs):
+    fn()  # premier passage : ouverture des ressources gardées
+    started = time.perf_counter()
+    for _ in range(runs):
+        fn()
+    elapsed = time.perf_counter() - started
+    print(f"{label:<20}: {elapsed / runs * 1000:7.2f} ms par exécution")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--runs', type=int, default=200)
+    parser.add_argument('--postgres', default=None, help="DSN d'une base PostgreSQL de test")
+    args = parser.parse_args()
+
+    node = StandInNode().start()
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            oracle_service.WEB3_PROVIDER = node.url
+            oracle_service.CONTRACT_ADDRESS = node.contract.address
+            oracle_service.CONTRACT_ARTIFACT = CONTRACT_ARTIFACT
+            if args.postgres:
+                oracle_service.SQLITE_PATH = None
+                oracle_service.DB_PARAMS = {'dsn': args.postgres}
+            else:
+                oracle_service.SQLITE_PATH = os.path.join(directory, 'oracle.db')
+
+            measure('par exécution', par_execution, args.runs)
+            measure('ressources gardées', ressources_gardees, args.runs)
+            print(f"Pool de connexions: {oracle_service.statistiques_pool()}")
+            oracle_service.get_pool().closeall()
+    finally:
+        node.stop()
+
+
+if __name__ == '__main__':
+    main()
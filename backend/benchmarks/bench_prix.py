@@ -0,0 +1,59 @@
+"""
+Historique des prix : écriture d'une année de ticks (requêtes ensemblistes et
+agrégats incrémentaux), puis lecture d'une série sur un an depuis les ticks
+bruts contre lecture depuis l'agrégat choisi par PrixHistorique.
+
+Usage (depuis backend/) :
+    python -m benchmarks.bench_prix --produits 10 --jours 365 --intervalle 30
+"""
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from prix_historique import PrixHistorique
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--produits', type=int, default=10)
+    parser.add_argument('--jours', type=int, default=365)
+    parser.add_argument('--intervalle', type=int, default=30, help="Minutes entre deux ticks")
+    parser.add_argument('--points', type=int, default=500, help="Points souhaités pour le graphique")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        conn = sqlite3.connect(os.path.join(directory, 'prix.db'))
+        conn.execute("CREATE TABLE produit (id VARCHAR(64) PRIMARY KEY, prix_marche FLOAT)")
+        conn.executemany("INSERT INTO produit (id) VALUES (?)", [(f"X{i}",) for i in range(args.produits)])
+        historique = PrixHistorique.pour_connexion(conn)
+        historique.creer_schema(conn)
+        conn.commit()
+
+        debut = datetime(2025, 1, 1)
+        ticks = args.jours * 24 * 60 // args.intervalle
+        started = time.perf_counter()
+        for i in range(ticks):
+            historique.enregistrer_tick(conn, debut + timedelta(minutes=i * args.intervalle))
+            conn.commit()
+        elapsed = time.perf_counter() - started
+        print(f"écriture : {ticks} ticks x {args.produits} produits en {elapsed:6.2f}s "
+              f"({ticks / elapsed:6.0f} ticks/s, {ticks * args.produits / elapsed:8.0f} prix/s)")
+
+        fin = debut + timedelta(days=args.jours)
+        started = time.perf_counter()
+        brut = historique.historique(conn, 'X0', debut, fin, pas=0)
+        elapsed_brut = time.perf_counter() - started
+        started = time.perf_counter()
+        serie = historique.historique(conn, 'X0', debut, fin, points=args.points)
+        elapsed_serie = time.perf_counter() - started
+        print(f"lecture brute   : {len(brut['points']):7d} points en {elapsed_brut * 1000:7.1f} ms")
+        print(f"lecture agrégée : {len(serie['points']):7d} points en {elapsed_serie * 1000:7.1f} ms "
+              f"(résolution {serie['resolution']})")
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
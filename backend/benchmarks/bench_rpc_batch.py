@@ -0,0 +1,61 @@
+"""
+Lectures du contrat pendant une synchronisation : appels séquentiels
+`contract.functions.f(...).call()` contre BatchCaller (JSON-RPC batch),
+sur le nœud de substitution local avec une latence réseau simulée.
+
+Usage (depuis backend/) :
+    python -m benchmarks.bench_rpc_batch --producteurs 10 --produits 5 --etapes 3 --latence 0.005
+"""
+import argparse
+import time
+
+from web3 import Web3
+
+from benchmarks.rpc_standin import StandInNode
+from rpc_batch import BatchCaller
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--producteurs', type=int, default=10)
+    parser.add_argument('--produits', type=int, default=5)
+    parser.add_argument('--etapes', type=int, default=3)
+    parser.add_argument('--latence', type=float, default=0.005, help="Latence simulée par requête HTTP (s)")
+    parser.add_argument('--batch-size', type=int, default=100)
+    args = parser.parse_args()
+
+    node = StandInNode().start()
+    try:
+        node.seed(args.producteurs, args.produits, args.etapes)
+        node.latency = args.latence
+        web3 = Web3(Web3.HTTPProvider(node.url))
+        contract = web3.eth.contract(address=node.contract.address, abi=node.abi)
+        produit_ids = [f"P{p}-X{q}" for p in range(args.producteurs) for q in range(args.produits)]
+
+        started = time.perf_counter()
+        http_before = node.http_requests
+        sequentiel = [contract.functions.obtenirProduit(pid).call() for pid in produit_ids]
+        nombres = [contract.functions.nombreEtapes(pid).call() for pid in produit_ids]
+        for pid, n in zip(produit_ids, nombres):
+            sequentiel.extend(contract.functions.obtenirEtape(pid, i).call() for i in range(n))
+        elapsed = time.perf_counter() - started
+        print(f"séquentiel : {len(sequentiel):6d} appels en {elapsed:6.2f}s "
+              f"({node.http_requests - http_before} requêtes HTTP)")
+
+        caller = BatchCaller(contract, args.batch_size)
+        started = time.perf_counter()
+        http_before = node.http_requests
+        groupe = caller.call_many('obtenirProduit', [(pid,) for pid in produit_ids])
+        nombres = caller.call_many('nombreEtapes', [(pid,) for pid in produit_ids])
+        groupe.extend(caller.call_many('obtenirEtape', [(pid, i) for pid, n in zip(produit_ids, nombres) for i in range(n)]))
+        elapsed = time.perf_counter() - started
+        print(f"batch      : {len(groupe):6d} appels en {elapsed:6.2f}s "
+              f"({node.http_requests - http_before} requêtes HTTP)")
+        assert [tuple(r) if isinstance(r, (list, tuple)) else r for r in groupe] == \
+               [tuple(r) if isinstance(r, (list, tuple)) else r for r in sequentiel]
+    finally:
+        node.stop()
+
+
+if __name__ == '__main__':
+    main()
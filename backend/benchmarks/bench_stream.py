@@ -0,0 +1,82 @@
+"""
+Latence de bout en bout de l'ingestion en flux : des produits sont
+enregistrés sur le nœud de substitution à débit constant pendant que
+oracle_service.flux_evenements tourne ; on mesure le délai entre la
+transaction et l'apparition du produit en base (SQLite).
+
+Avec la synchronisation toutes les 5 minutes, ce délai est en moyenne de
+150 s et peut atteindre 300 s.
+
+Usage (depuis backend/) :
+    python -m benchmarks.bench_stream --produits 100 --debit 10
+"""
+import argparse
+import os
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+
+import oracle_service
+from benchmarks.bench_async_oracle import create_database
+from benchmarks.rpc_standin import CONTRACT_ARTIFACT, StandInNode
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--produits', type=int, default=100)
+    parser.add_argument('--debit', type=float, default=10, help="Produits enregistrés par seconde")
+    parser.add_argument('--latence', type=float, default=0.0, help="Latence simulée par requête HTTP (s)")
+    args = parser.parse_args()
+
+    node = StandInNode(latency=args.latence).start()
+    arret = threading.Event()
+    flux = threading.Thread(target=oracle_service.flux_evenements, kwargs={'arret': arret})
+    try:
+        node.seed(1, 0, 0)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'oracle.db')
+            create_database(path)
+            oracle_service.WEB3_PROVIDER = node.url
+            oracle_service.CONTRACT_ADDRESS = node.contract.address
+            oracle_service.CONTRACT_ARTIFACT = CONTRACT_ARTIFACT
+            oracle_service.SQLITE_PATH = path
+
+            flux.start()
+            time.sleep(1)
+
+            envoyes, vus = {}, {}
+
+            def observer():
+                conn = sqlite3.connect(path)
+                limite = time.perf_counter() + args.produits / args.debit + 30
+                while time.perf_counter() < limite and (len(vus) < args.produits or len(envoyes) < args.produits):
+                    maintenant = time.perf_counter()
+                    for (produit_id,) in conn.execute("SELECT id FROM produit"):
+                        vus.setdefault(produit_id, maintenant)
+                    time.sleep(0.02)
+                conn.close()
+
+            observateur = threading.Thread(target=observer)
+            observateur.start()
+            for i in range(args.produits):
+                produit_id = f"S{i}"
+                envoyes[produit_id] = time.perf_counter()
+                node.transact('enregistrerProduit', produit_id, f"Produit {i}", "P0", "Souss-Massa", True)
+                time.sleep(1 / args.debit)
+            observateur.join()
+
+            latences = sorted(vus[p] - envoyes[p] for p in envoyes if p in vus)
+            print(f"{len(latences)}/{len(envoyes)} produits ingérés ; latence médiane "
+                  f"{statistics.median(latences):.2f}s, p95 {latences[int(len(latences) * 0.95) - 1]:.2f}s, "
+                  f"max {latences[-1]:.2f}s")
+    finally:
+        arret.set()
+        flux.join()
+        oracle_service.fermer_ressources()
+        node.stop()
+
+
+if __name__ == '__main__':
+    main()
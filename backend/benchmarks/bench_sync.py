@@ -0,0 +1,123 @@
+"""
+Débit de synchronisation contre un historique rejoué, sans Ganache :
+`oracle_service.synchroniser_blockchain` (SQLite) et la route /api/sync,
+sur des historiques synthétiques de 10k à 1M événements ou sur un
+enregistrement capturé par `benchmarks.chain_replay.enregistrer`.
+
+Pour chaque taille : événements par seconde, requêtes HTTP et appels
+JSON-RPC par événement.
+
+Usage (depuis backend/) :
+    python -m benchmarks.bench_sync --evenements 10000 100000 --latence 0.002
+    python -m benchmarks.bench_sync --evenements 1000000 --cibles oracle
+    python -m benchmarks.bench_sync --enregistrer http://localhost:7545 --fixture chaine.json.gz
+    python -m benchmarks.bench_sync --fixture chaine.json.gz
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import tempfile
+import time
+
+from benchmarks.bench_async_oracle import create_database
+from benchmarks.chain_replay import Enregistrement, HistoriqueSynthetique, ReplayNode, enregistrer
+from benchmarks.rpc_standin import CONTRACT_ARTIFACT
+import oracle_service
+
+
+def sync_oracle(node, directory):
+    path = os.path.join(directory, 'oracle.db')
+    create_database(path)
+    oracle_service.WEB3_PROVIDER = node.url
+    oracle_service.CONTRACT_ADDRESS = node.historique.address
+    oracle_service.CONTRACT_ARTIFACT = CONTRACT_ARTIFACT
+    oracle_service.SQLITE_PATH = path
+    oracle_service.fermer_ressources()
+    sortie = io.StringIO()
+    try:
+        with contextlib.redirect_stdout(sortie):
+            oracle_service.synchroniser_blockchain()
+    finally:
+        oracle_service.fermer_ressources()
+    if 'Erreur' in sortie.getvalue():
+        raise RuntimeError(sortie.getvalue())
+
+
+def sync_api(node, directory):
+    from app import create_app
+    from app import blockchain
+    from app.models import db
+    from config import Config
+
+    class BenchConfig(Config):
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(directory, 'api.db')
+        WEB3_PROVIDER = node.url
+        CONTRACT_ADDRESS = node.historique.address
+        CONTRACT_ARTIFACT = CONTRACT_ARTIFACT
+
+    app = create_app(BenchConfig)
+    with app.app_context():
+        db.create_all()
+    blockchain.fermer_ressources()
+    try:
+        response = app.test_client().get('/api/sync')
+    finally:
+        blockchain.fermer_ressources()
+    if response.status_code != 200:
+        raise RuntimeError(response.get_json())
+
+
+CIBLES = {'oracle': sync_oracle, 'api': sync_api}
+
+
+def mesurer(label, historique, cibles, latency, max_logs):
+    evenements = len(historique)
+    for cible in cibles:
+        node = ReplayNode(historique, latency=latency, max_logs=max_logs).start()
+        try:
+            with tempfile.TemporaryDirectory() as directory:
+                started = time.perf_counter()
+                CIBLES[cible](node, directory)
+                elapsed = time.perf_counter() - started
+        finally:
+            node.stop()
+        print(f"{label:>10} {cible:<7}: {evenements / elapsed:9.0f} événements/s ({elapsed:7.2f}s), "
+              f"{node.http_requests / evenements:.4f} requêtes HTTP et {node.rpc_calls / evenements:.3f} "
+              f"appels JSON-RPC par événement")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--evenements', type=int, nargs='+', default=[10000],
+                        help="Tailles des historiques synthétiques")
+    parser.add_argument('--produits', type=int, default=10, help="Produits par producteur")
+    parser.add_argument('--etapes', type=int, default=4, help="Étapes ajoutées par produit")
+    parser.add_argument('--cibles', nargs='+', choices=sorted(CIBLES), default=['oracle', 'api'])
+    parser.add_argument('--latence', type=float, default=0.002, help="Latence simulée par requête HTTP (s)")
+    parser.add_argument('--max-logs', type=int, default=10000, help="Journaux au plus par réponse eth_getLogs")
+    parser.add_argument('--fixture', help="Enregistrement à rejouer à la place des historiques synthétiques")
+    parser.add_argument('--enregistrer', metavar='URL', help="Capture l'historique du nœud URL dans --fixture")
+    args = parser.parse_args()
+
+    with open(CONTRACT_ARTIFACT, 'r') as f:
+        abi = json.load(f)['abi']
+
+    if args.enregistrer:
+        if not args.fixture:
+            parser.error("--enregistrer demande --fixture")
+        enregistrement = enregistrer(args.enregistrer, oracle_service.CONTRACT_ADDRESS, abi, args.fixture)
+        print(f"{len(enregistrement)} journaux enregistrés dans {args.fixture}")
+        return
+
+    if args.fixture:
+        mesurer('fixture', Enregistrement.charger(args.fixture), args.cibles, args.latence, args.max_logs)
+        return
+    for taille in args.evenements:
+        historique = HistoriqueSynthetique(abi, taille, args.produits, args.etapes)
+        mesurer(str(historique.evenements), historique, args.cibles, args.latence, args.max_logs)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+"""
+Ingestion des étapes par l'oracle : SELECT + INSERT ligne à ligne contre
+l'écriture ensembliste de bulk_upsert (INSERT OR IGNORE en executemany sur
+SQLite, COPY + INSERT ... ON CONFLICT DO NOTHING sur PostgreSQL).
+Chaque étape porte l'identité du log dont elle provient ; la moitié des
+lignes du second passage sont des doublons.
+
+Usage (depuis backend/) :
+    python -m benchmarks.bench_upsert --rows 20000
+    python -m benchmarks.bench_upsert --rows 20000 --postgres "dbname=scratch user=postgres"
+
+Sur PostgreSQL, les tables sont créées dans un schéma bench_oracle supprimé à la fin.
+"""
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from bulk_upsert import writer_for
+
+COLUMNS = ('produit_id', 'date', 'operation', 'operateur', 'lieu', 'temperature', 'humidite',
+           'bloc', 'bloc_hash', 'tx_hash', 'log_index')
+
+
+def make_rows(count, offset=0):
+    origin = datetime(2024, 1, 1)
+    return [
+        (f"X{i % 1000}", origin + timedelta(minutes=i), f"Etape {i % 7}", f"Operateur {i % 13}", "Agadir",
+         random.uniform(20, 30), random.uniform(40, 80),
+         i // 4, f"0x{i // 4:064x}", f"0x{i:064x}", i % 4)
+        for i in range(offset, offset + count)
+    ]
+
+
+def per_row(conn, placeholder, rows):
+    cur = conn.cursor()
+    select = "SELECT id FROM etape WHERE bloc_hash = %s AND tx_hash = %s AND log_index = %s".replace('%s', placeholder)
+    insert = f"INSERT INTO etape ({', '.join(COLUMNS)}) VALUES ({', '.join([placeholder] * len(COLUMNS))})"
+    for row in rows:
+        cur.execute(select, row[-3:])
+        if not cur.fetchone():
+            cur.execute(insert, row)
+    conn.commit()
+    cur.close()
+
+
+def run(label, connect, create_table, placeholder, rows):
+    first, second = rows[:len(rows) // 2], rows[len(rows) // 4:len(rows) * 3 // 4]
+
+    conn = connect()
+    create_table(conn)
+    started = time.perf_counter()
+    per_row(conn, placeholder, first)
+    per_row(conn, placeholder, second)
+    elapsed = time.perf_counter() - started
+    print(f"{label:<10} ligne à ligne : {len(first) + len(second):8d} lignes en {elapsed:6.2f}s "
+          f"({(len(first) + len(second)) / elapsed:9.0f} lignes/s)")
+    conn.close()
+
+    conn = connect()
+    create_table(conn)
+    writer = writer_for(conn)
+    writer.ensure_schema()
+    conn.commit()
+    for batch in (first, second):
+        writer.upsert('etape', COLUMNS, batch)
+        conn.commit()
+    for line in writer.report():
+        print(f"{label:<10} ensembliste   : {line}")
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=20000)
+    parser.add_argument('--postgres', default=None, help="DSN d'une base PostgreSQL de test")
+    args = parser.parse_args()
+    rows = make_rows(args.rows)
+
+    with tempfile.TemporaryDirectory() as path:
+        database = os.path.join(path, 'oracle.db')
+
+        def sqlite_table(conn):
+            conn.execute("DROP TABLE IF EXISTS etape")
+            conn.execute("CREATE TABLE etape (id INTEGER PRIMARY KEY, produit_id VARCHAR(64), date TIMESTAMP, "
+                         "operation TEXT, operateur TEXT, lieu TEXT, temperature FLOAT, humidite FLOAT, "
+                         "bloc BIGINT, bloc_hash VARCHAR(66), tx_hash VARCHAR(66), log_index INTEGER)")
+            conn.commit()
+
+        run('sqlite', lambda: sqlite3.connect(database), sqlite_table, '?', rows)
+
+    if args.postgres:
+        import psycopg2
+
+        def pg_connect():
+            conn = psycopg2.connect(args.postgres)
+            with conn.cursor() as cur:
+                cur.execute("CREATE SCHEMA IF NOT EXISTS bench_oracle")
+                cur.execute("SET search_path TO bench_oracle")
+            return conn
+
+        def pg_table(conn):
+            with conn.cursor() as cur:
+                cur.execute("DROP TABLE IF EXISTS etape")
+                cur.execute("CREATE TABLE etape (id SERIAL PRIMARY KEY, produit_id VARCHAR(64), date TIMESTAMP, "
+                            "operation TEXT, operateur TEXT, lieu TEXT, temperature FLOAT, humidite FLOAT, "
+                            "bloc BIGINT, bloc_hash VARCHAR(66), tx_hash VARCHAR(66), log_index INTEGER)")
+            conn.commit()
+
+        try:
+            run('postgresql', pg_connect, pg_table, '%s', rows)
+        finally:
+            conn = psycopg2.connect(args.postgres)
+            with conn.cursor() as cur:
+                cur.execute("DROP SCHEMA IF EXISTS bench_oracle CASCADE")
+            conn.commit()
+            conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,491 @@
+"""
+Enregistrement et rejeu de l'historique du contrat, pour mesurer l'oracle
+et /api/sync sans Ganache.
+
+- `enregistrer(url, adresse, abi, chemin)` capture sur un nœud réel les
+  journaux du contrat et les réponses des appels view utilisés par la
+  synchronisation (producteurs, produits, étapes), figées au bloc de tête,
+  dans un fichier JSON gzip compact.
+- `Enregistrement.charger(chemin)` relit ce fichier ; `HistoriqueSynthetique`
+  produit à la demande un historique de taille arbitraire (10k à 1M
+  événements) sans rien garder en mémoire.
+- `ReplayProvider` sert l'un ou l'autre à Web3 dans le processus ;
+  `ReplayNode` les sert en HTTP (requêtes simples et batch), pour les
+  chemins qui postent directement au nœud (BatchCaller). Les deux
+  ajoutent une latence configurable par requête.
+
+eth_getLogs est filtré par plage, adresse et topics comme sur un nœud ;
+`max_logs` reproduit la limite de résultats des fournisseurs publics.
+
+    historique = HistoriqueSynthetique(evenements=100000)
+    node = ReplayNode(historique, latency=0.005).start()
+    web3 = Web3(Web3.HTTPProvider(node.url))
+"""
+import gzip
+import hashlib
+import json
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import requests
+from web3 import Web3
+from web3.providers.base import BaseProvider
+
+from recuperation_journaux import RecuperateurJournaux, ordre_chaine
+from rpc_batch import abi_decode, abi_encode, contract_events, contract_functions
+
+CHAIN_ID = 1337
+REGIONS = ['Souss-Massa', 'Drâa-Tafilalet', 'Fès-Meknès', 'Marrakech-Safi']
+DEBUT_CHAINE = 1700000000  # Horodatage du bloc 0 des historiques synthétiques
+
+
+class ExecutionReverted(Exception):
+    """Appel view annulé par le contrat (identifiant inconnu)"""
+
+
+class AppelNonEnregistre(Exception):
+    """Appel view absent de l'enregistrement : le rejeu ne peut pas y répondre"""
+
+
+def _bloc(value, tete: int) -> int:
+    if value in (None, 'latest', 'pending', 'safe', 'finalized'):
+        return tete
+    if value == 'earliest':
+        return 0
+    return int(value, 16) if isinstance(value, str) else int(value)
+
+
+def _hash(*parts) -> str:
+    return '0x' + hashlib.sha256(':'.join(str(part) for part in parts).encode()).hexdigest()
+
+
+def _filtre_topics(topics) -> Optional[set]:
+    # Seul le premier topic (signature de l'événement) sert de filtre ici
+    if not topics or topics[0] is None:
+        return None
+    premier = topics[0]
+    return {t.lower() for t in (premier if isinstance(premier, list) else [premier])}
+
+
+class Historique:
+    """
+    Source de réponses rejouées : journaux, appels view et blocs
+    """
+    address: str
+    tete: int
+
+    def journaux(self, depuis: int, jusqua: int) -> Iterable[Dict]:
+        raise NotImplementedError
+
+    def appel(self, data: str) -> str:
+        raise NotImplementedError
+
+    def hash_bloc(self, numero: int) -> str:
+        return _hash('bloc', numero)
+
+    def horodatage(self, numero: int) -> int:
+        return DEBUT_CHAINE + numero
+
+    def repondre(self, method: str, params: Sequence, max_logs: Optional[int] = None):
+        """
+        Résultat JSON-RPC de `method` ; lève ValueError({'code', 'message'}) en cas d'erreur
+        """
+        if method == 'eth_blockNumber':
+            return hex(self.tete)
+        if method == 'eth_chainId':
+            return hex(CHAIN_ID)
+        if method == 'net_version':
+            return str(CHAIN_ID)
+        if method == 'eth_getBlockByNumber':
+            numero = _bloc(params[0], self.tete)
+            if numero > self.tete:
+                return None
+            return {'number': hex(numero), 'hash': self.hash_bloc(numero),
+                    'parentHash': self.hash_bloc(numero - 1) if numero else '0x' + '00' * 32,
+                    'timestamp': hex(self.horodatage(numero)), 'transactions': []}
+        if method == 'eth_getLogs':
+            requete = params[0]
+            adresses = requete.get('address')
+            if adresses is not None:
+                # Une adresse ou une liste d'adresses, selon le client
+                adresses = adresses if isinstance(adresses, list) else [adresses]
+                if self.address.lower() not in (str(adresse).lower() for adresse in adresses):
+                    return []
+            depuis = _bloc(requete.get('fromBlock'), self.tete)
+            jusqua = min(_bloc(requete.get('toBlock'), self.tete), self.tete)
+            topics = _filtre_topics(requete.get('topics'))
+            logs = []
+            for log in self.journaux(depuis, jusqua):
+                if topics is None or log['topics'][0].lower() in topics:
+                    logs.append(log)
+                    if max_logs is not None and len(logs) > max_logs:
+                        raise ValueError({'code': -32005, 'message': f"query returned more than {max_logs} results"})
+            return logs
+        if method == 'eth_call':
+            appel = params[0]
+            if str(appel.get('to', '')).lower() != self.address.lower():
+                return '0x'
+            data = appel['data'] if 'data' in appel else appel['input']
+            try:
+                return self.appel(data)
+            except ExecutionReverted:
+                raise ValueError({'code': 3, 'message': 'execution reverted'})
+            except AppelNonEnregistre:
+                raise ValueError({'code': -32000, 'message': f"Appel eth_call non enregistré : {data}"})
+        raise ValueError({'code': -32601, 'message': f"Méthode non rejouée : {method}"})
+
+
+def _log(adresse, bloc, hash_bloc, tx_hash, indice, topics, data) -> Dict:
+    return {
+        'address': adresse,
+        'blockNumber': hex(bloc),
+        'blockHash': hash_bloc,
+        'transactionHash': tx_hash,
+        'transactionIndex': '0x0',
+        'logIndex': hex(indice),
+        'topics': topics,
+        'data': data,
+        'removed': False
+    }
+
+
+def _encoder_journal(decodeur, args: Dict) -> tuple:
+    # Topics et données d'un journal, comme les produirait l'EVM
+    topics = [decodeur.topic]
+    types, valeurs = [], []
+    for entree in decodeur.inputs:
+        valeur = args[entree['name']]
+        if entree.get('indexed'):
+            if entree['type'] in ('string', 'bytes'):
+                topics.append('0x' + bytes(Web3.keccak(text=valeur) if entree['type'] == 'string'
+                                           else Web3.keccak(valeur)).hex())
+            else:
+                topics.append('0x' + abi_encode([entree['type']], [valeur]).hex())
+        else:
+            types.append(entree['type'])
+            valeurs.append(valeur)
+    return topics, '0x' + abi_encode(types, valeurs).hex()
+
+
+class Enregistrement(Historique):
+    """
+    Historique capturé sur un nœud : journaux et réponses des appels view.
+    Un appel annulé par le contrat est enregistré avec la réponse None ; un
+    appel absent de l'enregistrement lève AppelNonEnregistre.
+    """
+    def __init__(self, address: str, tete: int, logs: List[List], appels: Dict[str, Optional[str]],
+                 blocs: Dict[int, str], horodatages: Optional[Dict[int, int]] = None):
+        self.address = address
+        self.tete = tete
+        # Journaux compacts [bloc, hash du bloc, hash de la transaction, indice, topics, data], par bloc
+        self._logs = sorted(logs, key=lambda log: (log[0], log[3]))
+        self._blocs_logs = [log[0] for log in self._logs]
+        self._appels = appels
+        self._blocs = blocs
+        self._horodatages = horodatages or {}
+
+    def journaux(self, depuis, jusqua):
+        for log in self._logs[bisect_left(self._blocs_logs, depuis):bisect_right(self._blocs_logs, jusqua)]:
+            bloc, hash_bloc, tx_hash, indice, topics, data = log
+            yield _log(self.address, bloc, hash_bloc, tx_hash, indice, topics, data)
+
+    def appel(self, data):
+        try:
+            resultat = self._appels[data.lower()]
+        except KeyError:
+            raise AppelNonEnregistre(data)
+        if resultat is None:
+            raise ExecutionReverted(data)
+        return resultat
+
+    def hash_bloc(self, numero):
+        return self._blocs.get(numero) or super().hash_bloc(numero)
+
+    def horodatage(self, numero):
+        return self._horodatages.get(numero, super().horodatage(numero))
+
+    def sauver(self, chemin: str):
+        with gzip.open(chemin, 'wt', encoding='utf-8') as f:
+            json.dump({
+                'address': self.address,
+                'tete': self.tete,
+                'logs': self._logs,
+                'appels': self._appels,
+                'blocs': {str(n): h for n, h in self._blocs.items()},
+                'horodatages': {str(n): t for n, t in self._horodatages.items()}
+            }, f, separators=(',', ':'))
+
+    @classmethod
+    def charger(cls, chemin: str) -> 'Enregistrement':
+        with gzip.open(chemin, 'rt', encoding='utf-8') as f:
+            contenu = json.load(f)
+        return cls(contenu['address'], contenu['tete'], contenu['logs'], contenu['appels'],
+                   {int(n): h for n, h in contenu['blocs'].items()},
+                   {int(n): t for n, t in contenu.get('horodatages', {}).items()})
+
+    def __len__(self):
+        return len(self._logs)
+
+
+class HistoriqueSynthetique(Historique):
+    """
+    Historique généré : pour chaque producteur, ProducteurAjoute puis, pour
+    chacun de ses `produits`, ProduitEnregistre suivi de `etapes`
+    EtapeAjoutee. Un événement par bloc, comme Ganache en minage automatique.
+    Journaux et réponses sont calculés à la demande.
+    """
+    def __init__(self, abi: List[Dict], evenements: int = 10000, produits: int = 10, etapes: int = 4,
+                 address: str = '0x' + '42' * 20):
+        self.address = Web3.to_checksum_address(address)
+        self.produits = produits
+        self.etapes = etapes
+        self.par_producteur = 1 + produits * (1 + etapes)
+        self.producteurs = max(1, -(-evenements // self.par_producteur))
+        self.evenements = self.producteurs * self.par_producteur
+        self.tete = self.evenements
+        self._decodeurs = contract_events(abi)
+        self._fonctions = {'0x' + f.selector.hex(): (nom, f) for nom, f in contract_functions(abi).items()}
+
+    # Position de l'événement i : bloc i + 1 (le bloc 0 est le déploiement du contrat)
+    def _evenement(self, i: int):
+        p, r = divmod(i, self.par_producteur)
+        if r == 0:
+            return 'ProducteurAjoute', {'id': f"P{p}", 'nom': f"Producteur {p}", 'region': REGIONS[p % len(REGIONS)]}
+        q, s = divmod(r - 1, 1 + self.etapes)
+        produit_id = f"P{p}-X{q}"
+        if s == 0:
+            return 'ProduitEnregistre', {'id': produit_id, 'nom': f"Produit {q}", 'idProducteur': f"P{p}"}
+        return 'EtapeAjoutee', {'idProduit': produit_id, 'operation': f"Etape {s}"}
+
+    def _bloc_produit(self, p: int, q: int) -> int:
+        return p * self.par_producteur + 1 + q * (1 + self.etapes) + 1
+
+    def journaux(self, depuis, jusqua):
+        for bloc in range(max(depuis, 1), min(jusqua, self.evenements) + 1):
+            evenement, args = self._evenement(bloc - 1)
+            topics, data = _encoder_journal(self._decodeurs[evenement], args)
+            yield _log(self.address, bloc, self.hash_bloc(bloc), _hash('tx', bloc), 0, topics, data)
+
+    def _produit(self, produit_id: str):
+        try:
+            producteur, produit = produit_id.split('-X')
+            p, q = int(producteur[1:]), int(produit)
+        except ValueError:
+            raise ExecutionReverted(produit_id)
+        if not (0 <= p < self.producteurs and 0 <= q < self.produits):
+            raise ExecutionReverted(produit_id)
+        return p, q
+
+    def _valeur(self, nom: str, args: Sequence):
+        if nom in ('obtenirProducteur', 'producteurs'):
+            identifiant = args[0]
+            if not (identifiant[:1] == 'P' and identifiant[1:].isdigit() and int(identifiant[1:]) < self.producteurs):
+                raise ExecutionReverted(identifiant)
+            p = int(identifiant[1:])
+            return (identifiant, f"Producteur {p}", REGIONS[p % len(REGIONS)], True)
+        if nom in ('obtenirProduit', 'produits'):
+            p, q = self._produit(args[0])
+            return (args[0], f"Produit {q}", f"P{p}", REGIONS[p % len(REGIONS)],
+                    self.horodatage(self._bloc_produit(p, q)), q % 2 == 0)
+        if nom == 'nombreEtapes':
+            self._produit(args[0])
+            return 1 + self.etapes
+        if nom in ('obtenirEtape', 'etapesProduit'):
+            p, q = self._produit(args[0])
+            k = int(args[1])
+            if not 0 <= k <= self.etapes:
+                raise ExecutionReverted(args)
+            bloc = self._bloc_produit(p, q) + k
+            if k == 0:
+                return (self.horodatage(bloc), 'Recolte', f"P{p}", REGIONS[p % len(REGIONS)])
+            return (self.horodatage(bloc), f"Etape {k}", f"Operateur {k}", 'Agadir')
+        raise ExecutionReverted(nom)
+
+    def appel(self, data):
+        data = data.lower()
+        try:
+            nom, fonction = self._fonctions[data[:10]]
+        except KeyError:
+            raise ExecutionReverted(data)
+        valeur = self._valeur(nom, abi_decode(fonction.inputs, bytes.fromhex(data[10:])))
+        # Même convention que l'ABI : une structure unique est encodée comme un tuple
+        valeurs = [valeur] if len(fonction.outputs) == 1 else list(valeur)
+        return '0x' + abi_encode(fonction.outputs, valeurs).hex()
+
+    def __len__(self):
+        return self.evenements
+
+
+# ----------------------------------------------------------------------
+# Enregistrement depuis un nœud réel
+# ----------------------------------------------------------------------
+def _batch(session, url, requetes: List[tuple], taille: int = 100, erreurs_ignorees: bool = False) -> List:
+    # Réponses JSON-RPC brutes (chaînes hexadécimales), telles qu'elles seront rejouées
+    resultats = []
+    for debut in range(0, len(requetes), taille):
+        paquet = [{'jsonrpc': '2.0', 'id': i, 'method': m, 'params': p}
+                  for i, (m, p) in enumerate(requetes[debut:debut + taille])]
+        reponse = session.post(url, json=paquet, timeout=60)
+        reponse.raise_for_status()
+        par_id = {item['id']: item for item in reponse.json()}
+        for i in range(len(paquet)):
+            if par_id[i].get('error') and not erreurs_ignorees:
+                raise ValueError(par_id[i]['error'])
+            resultats.append(par_id[i].get('result'))
+    return resultats
+
+
+def enregistrer(url: str, address: str, abi: List[Dict], chemin: str, fenetre: int = 2000) -> Enregistrement:
+    """
+    Capture l'historique du contrat sur le nœud `url` et l'écrit dans `chemin`
+    """
+    session = requests.Session()
+    web3 = Web3(Web3.HTTPProvider(url, session=session))
+    tete = web3.eth.block_number
+    decodeurs = {decodeur.topic: decodeur for decodeur in contract_events(abi).values()}
+
+    def get_logs(debut, fin):
+        return _batch(session, url, [('eth_getLogs', [{'address': address, 'fromBlock': hex(debut),
+                                                        'toBlock': hex(fin)}])])[0]
+
+    bruts = RecuperateurJournaux(fenetre).recuperer(get_logs, 0, tete)
+    # Certains nœuds de test rendent les nombres en entiers plutôt qu'en hexadécimal
+    logs = []
+    for log in bruts:
+        bloc, indice = ordre_chaine(log)
+        logs.append([bloc, log['blockHash'], log['transactionHash'], indice, log['topics'], log['data']])
+    blocs = {log[0]: log[1] for log in logs}
+
+    # Appels view de la synchronisation, figés au bloc de tête
+    producteurs, produits = [], []
+    for log in bruts:
+        decodeur = decodeurs.get(log['topics'][0])
+        if decodeur is None:
+            continue
+        event = decodeur.decode(log)
+        if event['event'] == 'ProducteurAjoute':
+            producteurs.append(event['args']['id'])
+        elif event['event'] == 'ProduitEnregistre':
+            produits.append(event['args']['id'])
+
+    fonctions = contract_functions(abi)
+
+    def data(nom, *args):
+        return fonctions[nom].encode(args).lower()
+
+    appels = [data(nom, pid) for pid in producteurs for nom in ('obtenirProducteur', 'producteurs')]
+    appels += [data(nom, pid) for pid in produits for nom in ('obtenirProduit', 'produits', 'nombreEtapes')]
+    nombres = _batch(session, url, [('eth_call', [{'to': address, 'data': data('nombreEtapes', pid)}, hex(tete)])
+                                    for pid in produits])
+    appels += [data(nom, pid, k) for pid, n in zip(produits, nombres) for k in range(int(n, 16))
+               for nom in ('obtenirEtape', 'etapesProduit')]
+    # Un appel annulé par le contrat (réponse None) est gardé pour être rejoué comme tel
+    resultats = _batch(session, url, [('eth_call', [{'to': address, 'data': d}, hex(tete)]) for d in appels],
+                       erreurs_ignorees=True)
+
+    tete_bloc = web3.eth.get_block(tete)
+    blocs[tete] = '0x' + bytes(tete_bloc['hash']).hex()
+    enregistrement = Enregistrement(
+        address, tete, logs, dict(zip(appels, resultats)), blocs,
+        {tete: tete_bloc['timestamp']}
+    )
+    enregistrement.sauver(chemin)
+    session.close()
+    return enregistrement
+
+
+# ----------------------------------------------------------------------
+# Rejeu
+# ----------------------------------------------------------------------
+class ReplayProvider(BaseProvider):
+    """
+    Fournisseur Web3 en mémoire : Web3(ReplayProvider(historique, latency=0.01))
+    """
+    def __init__(self, historique: Historique, latency: float = 0.0, max_logs: Optional[int] = None):
+        super().__init__()
+        self.historique = historique
+        self.latency = latency
+        self.max_logs = max_logs
+        self.rpc_calls = 0
+
+    def make_request(self, method, params):
+        self.rpc_calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        return _reponse(self.historique, {'id': 0, 'method': method, 'params': params}, self.max_logs)
+
+    def is_connected(self, show_traceback: bool = False) -> bool:
+        return True
+
+    isConnected = is_connected  # web3 5
+
+
+def _reponse(historique: Historique, requete: Dict, max_logs: Optional[int]) -> Dict:
+    try:
+        reponse = {'result': historique.repondre(requete['method'], requete.get('params', []), max_logs)}
+    except ValueError as e:
+        erreur = e.args[0] if e.args and isinstance(e.args[0], dict) else {'code': -32000, 'message': str(e)}
+        reponse = {'error': erreur}
+    reponse['jsonrpc'] = '2.0'
+    reponse['id'] = requete.get('id')
+    return reponse
+
+
+class ReplayNode:
+    """
+    Sert un historique en JSON-RPC sur HTTP, avec la même interface que StandInNode
+
+        node = ReplayNode(historique, latency=0.01).start()
+        ... Web3(Web3.HTTPProvider(node.url)) ...
+        node.stop()
+    """
+    def __init__(self, historique: Historique, latency: float = 0.0, max_logs: Optional[int] = None):
+        self.historique = historique
+        self.latency = latency
+        self.max_logs = max_logs
+        self.http_requests = 0
+        self.rpc_calls = 0
+        self._lock = threading.Lock()
+        self._server = None
+
+    def start(self):
+        node = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            disable_nagle_algorithm = True
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                requetes = body if isinstance(body, list) else [body]
+                with node._lock:
+                    node.http_requests += 1
+                    node.rpc_calls += len(requetes)
+                if node.latency:
+                    time.sleep(node.latency)
+                reponses = [_reponse(node.historique, r, node.max_logs) for r in requetes]
+                data = json.dumps(reponses if isinstance(body, list) else reponses[0]).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
@@ -0,0 +1,135 @@
+"""
+Nœud JSON-RPC local de substitution à Ganache, pour les tests et les benchmarks.
+
+Sert en HTTP (requêtes simples et batch) une chaîne eth-tester en mémoire,
+avec une latence réseau simulée par requête HTTP. Le contrat du projet est
+déployé depuis son artefact Truffle.
+
+Nécessite : pip install "eth-tester[py-evm]"
+"""
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from web3 import Web3, EthereumTesterProvider
+
+CONTRACT_ARTIFACT = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+    'tracabilite_agricole_maroc', 'build', 'contracts', 'TracabiliteAgricoleMaroc.json'
+)
+
+
+def _jsonable(value):
+    if isinstance(value, (bytes, bytearray)):
+        return '0x' + bytes(value).hex()
+    if isinstance(value, dict):
+        return {k: _jsonable(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_jsonable(v) for v in value]
+    return value
+
+
+class StandInNode:
+    """
+    node = StandInNode(latency=0.01).start()
+    web3 = Web3(Web3.HTTPProvider(node.url)) ; node.contract pour les écritures
+    """
+    def __init__(self, latency: float = 0.0, max_logs: int = None):
+        self.latency = latency
+        # Comme les fournisseurs publics : eth_getLogs refusé au-delà de `max_logs` résultats
+        self.max_logs = max_logs
+        self.provider = EthereumTesterProvider()
+        self.web3 = Web3(self.provider)
+        self.web3.eth.default_account = self.web3.eth.accounts[0]
+        self.http_requests = 0
+        self.rpc_calls = 0
+        self._lock = threading.Lock()
+
+        with open(CONTRACT_ARTIFACT, 'r') as f:
+            artifact = json.load(f)
+        self.abi = artifact['abi']
+        factory = self.web3.eth.contract(abi=self.abi, bytecode=artifact['bytecode'])
+        receipt = self.web3.eth.wait_for_transaction_receipt(factory.constructor().transact())
+        self.contract = self.web3.eth.contract(address=receipt.contractAddress, abi=self.abi)
+        self._server = None
+        # Middleware propres au fournisseur uniquement : réponses au format JSON-RPC brut
+        raw = Web3(self.provider, middleware=[])
+        self._request_func = self.provider.request_func(raw, raw.middleware_onion)
+
+    def _handle(self, request):
+        with self._lock:
+            self.rpc_calls += 1
+            try:
+                reply = self._request_func(request['method'], request.get('params', []))
+                if (request['method'] == 'eth_getLogs' and self.max_logs is not None
+                        and len(reply.get('result') or ()) > self.max_logs):
+                    reply = {'error': {'code': -32005,
+                                       'message': f"query returned more than {self.max_logs} results"}}
+            except Exception as e:
+                reply = {'error': {'code': -32000, 'message': str(e)}}
+        reply = _jsonable(dict(reply))
+        reply['jsonrpc'] = '2.0'
+        reply['id'] = request.get('id')
+        return reply
+
+    def start(self):
+        node = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # En-têtes et corps sont écrits séparément : sans TCP_NODELAY, une connexion
+            # keep-alive attendrait l'ACK retardé du client à chaque réponse
+            disable_nagle_algorithm = True
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                node.http_requests += 1
+                if node.latency:
+                    time.sleep(node.latency)
+                reply = [node._handle(r) for r in body] if isinstance(body, list) else node._handle(body)
+                data = json.dumps(reply).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def transact(self, fn_name: str, *args):
+        """
+        Transaction sur le contrat, sérialisée avec les requêtes servies en HTTP
+        """
+        with self._lock:
+            return getattr(self.contract.functions, fn_name)(*args).transact()
+
+    def seed(self, producteurs: int, produits_par_producteur: int, etapes_par_produit: int):
+        """
+        Remplit le contrat : producteurs vérifiés, produits et étapes
+        """
+        c = self.contract
+        for p in range(producteurs):
+            pid = f"P{p}"
+            c.functions.ajouterProducteur(pid, f"Producteur {p}", "Souss-Massa").transact()
+            c.functions.verifierProducteur(pid).transact()
+            for q in range(produits_par_producteur):
+                produit_id = f"{pid}-X{q}"
+                c.functions.enregistrerProduit(produit_id, f"Produit {q}", pid, "Souss-Massa", q % 2 == 0).transact()
+                for e in range(etapes_par_produit):
+                    c.functions.ajouterEtape(produit_id, f"Etape {e}", f"Operateur {e}", "Agadir").transact()
@@ -1,61 +1,259 @@
 import hashlib
+import os
 import json
+import struct
+import threading
 import time
-from datetime import datetime
-from typing import List, Dict
+from contextlib import nullcontext
+from typing import List, Dict, Iterator, Optional
+from chain_store import SegmentStore
+from chain_index import HashIndex, ScalableBloomFilter
+from chain_validator import ChainValidator
+from chain_snapshot import Snapshot, write_snapshot, load_latest_snapshot
+from merkle import record_hash, build_tree, merkle_proof, verify_proof
+
+# Type des blocs regroupant plusieurs enregistrements sous une racine de Merkle
+MERKLE_BATCH_TYPE = "lot_merkle"
+
+# Version 1 : hash JSON du bloc complet (chaînes historiques)
+# Version 2 : hash d'un en-tête binaire fixe suivi de l'encodage canonique des données
+BLOCK_VERSION = 2
+BLOCK_HEADER = struct.Struct('<BQd32sI')
+
+def canonical_encode(data: Dict) -> bytes:
+    return json.dumps(data, sort_keys=True, separators=(',', ':')).encode()
 
 class Block:
+    """
+    Bloc compact : pas de __dict__, les données sont conservées uniquement
+    sous leur encodage canonique, calculé une seule fois à la création.
+    """
+    __slots__ = ('index', 'timestamp', 'payload', 'previous_hash', 'hash', 'version')
+
     def __init__(self, index: int, data: Dict, timestamp: float, previous_hash: str):
         self.index = index
         self.timestamp = timestamp
-        self.data = data
+        self.payload = canonical_encode(data)
         self.previous_hash = previous_hash
+        self.version = BLOCK_VERSION
         self.hash = self.calculate_hash()
 
+    @property
+    def data(self) -> Dict:
+        return json.loads(self.payload)
+
+    @data.setter
+    def data(self, data: Dict):
+        self.payload = canonical_encode(data)
+
     def calculate_hash(self) -> str:
-        block_string = json.dumps({
+        if self.version == 1:
+            block_string = json.dumps({
+                "index": self.index,
+                "timestamp": self.timestamp,
+                "data": self.data,
+                "previous_hash": self.previous_hash
+            }, sort_keys=True).encode()
+            return hashlib.sha256(block_string).hexdigest()
+
+        header = BLOCK_HEADER.pack(
+            self.version,
+            self.index,
+            self.timestamp,
+            bytes.fromhex(self.previous_hash.rjust(64, '0')),
+            len(self.payload)
+        )
+        return hashlib.sha256(header + self.payload).hexdigest()
+
+    def to_dict(self) -> Dict:
+        record = {
             "index": self.index,
             "timestamp": self.timestamp,
-            "data": self.data,
-            "previous_hash": self.previous_hash
-        }, sort_keys=True).encode()
-        return hashlib.sha256(block_string).hexdigest()
+            "previous_hash": self.previous_hash,
+            "hash": self.hash,
+            "version": self.version
+        }
+        if self.version == 1:
+            record["data"] = self.data
+        else:
+            record["payload"] = self.payload.decode()
+        return record
+
+    @classmethod
+    def from_dict(cls, record: Dict) -> 'Block':
+        """
+        Reconstruit un bloc stocké sans recalculer son hash, afin que
+        la validation détecte toute altération du contenu sur disque
+        """
+        block = cls.__new__(cls)
+        block.index = record["index"]
+        block.timestamp = record["timestamp"]
+        block.previous_hash = record["previous_hash"]
+        block.hash = record["hash"]
+        block.version = record.get("version", 1)
+        if "payload" in record:
+            block.payload = record["payload"].encode()
+        else:
+            block.payload = canonical_encode(record["data"])
+        return block
+
+class PersistentChain:
+    """
+    Vue séquentielle d'une chaîne stockée sur disque.
+    Se comporte comme une liste de blocs (len, indexation, itération, append)
+    sans charger l'historique en mémoire.
+    """
+    def __init__(self, store: SegmentStore):
+        self.store = store
+
+    def __len__(self) -> int:
+        return len(self.store)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        return Block.from_dict(self.store.get(index))
+
+    def __iter__(self) -> Iterator[Block]:
+        for record in self.store.iter_range():
+            yield Block.from_dict(record)
+
+    def append(self, block: Block):
+        self.store.append(block.to_dict())
+
+    def extend(self, blocks: List[Block]):
+        self.store.append_many([block.to_dict() for block in blocks])
 
 class Blockchain:
-    def __init__(self):
-        self.chain: List[Block] = []
-        self.create_genesis_block()
+    def __init__(self, storage_path: Optional[str] = None, snapshot_every: int = 100000,
+                 read_only: bool = False):
+        """
+        `read_only` : lecteur d'une chaîne écrite par un autre processus (ni verrou
+        d'écriture, ni réparation, ni bloc de genèse, ni fichier modifié)
+        """
+        self.read_only = read_only
+        self._lock = threading.Lock()
+        self._snapshot_lock = threading.Lock()
+        self.snapshot_every = snapshot_every
+        self.snapshot_path = os.path.join(storage_path, 'snapshots') if storage_path else None
+        snapshot = None
+        if storage_path:
+            self.chain = PersistentChain(SegmentStore(storage_path, read_only=read_only))
+        else:
+            self.chain: List[Block] = []
+        # Plusieurs workers peuvent ouvrir la même chaîne en même temps
+        with self._exclusive():
+            if storage_path:
+                # Démarrage à froid : dernier instantané puis rejeu des blocs suivants
+                snapshot = load_latest_snapshot(self.snapshot_path, self.chain)
+                self.hash_index = HashIndex(os.path.join(storage_path, 'index'), snapshot=snapshot,
+                                            read_only=read_only)
+            else:
+                self.hash_index = HashIndex()
+            if len(self.chain) == 0 and not read_only:
+                self.create_genesis_block()
+            self.hash_index.sync_with(self.chain)
+        self.validator = ChainValidator(self, storage_path)
+        if snapshot is not None and snapshot.validated_height > self.validator.verified_height:
+            self.validator.verified_height = snapshot.validated_height
+            self.validator.verified_hash = snapshot.validated_hash
+
+    def _exclusive(self):
+        if isinstance(self.chain, PersistentChain):
+            return self.chain.store.exclusive()
+        return nullcontext()
+
+    def refresh(self):
+        """
+        Prend en compte, sans verrou, les blocs ajoutés par d'autres processus
+        partageant le même stockage
+        """
+        if isinstance(self.chain, PersistentChain):
+            self.chain.store.refresh()
+            self.hash_index.refresh()
+            if self.read_only:
+                # Blocs écrits dont le digest n'est pas encore dans hashes.bin
+                self.hash_index.sync_with(self.chain)
 
     def create_genesis_block(self):
         genesis_block = Block(0, {"message": "Genesis Block"}, time.time(), "0")
         self.chain.append(genesis_block)
+        self.hash_index.add(genesis_block.hash, genesis_block.index)
 
     def get_latest_block(self) -> Block:
         return self.chain[-1]
 
     def add_block(self, data: Dict) -> Block:
-        previous_block = self.get_latest_block()
-        new_block = Block(
-            previous_block.index + 1,
-            data,
-            time.time(),
-            previous_block.hash
-        )
-        self.chain.append(new_block)
-        return new_block
+        return self.add_blocks([data])[0]
 
-    def is_chain_valid(self) -> bool:
-        for i in range(1, len(self.chain)):
-            current_block = self.chain[i]
-            previous_block = self.chain[i-1]
+    def add_blocks(self, data_list: List[Dict]) -> List[Block]:
+        """
+        Ajoute plusieurs blocs sous un seul verrou, puis les rend durables
+        en une seule écriture sur disque
+        """
+        with self._lock, self._exclusive():
+            self.refresh()
+            self.hash_index.sync_with(self.chain)
+            previous_block = self.get_latest_block()
+            new_blocks = []
+            for data in data_list:
+                new_block = Block(
+                    previous_block.index + 1,
+                    data,
+                    time.time(),
+                    previous_block.hash
+                )
+                new_blocks.append(new_block)
+                previous_block = new_block
+            self.chain.extend(new_blocks)
+            for new_block in new_blocks:
+                self.hash_index.add(new_block.hash, new_block.index)
+        self._maybe_snapshot()
+        return new_blocks
 
-            if current_block.hash != current_block.calculate_hash():
-                return False
+    def _maybe_snapshot(self):
+        if self.snapshot_path is None:
+            return
+        covered = self.hash_index.snapshot.height if self.hash_index.snapshot is not None else 0
+        if len(self.chain) - covered >= self.snapshot_every and not self._snapshot_lock.locked():
+            threading.Thread(target=self.write_snapshot, daemon=True).start()
 
-            if current_block.previous_hash != previous_block.hash:
-                return False
+    def write_snapshot(self) -> Optional[str]:
+        """
+        Écrit un instantané (hash de tête, index des hash, hauteur validée)
+        afin que le prochain démarrage ne rejoue que les blocs postérieurs.
+        L'état est capturé sous verrou, le fichier est écrit hors verrou.
+        """
+        if self.snapshot_path is None or self.read_only:
+            return None
+        with self._snapshot_lock:
+            with self._lock, self._exclusive():
+                self.refresh()
+                self.hash_index.sync_with(self.chain)
+                height, entries = self.hash_index.snapshot_entries()
+                tip_hash = self.chain[height - 1].hash
+                bloom = ScalableBloomFilter.from_bytes(self.hash_index.bloom.to_bytes())
+                validated_height = min(self.validator.verified_height, height - 1)
+                validated_hash = self.chain[validated_height].hash if self.validator.verified_hash else None
 
-        return True
+            path = write_snapshot(self.snapshot_path, height, tip_hash, validated_height,
+                                  validated_hash, bloom, entries)
+            self.hash_index.install_snapshot(Snapshot(path))
+            return path
+
+    def is_chain_valid(self) -> bool:
+        """
+        Vérifie les blocs ajoutés depuis le dernier point de contrôle
+        """
+        self.refresh()
+        return self.validator.validate_incremental()['valid']
+
+    def audit(self, workers: Optional[int] = None) -> Dict:
+        """
+        Recalcule toute la chaîne en parallèle (audit complet)
+        """
+        self.refresh()
+        return self.validator.full_audit(workers)
 
     def get_block_data(self, index: int) -> Dict:
         if 0 <= index < len(self.chain):
@@ -65,35 +263,231 @@ class Blockchain:
     def get_all_data(self) -> List[Dict]:
         return [block.data for block in self.chain[1:]]  # Exclude genesis block
 
+    def iter_blocks(self, start: int = 1, stop: Optional[int] = None, reverse: bool = False) -> Iterator[Block]:
+        """
+        Parcourt paresseusement une plage de blocs [start, stop)
+        """
+        stop = len(self.chain) if stop is None else min(stop, len(self.chain))
+        positions = range(stop - 1, start - 1, -1) if reverse else range(start, stop)
+        for position in positions:
+            yield self.chain[position]
+
+    def find_height_at(self, timestamp: float) -> int:
+        """
+        Premier bloc dont l'horodatage est >= timestamp (recherche dichotomique,
+        les blocs étant ajoutés dans l'ordre chronologique)
+        """
+        low, high = 1, len(self.chain)
+        while low < high:
+            middle = (low + high) // 2
+            if self.chain[middle].timestamp < timestamp:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def get_history_page(self, cursor: Optional[int] = None, limit: int = 20,
+                         record_type: Optional[str] = None, since: Optional[float] = None,
+                         until: Optional[float] = None, max_scan: int = 10000) -> Dict:
+        """
+        Retourne une page de l'historique, du plus récent au plus ancien.
+        Le curseur est la position du prochain bloc à examiner ; next_cursor vaut
+        None quand l'historique est épuisé. Au plus max_scan blocs sont lus par
+        appel, même si le filtre par type écarte la plupart d'entre eux.
+        """
+        self.refresh()
+        low = self.find_height_at(since) if since is not None else 1
+        high = self.find_height_at(until) if until is not None else len(self.chain)
+        start = high - 1 if cursor is None else min(cursor, high - 1)
+
+        items = []
+        position = start
+        scanned = 0
+        while position >= low and len(items) < limit and scanned < max_scan:
+            block = self.chain[position]
+            data = block.data
+            if record_type is None or data.get("type") == record_type:
+                items.append({
+                    "index": block.index,
+                    "hash": block.hash,
+                    "timestamp": block.timestamp,
+                    "data": data
+                })
+            position -= 1
+            scanned += 1
+
+        return {
+            "items": items,
+            "next_cursor": position if position >= low else None
+        }
+
+    def find_block_index(self, block_hash: str, refresh: bool = True) -> Optional[int]:
+        """
+        `refresh=False` : hash absent de l'index, sans relire le stockage partagé
+        """
+        position = self.hash_index.get(block_hash)
+        if position is None and refresh and isinstance(self.chain, PersistentChain):
+            # Le bloc a pu être ajouté par un autre worker
+            self.refresh()
+            position = self.hash_index.get(block_hash)
+        if position is not None and position >= len(self.chain):
+            return None
+        return position
+
+    def close(self):
+        with self._snapshot_lock:
+            self.hash_index.close()
+        if isinstance(self.chain, PersistentChain):
+            self.chain.store.close()
+
+class GroupCommit:
+    """
+    Commit groupé des ajouts concurrents.
+
+    Chaque appelant dépose sa demande dans une file ; le premier à obtenir
+    le verrou de commit (le meneur) ajoute toute la file en un seul appel à
+    add_blocks (un verrou, une écriture durable), pendant que les suivants
+    s'accumulent pour le lot d'après. Chaque appelant récupère son propre bloc.
+    """
+    def __init__(self, blockchain: Blockchain):
+        self.blockchain = blockchain
+        self._queue_lock = threading.Lock()
+        self._commit_lock = threading.Lock()
+        self._pending = []
+        self.batches = 0
+        self.committed = 0
+
+    def submit(self, data: Dict) -> Block:
+        entry = {"data": data, "block": None, "error": None, "done": False}
+        with self._queue_lock:
+            self._pending.append(entry)
+
+        with self._commit_lock:
+            if not entry["done"]:
+                with self._queue_lock:
+                    batch, self._pending = self._pending, []
+                try:
+                    blocks = self.blockchain.add_blocks([e["data"] for e in batch])
+                    for e, block in zip(batch, blocks):
+                        e["block"] = block
+                except Exception as error:
+                    for e in batch:
+                        e["error"] = error
+                for e in batch:
+                    e["done"] = True
+                self.batches += 1
+                self.committed += len(batch)
+
+        if entry["error"] is not None:
+            raise entry["error"]
+        return entry["block"]
+
 class DataSecurity:
-    def __init__(self):
-        self.blockchain = Blockchain()
+    def __init__(self, storage_path: Optional[str] = None, batch_size: int = 1024, read_only: bool = False):
+        self.blockchain = Blockchain(storage_path, read_only=read_only)
+        self.batch_size = batch_size
+        self.group_commit = GroupCommit(self.blockchain)
 
     def secure_data(self, data: Dict) -> str:
         """
         Sécurise les données en les ajoutant à la blockchain
         Retourne l'hash du bloc créé
         """
-        block = self.blockchain.add_block(data)
+        block = self.group_commit.submit(data)
         return block.hash
 
+    def secure_batch(self, records: List[Dict]) -> List[Dict]:
+        """
+        Sécurise un lot d'enregistrements : un seul bloc par tranche de
+        batch_size enregistrements, scellé par une racine de Merkle.
+        Retourne pour chaque enregistrement un reçu (hash du bloc, index de
+        la feuille, chemin de preuve).
+        """
+        receipts = []
+        for start in range(0, len(records), self.batch_size):
+            batch = records[start:start + self.batch_size]
+            leaves = [record_hash(record) for record in batch]
+            levels = build_tree(leaves)
+            block = self.blockchain.add_block({
+                "type": MERKLE_BATCH_TYPE,
+                "merkle_root": levels[-1][0],
+                "count": len(batch),
+                "records": batch
+            })
+            for leaf_index in range(len(batch)):
+                receipts.append({
+                    "block_hash": block.hash,
+                    "leaf_index": leaf_index,
+                    "proof": merkle_proof(levels, leaf_index)
+                })
+        return receipts
+
+    def verify_record(self, record: Dict, receipt: Dict) -> bool:
+        """
+        Vérifie qu'un enregistrement appartient au lot référencé par son reçu
+        (O(log n) hash, sans relire les autres enregistrements du lot)
+        """
+        position = self.blockchain.find_block_index(receipt.get("block_hash"))
+        if position is None:
+            return False
+        merkle_root_hash = self.blockchain.chain[position].data.get("merkle_root")
+        if merkle_root_hash is None:
+            return False
+        return verify_proof(record_hash(record), receipt["proof"], merkle_root_hash)
+
     def verify_data(self, data_hash: str) -> bool:
         """
         Vérifie si les données existent dans la blockchain
+        (filtre de Bloom puis index hash -> bloc, en O(1))
+        """
+        return self.blockchain.find_block_index(data_hash) is not None
+
+    def locate(self, data_hash: str, refresh: bool = True):
+        """
+        Retourne (blockchain, position) du bloc, ou (None, None) s'il est inconnu
+        """
+        position = self.blockchain.find_block_index(data_hash, refresh)
+        return (self.blockchain, position) if position is not None else (None, None)
+
+    def write_snapshot(self) -> Optional[str]:
+        """
+        Écrit un instantané de l'état de la chaîne pour un redémarrage rapide
         """
-        for block in self.blockchain.chain:
-            if block.hash == data_hash:
-                return True
-        return False
+        return self.blockchain.write_snapshot()
+
+    def index_stats(self) -> Dict[str, int]:
+        """
+        Retourne l'occupation mémoire de l'index des hash
+        """
+        return self.blockchain.hash_index.memory_usage()
 
     def get_data_history(self) -> List[Dict]:
         """
         Retourne l'historique complet des données
+        (préférer get_history_page pour les chaînes volumineuses)
         """
         return self.blockchain.get_all_data()
 
+    def get_history_page(self, cursor: Optional[int] = None, limit: int = 20,
+                         record_type: Optional[str] = None, since: Optional[float] = None,
+                         until: Optional[float] = None) -> Dict:
+        """
+        Retourne une page de l'historique filtrée par type et par période
+        """
+        return self.blockchain.get_history_page(cursor, limit, record_type, since, until)
+
     def is_valid(self) -> bool:
         """
         Vérifie l'intégrité de la blockchain
         """
-        return self.blockchain.is_chain_valid() 
\ No newline at end of file
+        return self.blockchain.is_chain_valid()
+
+    def validation_report(self, full: bool = False, workers: Optional[int] = None) -> Dict:
+        """
+        Retourne le détail de la validation (premier bloc invalide, débit en blocs/s).
+        En mode complet, la chaîne entière est recalculée sur `workers` processus.
+        """
+        if full:
+            return self.blockchain.audit(workers)
+        self.blockchain.refresh()
+        return self.blockchain.validator.validate_incremental() 
\ No newline at end of file
@@ -0,0 +1,161 @@
+"""
+Écriture ensembliste des événements décodés par l'oracle.
+
+Les lignes sont accumulées par table puis écrites en une fois ; la
+déduplication est confiée à la base via des contraintes d'unicité :
+
+- PostgreSQL : COPY dans une table temporaire, puis
+  INSERT ... SELECT ... ON CONFLICT DO NOTHING ;
+- SQLite : executemany avec INSERT OR IGNORE.
+
+Chaque écrivain mesure les lignes ingérées par seconde.
+"""
+import csv
+import io
+import sqlite3
+import time
+from abc import ABC, abstractmethod
+from typing import Dict, Iterable, List, Sequence, Set
+
+# Colonnes ajoutées par l'oracle aux tables de l'application : bloc d'origine
+# de chaque ligne (annulation en cas de réorganisation) et identité du log
+# dont provient chaque étape
+ADDED_COLUMNS = [
+    ("producteur", "bloc", "BIGINT"),
+    ("produit", "bloc", "BIGINT"),
+    ("etape", "bloc", "BIGINT"),
+    ("etape", "bloc_hash", "VARCHAR(66)"),
+    ("etape", "tx_hash", "VARCHAR(66)"),
+    ("etape", "log_index", "INTEGER"),
+]
+
+# Contraintes d'unicité nécessaires à la déduplication par la base
+# (producteur et produit sont dédupliqués par leur clé primaire, une étape par son log)
+UNIQUE_INDEXES = [
+    ("etape_log_idx", "etape", ("bloc_hash", "tx_hash", "log_index")),
+]
+
+# Index remplacés, supprimés à la mise à jour du schéma : l'ancien index sur le
+# contenu des étapes fusionnait deux opérations réelles identiques
+OBSOLETE_INDEXES = ["etape_unique_idx"]
+
+
+class BulkWriter(ABC):
+    backend = None
+    placeholder = '%s'
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.stats: Dict[str, Dict[str, float]] = {}
+
+    def sql(self, query: str) -> str:
+        """
+        Adapte une requête écrite avec des paramètres %s au pilote
+        """
+        return query if self.placeholder == '%s' else query.replace('%s', self.placeholder)
+
+    def ensure_schema(self):
+        cur = self.conn.cursor()
+        for table, column, column_type in ADDED_COLUMNS:
+            self._add_column(cur, table, column, column_type)
+        for name in OBSOLETE_INDEXES:
+            cur.execute(f"DROP INDEX IF EXISTS {name}")
+        for name, table, columns in UNIQUE_INDEXES:
+            cur.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS {name} ON {table} ({', '.join(columns)})")
+        cur.close()
+
+    def _add_column(self, cur, table: str, column: str, column_type: str):
+        cur.execute(f"ALTER TABLE IF EXISTS {table} ADD COLUMN IF NOT EXISTS {column} {column_type}")
+
+    def existing(self, table: str, column: str, values: Sequence, chunk_size: int = 1000) -> Set:
+        """
+        Valeurs de `column` déjà présentes, en une requête par paquet
+        """
+        found = set()
+        cur = self.conn.cursor()
+        for start in range(0, len(values), chunk_size):
+            chunk = list(values[start:start + chunk_size])
+            marks = ', '.join([self.placeholder] * len(chunk))
+            cur.execute(f"SELECT {column} FROM {table} WHERE {column} IN ({marks})", chunk)
+            found.update(row[0] for row in cur.fetchall())
+        cur.close()
+        return found
+
+    @abstractmethod
+    def _write(self, table: str, columns: Sequence[str], rows: List[Sequence]) -> int:
+        """
+        Écrit les lignes en ignorant les doublons ; retourne le nombre de lignes insérées
+        """
+
+    def upsert(self, table: str, columns: Sequence[str], rows: Iterable[Sequence]) -> int:
+        """
+        Insère les lignes absentes (les doublons sont ignorés par la base).
+        Retourne le nombre de lignes insérées.
+        """
+        rows = list(rows)
+        if not rows:
+            return 0
+        started = time.perf_counter()
+        inserted = self._write(table, columns, rows)
+        stats = self.stats.setdefault(table, {'rows': 0, 'inserted': 0, 'elapsed': 0.0})
+        stats['rows'] += len(rows)
+        stats['inserted'] += inserted
+        stats['elapsed'] += time.perf_counter() - started
+        return inserted
+
+    def report(self) -> List[str]:
+        lines = []
+        for table, stats in self.stats.items():
+            rate = stats['rows'] / stats['elapsed'] if stats['elapsed'] > 0 else float(stats['rows'])
+            lines.append(f"{table}: {stats['rows']} lignes, {stats['inserted']} insérées "
+                         f"({rate:.0f} lignes/s, {self.backend})")
+        return lines
+
+
+class PostgresBulkWriter(BulkWriter):
+    backend = 'postgresql'
+
+    def _write(self, table, columns, rows):
+        staging = f"staging_{table}"
+        column_list = ', '.join(columns)
+        buf = io.StringIO()
+        # Chaînes entre guillemets : '' reste une chaîne vide, None devient NULL
+        csv.writer(buf, quoting=csv.QUOTE_NONNUMERIC).writerows(rows)
+        buf.seek(0)
+
+        cur = self.conn.cursor()
+        cur.execute(f"DROP TABLE IF EXISTS {staging}")
+        cur.execute(f"CREATE TEMP TABLE {staging} ON COMMIT DROP AS "
+                    f"SELECT {column_list} FROM {table} WITH NO DATA")
+        cur.copy_expert(f"COPY {staging} ({column_list}) FROM STDIN WITH (FORMAT csv)", buf)
+        cur.execute(f"INSERT INTO {table} ({column_list}) SELECT {column_list} FROM {staging} "
+                    f"ON CONFLICT DO NOTHING")
+        inserted = cur.rowcount
+        cur.close()
+        return inserted
+
+
+class SQLiteBulkWriter(BulkWriter):
+    backend = 'sqlite'
+    placeholder = '?'
+
+    def _add_column(self, cur, table, column, column_type):
+        # SQLite n'a pas de ADD COLUMN IF NOT EXISTS ; une table absente n'a aucune colonne
+        cur.execute(f"PRAGMA table_info({table})")
+        columns = {row[1] for row in cur.fetchall()}
+        if columns and column not in columns:
+            cur.execute(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}")
+
+    def _write(self, table, columns, rows):
+        marks = ', '.join(['?'] * len(columns))
+        cur = self.conn.cursor()
+        cur.executemany(f"INSERT OR IGNORE INTO {table} ({', '.join(columns)}) VALUES ({marks})", rows)
+        inserted = cur.rowcount
+        cur.close()
+        return inserted
+
+
+def writer_for(conn) -> BulkWriter:
+    if isinstance(conn, sqlite3.Connection):
+        return SQLiteBulkWriter(conn)
+    return PostgresBulkWriter(conn)
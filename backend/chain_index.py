@@ -0,0 +1,306 @@
+import heapq
+import math
+import os
+import struct
+import sys
+import threading
+from typing import Dict, Iterable, Optional, Tuple
+
+DIGEST_SIZE = 32
+# En-tête du fichier Bloom : nombre de bits, nombre de fonctions, éléments, capacité
+BLOOM_HEADER = struct.Struct('<QIQQ')
+
+
+def hash_to_digest(data_hash: str) -> Optional[bytes]:
+    """
+    Convertit un hash hexadécimal SHA-256 en 32 octets.
+    Retourne None si la chaîne ne peut pas être un hash de bloc.
+    """
+    if not isinstance(data_hash, str) or len(data_hash) != DIGEST_SIZE * 2:
+        return None
+    try:
+        return bytes.fromhex(data_hash)
+    except ValueError:
+        return None
+
+
+class BloomFilter:
+    """
+    Filtre de Bloom compact pour rejeter les hash inconnus sans consulter l'index.
+    Les positions sont tirées directement des octets du digest SHA-256,
+    déjà uniformément distribués : aucun hachage supplémentaire n'est nécessaire.
+    """
+    def __init__(self, capacity: int = 1 << 16, error_rate: float = 0.001):
+        self.capacity = max(capacity, 1)
+        self.error_rate = error_rate
+        self.num_bits = max(64, int(math.ceil(-self.capacity * math.log(error_rate) / (math.log(2) ** 2))))
+        # 8 mots de 32 bits au plus dans un digest de 32 octets
+        self.num_hashes = min(8, max(1, int(round(self.num_bits / self.capacity * math.log(2)))))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+
+    def _positions(self, digest: bytes) -> Iterable[int]:
+        for i in range(self.num_hashes):
+            yield int.from_bytes(digest[i * 4:i * 4 + 4], 'little') % self.num_bits
+
+    def add(self, digest: bytes):
+        for pos in self._positions(digest):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, digest: bytes) -> bool:
+        bits = self.bits
+        for pos in self._positions(digest):
+            if not bits[pos >> 3] & (1 << (pos & 7)):
+                return False
+        return True
+
+    def to_bytes(self) -> bytes:
+        return BLOOM_HEADER.pack(self.num_bits, self.num_hashes, self.count, self.capacity) + bytes(self.bits)
+
+    @classmethod
+    def from_bytes(cls, raw: bytes, offset: int = 0) -> 'BloomFilter':
+        num_bits, num_hashes, count, capacity = BLOOM_HEADER.unpack_from(raw, offset)
+        bloom = cls.__new__(cls)
+        bloom.capacity = capacity
+        # Taux d'erreur déduit du dimensionnement (num_bits = -n ln p / ln² 2)
+        bloom.error_rate = math.exp(-num_bits / capacity * math.log(2) ** 2)
+        bloom.num_bits = num_bits
+        bloom.num_hashes = num_hashes
+        bloom.count = count
+        start = offset + BLOOM_HEADER.size
+        bloom.bits = bytearray(raw[start:start + (num_bits + 7) // 8])
+        return bloom
+
+
+class ScalableBloomFilter:
+    """
+    Suite de filtres de Bloom : quand le dernier est plein, un filtre de
+    capacité double est ajouté, sans réinsérer les digests déjà présents.
+    Chaque nouveau filtre divise le taux d'erreur par deux, si bien que le
+    taux global reste inférieur au double du taux initial.
+    """
+    def __init__(self, capacity: int = 1 << 16, error_rate: float = 0.001, stages=None):
+        self.stages = stages or [BloomFilter(capacity, error_rate)]
+
+    @property
+    def count(self) -> int:
+        return sum(stage.count for stage in self.stages)
+
+    @property
+    def capacity(self) -> int:
+        return sum(stage.capacity for stage in self.stages)
+
+    def add(self, digest: bytes):
+        stage = self.stages[-1]
+        if stage.count >= stage.capacity:
+            stage = BloomFilter(stage.capacity * 2, stage.error_rate / 2)
+            # Nouvelle liste : un lecteur sans verrou parcourt toujours une liste complète
+            self.stages = self.stages + [stage]
+        stage.add(digest)
+
+    def __contains__(self, digest: bytes) -> bool:
+        for stage in self.stages:
+            if digest in stage:
+                return True
+        return False
+
+    def to_bytes(self) -> bytes:
+        return b''.join(stage.to_bytes() for stage in self.stages)
+
+    @classmethod
+    def from_bytes(cls, raw: bytes) -> 'ScalableBloomFilter':
+        # Filtres concaténés ; un instantané antérieur n'en contient qu'un
+        stages = []
+        offset = 0
+        while offset < len(raw):
+            stage = BloomFilter.from_bytes(raw, offset)
+            stages.append(stage)
+            offset += BLOOM_HEADER.size + len(stage.bits)
+        return cls(stages=stages)
+
+
+class HashIndex:
+    """
+    Index hash -> position de bloc, précédé d'un filtre de Bloom.
+
+    Avec un chemin, les digests sont ajoutés dans l'ordre des blocs à
+    hashes.bin (32 octets par bloc, position implicite), ce qui permet de
+    recharger l'index après un redémarrage. Si un instantané est fourni,
+    il sert de base (table triée lue par mmap, filtre de Bloom) et seuls
+    les digests postérieurs sont rechargés en mémoire.
+
+    En lecture seule, hashes.bin n'est ni réparé ni complété : les blocs
+    qui n'y figurent pas encore ne sont indexés qu'en mémoire.
+    """
+    def __init__(self, path: Optional[str] = None, capacity: int = 1 << 16, snapshot=None,
+                 read_only: bool = False):
+        self.path = path
+        self.read_only = read_only
+        self.snapshot = None
+        self._positions: Dict[bytes, int] = {}
+        self._count = 0
+        self._file = None
+        self._lock = threading.RLock()
+        self.bloom = ScalableBloomFilter(capacity)
+        if path:
+            if not read_only:
+                os.makedirs(path, exist_ok=True)
+            self._load(snapshot)
+            if not read_only:
+                self._file = open(self._hashes_path, 'ab')
+
+    @property
+    def _hashes_path(self) -> str:
+        return os.path.join(self.path, 'hashes.bin')
+
+    def _load(self, snapshot=None):
+        available = 0
+        if os.path.exists(self._hashes_path):
+            size = os.path.getsize(self._hashes_path)
+            available = size // DIGEST_SIZE
+            if size % DIGEST_SIZE and not self.read_only:
+                os.truncate(self._hashes_path, available * DIGEST_SIZE)
+
+        if snapshot is not None and snapshot.height <= available:
+            self.snapshot = snapshot
+            self.bloom = snapshot.bloom()
+            self._count = snapshot.height
+        else:
+            self.bloom = ScalableBloomFilter(max(available * 2, self.bloom.capacity))
+        self._replay_file(available)
+
+    def _replay_file(self, available: int):
+        if available <= self._count:
+            return
+        with open(self._hashes_path, 'rb') as f:
+            f.seek(self._count * DIGEST_SIZE)
+            raw = f.read((available - self._count) * DIGEST_SIZE)
+        for i in range(len(raw) // DIGEST_SIZE):
+            self._insert(raw[i * DIGEST_SIZE:(i + 1) * DIGEST_SIZE], self._count)
+
+    def _insert(self, digest: bytes, position: int):
+        self.bloom.add(digest)
+        # En cas de doublon, la première occurrence est conservée
+        self._positions.setdefault(digest, position)
+        self._count += 1
+
+    def add(self, data_hash: str, position: int):
+        digest = bytes.fromhex(data_hash)
+        with self._lock:
+            self._insert(digest, position)
+            if self._file:
+                self._file.write(digest)
+                self._file.flush()
+
+    def refresh(self):
+        """
+        Charge les digests ajoutés à hashes.bin par d'autres processus
+        """
+        if not self.path or not os.path.exists(self._hashes_path):
+            return
+        with self._lock:
+            self._replay_file(os.path.getsize(self._hashes_path) // DIGEST_SIZE)
+
+    def get(self, data_hash: str) -> Optional[int]:
+        """
+        Retourne la position du bloc portant ce hash, ou None.
+        """
+        digest = hash_to_digest(data_hash)
+        if digest is None or digest not in self.bloom:
+            return None
+        # Entrées en mémoire avant l'instantané : install_snapshot publie l'instantané
+        # avant de retirer les entrées qu'il couvre. La référence locale garde
+        # l'instantané ouvert jusqu'à la fin de la lecture, même s'il est remplacé.
+        position = self._positions.get(digest)
+        snapshot = self.snapshot
+        if position is None and snapshot is not None:
+            position = snapshot.lookup(digest)
+        return position
+
+    def __contains__(self, data_hash: str) -> bool:
+        return self.get(data_hash) is not None
+
+    def __len__(self) -> int:
+        return self._count
+
+    def sync_with(self, chain):
+        """
+        Aligne l'index sur la chaîne : complète les blocs manquants et
+        retire les entrées au-delà de la fin (queue perdue lors d'un crash).
+        """
+        with self._lock:
+            if self._count > len(chain):
+                if self.read_only:
+                    # Queue d'index sans bloc (crash d'un écrivain) : ignorée par Blockchain.find_block_index
+                    return
+                self.truncate(len(chain))
+            for position in range(self._count, len(chain)):
+                self.add(chain[position].hash, position)
+
+    def truncate(self, count: int):
+        with self._lock:
+            if self._file:
+                self._file.close()
+                os.truncate(self._hashes_path, count * DIGEST_SIZE)
+            if self.snapshot is not None and count < self.snapshot.height:
+                # Pas de close() : un lecteur sans verrou peut encore l'interroger
+                self.snapshot = None
+            self._positions = {}
+            self._count = self.snapshot.height if self.snapshot is not None else 0
+            self.bloom = self.snapshot.bloom() if self.snapshot is not None else ScalableBloomFilter(max(count * 2, 1 << 16))
+            if self._file:
+                self._replay_file(count)
+                self._file = open(self._hashes_path, 'ab')
+            else:
+                self._count = count
+
+    def snapshot_entries(self) -> Tuple[int, Iterable[Tuple[bytes, int]]]:
+        """
+        Retourne la hauteur couverte et les entrées triées par digest
+        (fusion de l'instantané courant et des entrées en mémoire)
+        """
+        with self._lock:
+            count = self._count
+            delta = sorted(self._positions.items())
+            base = self.snapshot
+        if base is None:
+            return count, delta
+        return count, heapq.merge(base.iter_entries(), delta)
+
+    def install_snapshot(self, snapshot):
+        """
+        Remplace la base par un instantané plus récent et libère les
+        entrées en mémoire qu'il couvre. L'ancien instantané n'est pas fermé :
+        son mmap est libéré avec la dernière référence, une fois les
+        lectures en cours (get, snapshot_entries) terminées.
+        """
+        with self._lock:
+            self.snapshot = snapshot
+            self._positions = {d: p for d, p in self._positions.items() if p >= snapshot.height}
+
+    def memory_usage(self) -> Dict[str, int]:
+        """
+        Estimation de la mémoire occupée par l'index et le filtre (en octets).
+        """
+        digest_size = sys.getsizeof(b'\x00' * DIGEST_SIZE)
+        position_size = sys.getsizeof(1 << 40)
+        index_bytes = sys.getsizeof(self._positions) + len(self._positions) * (digest_size + position_size)
+        bloom_bytes = sum(len(stage.bits) for stage in self.bloom.stages)
+        return {
+            'entries': self._count,
+            'index_bytes': index_bytes,
+            'bloom_bytes': bloom_bytes,
+            'bloom_hashes': self.bloom.stages[-1].num_hashes,
+            'snapshot_entries': self.snapshot.entries if self.snapshot is not None else 0,
+            'snapshot_mapped_bytes': self.snapshot.size() if self.snapshot is not None else 0,
+            'total_bytes': index_bytes + bloom_bytes
+        }
+
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+        if self.snapshot is not None:
+            self.snapshot.close()
+            self.snapshot = None
@@ -0,0 +1,153 @@
+import hashlib
+import mmap
+import os
+import struct
+from typing import Iterable, Iterator, Optional, Tuple
+
+from chain_index import DIGEST_SIZE, ScalableBloomFilter, hash_to_digest
+
+SNAPSHOT_MAGIC = b'TRSNAP01'
+# Magic, hauteur, hash de la tête, hauteur validée, hash validé, taille du filtre, entrées, somme de contrôle
+SNAPSHOT_HEADER = struct.Struct('<8sQ32sQ32sQQ32s')
+# Entrée de la table triée : digest du bloc, position
+SNAPSHOT_ENTRY = struct.Struct('<32sQ')
+SNAPSHOT_PREFIX = 'snapshot-'
+SNAPSHOT_SUFFIX = '.snap'
+
+
+def _digest_or_zero(block_hash: Optional[str]) -> bytes:
+    return hash_to_digest(block_hash) or b'\x00' * DIGEST_SIZE
+
+
+class Snapshot:
+    """
+    Instantané de l'état dérivé de la chaîne : hash de la tête, hauteur
+    validée, filtre de Bloom et table hash -> position triée par digest.
+
+    La table est lue via mmap et interrogée par dichotomie : le chargement
+    ne dépend pas de la longueur de l'historique (hormis la somme de contrôle).
+    """
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            (magic, self.height, tip, self.validated_height, validated,
+             bloom_size, self.entries, checksum) = SNAPSHOT_HEADER.unpack_from(self._map, 0)
+            if magic != SNAPSHOT_MAGIC:
+                raise ValueError(f"Instantané invalide : {path}")
+            body = memoryview(self._map)[SNAPSHOT_HEADER.size:]
+            try:
+                if hashlib.sha256(body).digest() != checksum:
+                    raise ValueError(f"Somme de contrôle incorrecte : {path}")
+            finally:
+                body.release()
+        except Exception:
+            self._map.close()
+            raise
+
+        self.tip_hash = tip.hex()
+        self.validated_hash = validated.hex() if any(validated) else None
+        bloom_start = SNAPSHOT_HEADER.size
+        self._bloom_raw = self._map[bloom_start:bloom_start + bloom_size]
+        self._table = bloom_start + bloom_size
+
+    def bloom(self) -> ScalableBloomFilter:
+        return ScalableBloomFilter.from_bytes(self._bloom_raw)
+
+    def _digest_at(self, i: int) -> bytes:
+        offset = self._table + i * SNAPSHOT_ENTRY.size
+        return self._map[offset:offset + DIGEST_SIZE]
+
+    def lookup(self, digest: bytes) -> Optional[int]:
+        low, high = 0, self.entries
+        while low < high:
+            middle = (low + high) // 2
+            if self._digest_at(middle) < digest:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self.entries and self._digest_at(low) == digest:
+            return SNAPSHOT_ENTRY.unpack_from(self._map, self._table + low * SNAPSHOT_ENTRY.size)[1]
+        return None
+
+    def iter_entries(self) -> Iterator[Tuple[bytes, int]]:
+        for i in range(self.entries):
+            yield SNAPSHOT_ENTRY.unpack_from(self._map, self._table + i * SNAPSHOT_ENTRY.size)
+
+    def size(self) -> int:
+        return len(self._map)
+
+    def close(self):
+        self._map.close()
+
+
+def write_snapshot(directory: str, height: int, tip_hash: str, validated_height: int,
+                   validated_hash: Optional[str], bloom: ScalableBloomFilter,
+                   entries: Iterable[Tuple[bytes, int]], keep: int = 2) -> str:
+    """
+    Écrit un instantané de manière atomique (fichier temporaire puis rename)
+    et ne conserve que les `keep` plus récents. Les entrées doivent être triées par digest.
+    """
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{SNAPSHOT_PREFIX}{height:012d}{SNAPSHOT_SUFFIX}")
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+
+    bloom_raw = bloom.to_bytes()
+    checksum = hashlib.sha256(bloom_raw)
+    count = 0
+    with open(tmp_path, 'wb') as f:
+        f.write(b'\x00' * SNAPSHOT_HEADER.size)
+        f.write(bloom_raw)
+        chunk = []
+        for digest, position in entries:
+            chunk.append(SNAPSHOT_ENTRY.pack(digest, position))
+            count += 1
+            if len(chunk) >= 65536:
+                data = b''.join(chunk)
+                checksum.update(data)
+                f.write(data)
+                chunk = []
+        data = b''.join(chunk)
+        checksum.update(data)
+        f.write(data)
+
+        f.seek(0)
+        f.write(SNAPSHOT_HEADER.pack(
+            SNAPSHOT_MAGIC, height, _digest_or_zero(tip_hash), validated_height,
+            _digest_or_zero(validated_hash), len(bloom_raw), count, checksum.digest()
+        ))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+    for old in list_snapshots(directory)[:-keep]:
+        try:
+            os.remove(old)
+        except OSError:
+            pass
+    return path
+
+
+def list_snapshots(directory: str):
+    if not os.path.isdir(directory):
+        return []
+    names = sorted(n for n in os.listdir(directory)
+                   if n.startswith(SNAPSHOT_PREFIX) and n.endswith(SNAPSHOT_SUFFIX))
+    return [os.path.join(directory, n) for n in names]
+
+
+def load_latest_snapshot(directory: str, chain) -> Optional[Snapshot]:
+    """
+    Charge l'instantané le plus récent cohérent avec la chaîne sur disque
+    (somme de contrôle correcte et hash de tête présent à la bonne hauteur).
+    """
+    for path in reversed(list_snapshots(directory)):
+        try:
+            snapshot = Snapshot(path)
+        except (ValueError, OSError, struct.error):
+            continue
+        if 0 < snapshot.height <= len(chain) and chain[snapshot.height - 1].hash == snapshot.tip_hash:
+            return snapshot
+        snapshot.close()
+    return None
@@ -0,0 +1,332 @@
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows : verrouillage limité au processus courant
+    fcntl = None
+
+# Format d'un enregistrement dans un segment : longueur (u32), crc32 (u32), payload
+RECORD_HEADER = struct.Struct('<II')
+# Entrée d'index de taille fixe : offset dans le segment (u64), longueur du payload (u32)
+INDEX_ENTRY = struct.Struct('<QI')
+
+SEGMENT_PREFIX = 'segment-'
+LOG_SUFFIX = '.log'
+IDX_SUFFIX = '.idx'
+
+
+class SegmentStore:
+    """
+    Stockage disque append-only de la blockchain.
+
+    Les blocs sont écrits dans des segments de taille fixe (en nombre de blocs).
+    Chaque segment possède un fichier .log (enregistrements) et un fichier .idx
+    (entrées de taille fixe), ce qui permet de retrouver le bloc i en O(1) :
+    segment = i // blocks_per_segment, entrée = i % blocks_per_segment.
+    Les lectures passent par mmap, les fsync sont regroupés et la queue
+    éventuellement tronquée par un crash est réparée à l'ouverture.
+
+    Plusieurs processus peuvent partager le même répertoire : les écritures
+    et la récupération prennent un verrou fichier exclusif (fichier LOCK),
+    les lectures restent sans verrou et découvrent les blocs ajoutés par les
+    autres processus via refresh().
+    """
+
+    def __init__(self, path: str, blocks_per_segment: int = 65536,
+                 sync_every: int = 64, sync_interval: float = 1.0,
+                 read_only: bool = False):
+        self.path = path
+        self.read_only = read_only
+        self.blocks_per_segment = blocks_per_segment
+        self.sync_every = sync_every
+        self.sync_interval = sync_interval
+        self._lock = threading.RLock()
+        self._maps: Dict[int, mmap.mmap] = {}
+        self._count = 0
+        self._pending = 0
+        self._last_sync = time.monotonic()
+        self._log = None
+        self._idx = None
+        self._active_segment = -1
+        self._lock_file = None
+        self._lock_depth = 0
+        if not read_only:
+            os.makedirs(path, exist_ok=True)
+            self._lock_file = open(os.path.join(path, 'LOCK'), 'a+')
+        self._open()
+
+    # ------------------------------------------------------------------
+    # Ouverture et récupération
+    # ------------------------------------------------------------------
+    def _segment_path(self, segment: int, suffix: str) -> str:
+        return os.path.join(self.path, f"{SEGMENT_PREFIX}{segment:08d}{suffix}")
+
+    def _list_segments(self) -> List[int]:
+        segments = []
+        if not os.path.isdir(self.path):
+            return segments
+        for name in os.listdir(self.path):
+            if name.startswith(SEGMENT_PREFIX) and name.endswith(LOG_SUFFIX):
+                segments.append(int(name[len(SEGMENT_PREFIX):-len(LOG_SUFFIX)]))
+        return sorted(segments)
+
+    def _open(self):
+        if self.read_only:
+            # Lecteur : ne répare rien, se limite aux entrées d'index complètes
+            self.refresh()
+            return
+
+        with self.exclusive():
+            segments = self._list_segments()
+            if not segments:
+                self._open_active(0)
+                return
+
+            last = segments[-1]
+            # Les segments scellés sont pleins par construction : seul le dernier est lu
+            self._count = last * self.blocks_per_segment
+            self._recover(last)
+            self._open_active(last)
+
+    @contextmanager
+    def exclusive(self):
+        """
+        Verrou d'écriture partagé entre threads et entre processus (réentrant)
+        """
+        with self._lock:
+            if self._lock_file is None or fcntl is None:
+                yield
+                return
+            if self._lock_depth == 0:
+                fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_EX)
+            self._lock_depth += 1
+            try:
+                yield
+            finally:
+                self._lock_depth -= 1
+                if self._lock_depth == 0:
+                    fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_UN)
+
+    def refresh(self) -> int:
+        """
+        Prend en compte les blocs ajoutés par d'autres processus, sans verrou :
+        une entrée d'index n'est visible qu'une fois son enregistrement écrit.
+        """
+        segment = self._count // self.blocks_per_segment
+        while True:
+            try:
+                entries = os.path.getsize(self._segment_path(segment, IDX_SUFFIX)) // INDEX_ENTRY.size
+            except OSError:
+                break
+            self._count = max(self._count, segment * self.blocks_per_segment + min(entries, self.blocks_per_segment))
+            if entries < self.blocks_per_segment:
+                break
+            segment += 1
+        return self._count
+
+    def _recover(self, segment: int):
+        """
+        Répare la queue du dernier segment après un arrêt brutal :
+        entrées d'index partielles ou invalides, enregistrements écrits mais
+        non indexés, et octets orphelins en fin de fichier.
+        """
+        log_path = self._segment_path(segment, LOG_SUFFIX)
+        idx_path = self._segment_path(segment, IDX_SUFFIX)
+        if not os.path.exists(idx_path):
+            open(idx_path, 'wb').close()
+
+        with open(log_path, 'rb') as f:
+            log_data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.path.getsize(log_path) else b''
+        with open(idx_path, 'rb') as f:
+            idx_data = f.read()
+
+        # Seule la queue peut être abîmée : on remonte depuis la dernière entrée
+        entries = len(idx_data) // INDEX_ENTRY.size
+        while entries:
+            offset, length = INDEX_ENTRY.unpack_from(idx_data, (entries - 1) * INDEX_ENTRY.size)
+            if self._read_record(log_data, offset) is not None:
+                break
+            entries -= 1
+        new_entries = []
+        if entries:
+            offset, length = INDEX_ENTRY.unpack_from(idx_data, (entries - 1) * INDEX_ENTRY.size)
+            end = offset + RECORD_HEADER.size + length
+        else:
+            end = 0
+
+        # Reprendre les enregistrements complets écrits après la dernière entrée d'index
+        while entries + len(new_entries) < self.blocks_per_segment:
+            payload = self._read_record(log_data, end)
+            if payload is None:
+                break
+            new_entries.append(INDEX_ENTRY.pack(end, len(payload)))
+            end += RECORD_HEADER.size + len(payload)
+        log_size = len(log_data)
+        if isinstance(log_data, mmap.mmap):
+            log_data.close()
+
+        if entries * INDEX_ENTRY.size != len(idx_data) or new_entries:
+            with open(idx_path, 'r+b') as f:
+                f.truncate(entries * INDEX_ENTRY.size)
+                f.seek(0, os.SEEK_END)
+                f.write(b''.join(new_entries))
+                f.flush()
+                os.fsync(f.fileno())
+        if end != log_size:
+            with open(log_path, 'r+b') as f:
+                f.truncate(end)
+                f.flush()
+                os.fsync(f.fileno())
+
+        self._count += entries + len(new_entries)
+
+    @staticmethod
+    def _read_record(buf, offset: int) -> Optional[bytes]:
+        if offset + RECORD_HEADER.size > len(buf):
+            return None
+        length, crc = RECORD_HEADER.unpack_from(buf, offset)
+        start = offset + RECORD_HEADER.size
+        if start + length > len(buf):
+            return None
+        payload = bytes(buf[start:start + length])
+        if zlib.crc32(payload) != crc:
+            return None
+        return payload
+
+    def _open_active(self, segment: int):
+        if self._log:
+            self._sync()
+            self._log.close()
+            self._idx.close()
+        self._active_segment = segment
+        self._log = open(self._segment_path(segment, LOG_SUFFIX), 'ab')
+        self._idx = open(self._segment_path(segment, IDX_SUFFIX), 'ab')
+
+    # ------------------------------------------------------------------
+    # Écriture
+    # ------------------------------------------------------------------
+    def append(self, record: Dict) -> int:
+        """
+        Ajoute un enregistrement en fin de chaîne et retourne sa position.
+        """
+        if self.read_only:
+            raise IOError("Stockage ouvert en lecture seule")
+        payload = json.dumps(record, sort_keys=True, separators=(',', ':')).encode()
+        with self.exclusive():
+            self.refresh()
+            position = self._write(payload)
+            if (self._pending >= self.sync_every
+                    or time.monotonic() - self._last_sync >= self.sync_interval):
+                self._sync()
+            return position
+
+    def append_many(self, records: List[Dict]) -> int:
+        """
+        Ajoute plusieurs enregistrements puis les rend durables par un seul fsync
+        (commit groupé). Retourne la position du premier enregistrement.
+        """
+        if self.read_only:
+            raise IOError("Stockage ouvert en lecture seule")
+        payloads = [json.dumps(record, sort_keys=True, separators=(',', ':')).encode() for record in records]
+        with self.exclusive():
+            first = self.refresh()
+            for payload in payloads:
+                self._write(payload)
+            self._sync()
+            return first
+
+    def _write(self, payload: bytes) -> int:
+        position = self._count
+        segment = position // self.blocks_per_segment
+        if segment != self._active_segment:
+            self._open_active(segment)
+
+        # Un autre processus a pu écrire depuis : se placer en fin de fichier
+        offset = self._log.seek(0, os.SEEK_END)
+        self._log.write(RECORD_HEADER.pack(len(payload), zlib.crc32(payload)))
+        self._log.write(payload)
+        self._log.flush()
+        # L'entrée d'index n'est écrite qu'après l'enregistrement complet
+        self._idx.write(INDEX_ENTRY.pack(offset, len(payload)))
+        self._idx.flush()
+
+        self._count += 1
+        self._pending += 1
+        return position
+
+    def _sync(self):
+        if self._pending and self._log:
+            os.fsync(self._log.fileno())
+            os.fsync(self._idx.fileno())
+        self._pending = 0
+        self._last_sync = time.monotonic()
+
+    def flush(self):
+        """
+        Force l'écriture durable des ajouts en attente.
+        """
+        with self._lock:
+            self._sync()
+
+    # ------------------------------------------------------------------
+    # Lecture
+    # ------------------------------------------------------------------
+    def _map(self, segment: int, suffix: str, min_size: int) -> mmap.mmap:
+        key = segment * 2 + (suffix == IDX_SUFFIX)
+        current = self._maps.get(key)
+        if current is None or len(current) < min_size:
+            if current is not None:
+                current.close()
+            with open(self._segment_path(segment, suffix), 'rb') as f:
+                current = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._maps[key] = current
+        return current
+
+    def get(self, position: int) -> Dict:
+        """
+        Lit l'enregistrement à la position donnée en O(1).
+        """
+        if position < 0:
+            position += self._count
+        if not 0 <= position < self._count:
+            raise IndexError(position)
+
+        segment, slot = divmod(position, self.blocks_per_segment)
+        with self._lock:
+            idx_map = self._map(segment, IDX_SUFFIX, (slot + 1) * INDEX_ENTRY.size)
+            offset, length = INDEX_ENTRY.unpack_from(idx_map, slot * INDEX_ENTRY.size)
+            end = offset + RECORD_HEADER.size + length
+            log_map = self._map(segment, LOG_SUFFIX, end)
+            payload = log_map[offset + RECORD_HEADER.size:end]
+        return json.loads(payload)
+
+    def iter_range(self, start: int = 0, stop: Optional[int] = None) -> Iterator[Dict]:
+        stop = self._count if stop is None else min(stop, self._count)
+        for position in range(max(start, 0), stop):
+            yield self.get(position)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def close(self):
+        with self._lock:
+            self._sync()
+            for m in self._maps.values():
+                m.close()
+            self._maps.clear()
+            if self._log:
+                self._log.close()
+                self._idx.close()
+                self._log = None
+                self._idx = None
+            if self._lock_file:
+                self._lock_file.close()
+                self._lock_file = None
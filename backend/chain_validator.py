@@ -0,0 +1,184 @@
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+
+def _validate_records(records, previous_hash: Optional[str]) -> Tuple[Optional[int], Optional[str], Optional[str]]:
+    """
+    Valide une suite de blocs sérialisés.
+    Retourne (premier index invalide ou None, previous_hash du premier bloc, hash du dernier bloc).
+    """
+    from blockchain import Block
+
+    first_previous = None
+    last_hash = previous_hash
+    for record in records:
+        block = Block.from_dict(record)
+        if first_previous is None:
+            first_previous = block.previous_hash
+        elif block.previous_hash != last_hash:
+            return block.index, first_previous, last_hash
+        if block.hash != block.calculate_hash():
+            return block.index, first_previous, last_hash
+        last_hash = block.hash
+    return None, first_previous, last_hash
+
+
+def _validate_store_range(path: str, blocks_per_segment: int, start: int, stop: int):
+    # Exécuté dans un processus de travail : lecture seule, sans récupération
+    from chain_store import SegmentStore
+
+    store = SegmentStore(path, blocks_per_segment=blocks_per_segment, read_only=True)
+    try:
+        return _validate_records(store.iter_range(start, stop), None)
+    finally:
+        store.close()
+
+
+def _validate_record_range(records: List[Dict]):
+    return _validate_records(records, None)
+
+
+class ChainValidator:
+    """
+    Validation incrémentale de la blockchain.
+
+    Un point de contrôle (hauteur et hash du dernier bloc vérifié) est
+    conservé, et persisté dans checkpoint.json pour une chaîne sur disque :
+    seuls les blocs ajoutés depuis sont recalculés. Le mode audit complet
+    découpe la chaîne en plages vérifiées en parallèle par un pool de processus.
+    """
+    def __init__(self, blockchain, path: Optional[str] = None):
+        self.blockchain = blockchain
+        self.path = path
+        self.verified_height = 0
+        self.verified_hash = None
+        self._load_checkpoint()
+
+    @property
+    def _checkpoint_path(self) -> Optional[str]:
+        return os.path.join(self.path, 'checkpoint.json') if self.path else None
+
+    def _load_checkpoint(self):
+        if not self._checkpoint_path or not os.path.exists(self._checkpoint_path):
+            return
+        try:
+            with open(self._checkpoint_path, 'r') as f:
+                checkpoint = json.load(f)
+            self.verified_height = checkpoint['height']
+            self.verified_hash = checkpoint['hash']
+        except (ValueError, KeyError):
+            self.verified_height = 0
+            self.verified_hash = None
+
+    def reload_checkpoint(self):
+        """
+        Relit le point de contrôle écrit par un autre processus (ex. le tableau de bord)
+        """
+        self._load_checkpoint()
+
+    def _save_checkpoint(self):
+        if not self._checkpoint_path or self.blockchain.read_only:
+            return
+        tmp_path = self._checkpoint_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'height': self.verified_height, 'hash': self.verified_hash}, f)
+        os.replace(tmp_path, self._checkpoint_path)
+
+    def reset(self):
+        self.verified_height = 0
+        self.verified_hash = None
+        self._save_checkpoint()
+
+    def _result(self, mode: str, first_invalid: Optional[int], checked: int, started: float) -> Dict:
+        elapsed = time.perf_counter() - started
+        return {
+            'mode': mode,
+            'valid': first_invalid is None,
+            'first_invalid': first_invalid,
+            'checked': checked,
+            'verified_height': self.verified_height,
+            'elapsed': elapsed,
+            'blocks_per_second': checked / elapsed if elapsed > 0 else float(checked)
+        }
+
+    def validate_incremental(self) -> Dict:
+        """
+        Vérifie uniquement les blocs ajoutés après le point de contrôle.
+        """
+        started = time.perf_counter()
+        chain = self.blockchain.chain
+        length = len(chain)
+
+        start = self.verified_height
+        if start >= length or (self.verified_hash is not None and chain[start].hash != self.verified_hash):
+            # Point de contrôle incohérent avec la chaîne : on repart du début
+            self.reset()
+            start = 0
+
+        previous_hash = chain[start].hash
+        checked = 0
+        for index in range(start + 1, length):
+            block = chain[index]
+            checked += 1
+            if block.previous_hash != previous_hash or block.hash != block.calculate_hash():
+                self._save_checkpoint()
+                return self._result('incremental', index, checked, started)
+            previous_hash = block.hash
+            self.verified_height = index
+            self.verified_hash = block.hash
+
+        self._save_checkpoint()
+        return self._result('incremental', None, checked, started)
+
+    def full_audit(self, workers: Optional[int] = None, chunk_size: int = 50000) -> Dict:
+        """
+        Audit complet : les plages de blocs sont recalculées en parallèle,
+        puis les frontières entre plages sont vérifiées. L'audit s'arrête
+        sur la première plage invalide, sans attendre les suivantes.
+        """
+        started = time.perf_counter()
+        chain = self.blockchain.chain
+        length = len(chain)
+        workers = workers or os.cpu_count() or 1
+        chunk_size = max(1, min(chunk_size, -(-(length - 1) // workers) or 1))
+        ranges = [(start, min(start + chunk_size, length)) for start in range(1, length, chunk_size)]
+
+        store = getattr(chain, 'store', None)
+        first_invalid = None
+        checked = 0
+        previous_hash = chain[0].hash if length else None
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            if store is not None:
+                store.flush()
+                futures = [executor.submit(_validate_store_range, store.path, store.blocks_per_segment, start, stop)
+                           for start, stop in ranges]
+            else:
+                futures = [executor.submit(_validate_record_range, [chain[i].to_dict() for i in range(start, stop)])
+                           for start, stop in ranges]
+
+            for (start, stop), future in zip(ranges, futures):
+                bad_index, first_previous, last_hash = future.result()
+                if first_previous != previous_hash:
+                    first_invalid = start
+                elif bad_index is not None:
+                    first_invalid = bad_index
+                if first_invalid is not None:
+                    checked += first_invalid - start + 1
+                    for pending in futures:
+                        pending.cancel()
+                    break
+                checked += stop - start
+                previous_hash = last_hash
+
+        if first_invalid is None and length:
+            self.verified_height = length - 1
+            self.verified_hash = previous_hash
+            self._save_checkpoint()
+        elif first_invalid is not None and first_invalid <= self.verified_height:
+            self.verified_height = max(first_invalid - 1, 0)
+            self.verified_hash = chain[self.verified_height].hash
+            self._save_checkpoint()
+        return self._result('full', first_invalid, checked, started)
@@ -1,9 +1,19 @@
 import os
 from datetime import timedelta
 
+REGIONS = [
+    {'label': 'Drâa-Tafilalet', 'value': 'Drâa-Tafilalet'},
+    {'label': 'Fès-Meknès', 'value': 'Fès-Meknès'},
+    {'label': 'Marrakech-Safi', 'value': 'Marrakech-Safi'},
+    {'label': 'Souss-Massa', 'value': 'Souss-Massa'},
+    {'label': 'Tanger-Tétouan-Al Hoceïma', 'value': 'Tanger-Tétouan-Al Hoceïma'},
+    # ... ajoute toutes les régions souhaitées
+]
+
+
 class Config:
     # Configuration de la base de données
-    SQLALCHEMY_DATABASE_URI = 'sqlite:///tracabilite_agricole.db'
+    SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///tracabilite_agricole.db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
     # Configuration de sécurité
@@ -25,5 +35,23 @@ class Config:
     LOG_LEVEL = 'INFO'
     LOG_FILE = 'dashboard.log'
 
+    # Stockage persistant de la blockchain (segments append-only)
+    BLOCKCHAIN_STORAGE_PATH = os.environ.get('BLOCKCHAIN_STORAGE_PATH') or 'blockchain_data'
+    # Mode shardé : une sous-chaîne par région, ancrée périodiquement dans une chaîne racine
+    BLOCKCHAIN_SHARDED = os.environ.get('BLOCKCHAIN_SHARDED', '').lower() in ('1', 'true', 'oui')
+    BLOCKCHAIN_ANCHOR_EVERY = int(os.environ.get('BLOCKCHAIN_ANCHOR_EVERY') or 100)
+    # Clé des preuves QR (Ed25519 dérivée du secret, ou HMAC sans le paquet cryptography)
+    QR_PROOF_SECRET = os.environ.get('QR_PROOF_SECRET') or SECRET_KEY
+    QR_PROOF_KEY_ID = int(os.environ.get('QR_PROOF_KEY_ID') or 0)
+    # Données de l'enregistrement dans la preuve (coordonnées personnelles, QR plus grand) : désactivé par défaut
+    QR_PROOF_INCLUDE_PAYLOAD = os.environ.get('QR_PROOF_INCLUDE_PAYLOAD', '').lower() in ('1', 'true', 'oui')
+    # Authentification : relecture de la chaîne partagée au plus une fois par intervalle (secondes)
+    AUTH_REFRESH_INTERVAL = float(os.environ.get('AUTH_REFRESH_INTERVAL') or 1.0)
+
     CONTRACT_ADDRESS = '0x480608b80112000Fd2854EfDb37Bd2e4CbE29F92'
-    WEB3_PROVIDER = 'http://localhost:7545'  # URL de Ganache
\ No newline at end of file
+    WEB3_PROVIDER = 'http://localhost:7545'  # URL de Ganache
+    RPC_BATCH_SIZE = int(os.environ.get('RPC_BATCH_SIZE') or 100)  # Appels eth_call par requête batch
+    LOGS_FENETRE = int(os.environ.get('LOGS_FENETRE') or 2000)  # Blocs par requête eth_getLogs au départ
+    LOGS_WORKERS = int(os.environ.get('LOGS_WORKERS') or 4)  # Requêtes eth_getLogs en parallèle
+    CONFIRMATIONS = int(os.environ.get('ORACLE_CONFIRMATIONS') or 0)  # Profondeur de confirmation (0 sur Ganache)
+    BLOCS_CONSERVES = 256  # Hash de blocs gardés pour détecter une réorganisation
\ No newline at end of file
@@ -1,32 +1,29 @@
 import dash
-from dash import dcc, html
+from dash import dcc, html, dash_table
 from dash.dependencies import Input, Output, State
 import plotly.express as px
 import plotly.graph_objects as go
 import pandas as pd
 from sqlalchemy import create_engine
 from flask import Flask, session as flask_session
-from config import Config
+from config import Config, REGIONS
 from functools import lru_cache
 import logging
+import threading
 from datetime import datetime
 import dash_bootstrap_components as dbc
 from sqlalchemy.orm import sessionmaker
 from init_db import Base, Producteur, Produit
 from blockchain import DataSecurity
+from sharded_chain import ShardedDataSecurity
+from qr_proof import ProofIssuer, signing_key_from_secret
 import qrcode
 import io
 import base64
 from users import authenticate
 
-REGIONS = [
-    {'label': 'Drâa-Tafilalet', 'value': 'Drâa-Tafilalet'},
-    {'label': 'Fès-Meknès', 'value': 'Fès-Meknès'},
-    {'label': 'Marrakech-Safi', 'value': 'Marrakech-Safi'},
-    {'label': 'Souss-Massa', 'value': 'Souss-Massa'},
-    {'label': 'Tanger-Tétouan-Al Hoceïma', 'value': 'Tanger-Tétouan-Al Hoceïma'},
-    # ... ajoute toutes les régions souhaitées
-]
+# Nombre de transactions affichées par page dans l'historique blockchain
+HISTORY_PAGE_SIZE = 10
 
 # Configuration du logging
 logging.basicConfig(
@@ -60,8 +57,30 @@ app = dash.Dash(
     suppress_callback_exceptions=True
 )
 
-# Initialiser la sécurité blockchain
-data_security = DataSecurity()
+# Sécurité blockchain ouverte au premier usage : importer le module ne crée pas le stockage
+# (stockage partagé : plusieurs workers gunicorn peuvent ouvrir la même chaîne)
+_data_security = None
+_proof_issuer = None
+_ouverture = threading.Lock()
+
+def get_data_security():
+    global _data_security
+    with _ouverture:
+        if _data_security is None:
+            if Config.BLOCKCHAIN_SHARDED:
+                _data_security = ShardedDataSecurity(Config.BLOCKCHAIN_STORAGE_PATH,
+                                                     anchor_every=Config.BLOCKCHAIN_ANCHOR_EVERY)
+            else:
+                _data_security = DataSecurity(Config.BLOCKCHAIN_STORAGE_PATH)
+    return _data_security
+
+def get_proof_issuer():
+    # Preuves hors ligne embarquées dans les QR codes
+    global _proof_issuer
+    if _proof_issuer is None:
+        _proof_issuer = ProofIssuer(get_data_security(), signing_key_from_secret(Config.QR_PROOF_SECRET),
+                                    Config.QR_PROOF_KEY_ID, include_payload=Config.QR_PROOF_INCLUDE_PAYLOAD)
+    return _proof_issuer
 
 # Créer une session pour la base de données
 Session = sessionmaker(bind=engine)
@@ -301,6 +320,10 @@ tabs_layout = dbc.Tabs([
                             html.I(className="fas fa-check-circle me-2"),
                             "Vérifier l'intégrité"
                         ], id="verify-blockchain-btn", color="success", className="mt-3"),
+                        dbc.Button([
+                            html.I(className="fas fa-search me-2"),
+                            "Audit complet"
+                        ], id="audit-blockchain-btn", color="secondary", className="mt-3 ms-2"),
                     ])
                 ], className="shadow-sm")
             ], width=6),
@@ -311,7 +334,34 @@ tabs_layout = dbc.Tabs([
                         "Historique des transactions"
                     ]),
                     dbc.CardBody([
-                        html.Div(id="blockchain-history")
+                        dcc.Dropdown(
+                            id="history-type-filter",
+                            options=[
+                                {'label': 'Toutes les transactions', 'value': 'all'},
+                                {'label': 'Producteurs', 'value': 'producteur'},
+                                {'label': 'Produits', 'value': 'produit'},
+                                {'label': 'Lots Merkle', 'value': 'lot_merkle'}
+                            ],
+                            value='all',
+                            clearable=False,
+                            className="mb-2"
+                        ),
+                        # Pagination côté serveur : seule la page visible est lue dans la chaîne
+                        dash_table.DataTable(
+                            id="blockchain-history",
+                            columns=[
+                                {'name': 'Bloc', 'id': 'index'},
+                                {'name': 'Date', 'id': 'date'},
+                                {'name': 'Type', 'id': 'type'},
+                                {'name': 'Nom', 'id': 'nom'},
+                                {'name': 'Hash', 'id': 'hash'}
+                            ],
+                            page_action='custom',
+                            page_current=0,
+                            page_size=HISTORY_PAGE_SIZE,
+                            style_cell={'textAlign': 'left', 'overflow': 'hidden', 'textOverflow': 'ellipsis', 'maxWidth': 0}
+                        ),
+                        dcc.Store(id="history-cursors", data={})
                     ])
                 ], className="shadow-sm")
             ], width=6)
@@ -472,34 +522,42 @@ def add_producteur(n_clicks, nom, region, adresse, telephone, email):
     if not all([nom, region]):
         return dbc.Alert("Le nom et la région sont obligatoires", color="danger")
     try:
-        # Créer les données sécurisées
-        producteur_data = {
-            "type": "producteur",
-            "nom": nom,
-            "region": region,
-            "adresse": adresse,
-            "telephone": telephone,
-            "email": email,
-            "timestamp": datetime.now().isoformat()
-        }
-        # Sécuriser les données dans la blockchain
-        data_hash = data_security.secure_data(producteur_data)
-        # Sauvegarder dans la base de données
+        # Sauvegarder dans la base de données : l'identifiant attribué est inscrit dans la
+        # blockchain, ce qui permet de reconstruire la table à l'identique (replay.py)
         session = Session()
-        new_producteur = Producteur(
-            nom=nom,
-            region=region,
-            adresse=adresse,
-            telephone=telephone,
-            email=email,
-            data_hash=data_hash
-        )
-        session.add(new_producteur)
-        session.commit()
-        producteur_id = new_producteur.id
-        session.close()
-        # Générer le QR code (par exemple avec l'ID et le hash)
-        qr_data = f"Producteur ID: {producteur_id}\nHash: {data_hash}"
+        try:
+            new_producteur = Producteur(
+                nom=nom,
+                region=region,
+                adresse=adresse,
+                telephone=telephone,
+                email=email
+            )
+            session.add(new_producteur)
+            session.flush()
+            producteur_id = new_producteur.id
+            # Créer les données sécurisées
+            producteur_data = {
+                "type": "producteur",
+                "id": producteur_id,
+                "nom": nom,
+                "region": region,
+                "adresse": adresse,
+                "telephone": telephone,
+                "email": email,
+                "timestamp": datetime.now().isoformat()
+            }
+            # Sécuriser les données dans la blockchain
+            data_hash = get_data_security().secure_data(producteur_data)
+            new_producteur.data_hash = data_hash
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+        # Générer le QR code : preuve signée vérifiable hors ligne
+        qr_data = get_proof_issuer().issue(data_hash) or f"Producteur ID: {producteur_id}\nHash: {data_hash}"
         qr_img = generate_qr_code(qr_data)
         return html.Div([
             dbc.Alert("Producteur ajouté avec succès et sécurisé dans la blockchain!", color="success"),
@@ -527,33 +585,37 @@ def add_produit(n_clicks, nom, region, qualite, producteur_id, est_bio):
         return dbc.Alert("Le nom, la région et le producteur sont obligatoires", color="danger")
     
     try:
-        # Créer les données sécurisées
-        produit_data = {
-            "type": "produit",
-            "nom": nom,
-            "region": region,
-            "qualite_score": qualite,
-            "producteur_id": producteur_id,
-            "est_bio": bool(est_bio),
-            "timestamp": datetime.now().isoformat()
-        }
-        
-        # Sécuriser les données dans la blockchain
-        data_hash = data_security.secure_data(produit_data)
-        
-        # Sauvegarder dans la base de données
+        # Même ordre que pour un producteur : l'identifiant attribué est inscrit dans la blockchain
         session = Session()
-        new_produit = Produit(
-            nom=nom,
-            region=region,
-            qualite_score=qualite,
-            producteur_id=producteur_id,
-            est_bio=bool(est_bio),
-            data_hash=data_hash  # Stocker l'hash de la blockchain
-        )
-        session.add(new_produit)
-        session.commit()
-        session.close()
+        try:
+            new_produit = Produit(
+                nom=nom,
+                region=region,
+                qualite_score=qualite,
+                producteur_id=producteur_id,
+                est_bio=bool(est_bio)
+            )
+            session.add(new_produit)
+            session.flush()
+            # Créer les données sécurisées
+            produit_data = {
+                "type": "produit",
+                "id": new_produit.id,
+                "nom": nom,
+                "region": region,
+                "qualite_score": qualite,
+                "producteur_id": producteur_id,
+                "est_bio": bool(est_bio),
+                "timestamp": datetime.now().isoformat()
+            }
+            # Sécuriser les données dans la blockchain
+            new_produit.data_hash = get_data_security().secure_data(produit_data)
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
         
         return dbc.Alert("Produit ajouté avec succès et sécurisé dans la blockchain!", color="success")
     except Exception as e:
@@ -718,17 +780,63 @@ def update_bio_graph(selected_region, selected_product, n):
 # Callback pour vérifier l'intégrité de la blockchain
 @app.callback(
     Output('blockchain-status', 'children'),
-    [Input('verify-blockchain-btn', 'n_clicks')]
+    [Input('verify-blockchain-btn', 'n_clicks'),
+     Input('audit-blockchain-btn', 'n_clicks')]
 )
-def verify_blockchain(n_clicks):
-    if n_clicks is None:
+def verify_blockchain(verify_clicks, audit_clicks):
+    if verify_clicks is None and audit_clicks is None:
         return ""
-    
-    is_valid = data_security.is_valid()
-    if is_valid:
-        return dbc.Alert("La blockchain est valide et sécurisée", color="success")
+
+    # Vérification incrémentale par défaut, audit complet multi-cœurs sur demande
+    triggered = dash.callback_context.triggered[0]['prop_id'] if dash.callback_context.triggered else ''
+    report = get_data_security().validation_report(full=triggered.startswith('audit-blockchain-btn'))
+    details = f"{report['checked']} blocs vérifiés ({report['blocks_per_second']:.0f} blocs/s)"
+    if report['valid']:
+        return dbc.Alert(f"La blockchain est valide et sécurisée — {details}", color="success")
     else:
-        return dbc.Alert("ATTENTION: La blockchain a été compromise!", color="danger")
+        return dbc.Alert(
+            f"ATTENTION: La blockchain a été compromise! Premier bloc invalide : {report['first_invalid']}",
+            color="danger"
+        )
+
+# Callback pour l'historique paginé de la blockchain
+@app.callback(
+    [Output('blockchain-history', 'data'),
+     Output('blockchain-history', 'page_count'),
+     Output('history-cursors', 'data')],
+    [Input('blockchain-history', 'page_current'),
+     Input('history-type-filter', 'value')],
+    [State('history-cursors', 'data')]
+)
+def update_blockchain_history(page_current, record_type, cursors):
+    record_type = None if record_type == 'all' else record_type
+    page_current = page_current or 0
+    # Les curseurs sont propres au filtre : un changement de filtre les réinitialise
+    triggered = dash.callback_context.triggered[0]['prop_id'] if dash.callback_context.triggered else ''
+    if not cursors or triggered.startswith('history-type-filter') or cursors.get('type') != record_type:
+        cursors = {'type': record_type, 'pages': {'0': None}}
+
+    # Reprendre depuis la dernière page connue avant la page demandée
+    pages = cursors['pages']
+    known = max(int(p) for p in pages if int(p) <= page_current)
+    cursor = pages[str(known)]
+    page = {'items': [], 'next_cursor': cursor}
+    for number in range(known, page_current + 1):
+        if number > 0 and page['next_cursor'] is None:
+            break
+        page = get_data_security().get_history_page(page['next_cursor'], HISTORY_PAGE_SIZE, record_type)
+        pages[str(number + 1)] = page['next_cursor']
+
+    rows = [{
+        'index': item['index'],
+        'date': datetime.fromtimestamp(item['timestamp']).strftime('%Y-%m-%d %H:%M:%S'),
+        'type': item['data'].get('type', ''),
+        'nom': item['data'].get('nom', ''),
+        'hash': item['hash']
+    } for item in page['items']]
+    # Nombre de pages inconnu tant que l'historique n'est pas épuisé
+    page_count = page_current + 1 if page['next_cursor'] is None else page_current + 2
+    return rows, page_count, cursors
 
 # Callbacks pour les indicateurs clés
 @app.callback(
@@ -0,0 +1,157 @@
+"""
+Pool de connexions DB-API pour les services de longue durée (oracle).
+
+Les connexions sont ouvertes une fois puis réutilisées d'une exécution
+planifiée à l'autre. Le pool est borné : au-delà de `maxconn` connexions
+empruntées, l'appelant attend (au plus `timeout` secondes). Les emprunts et
+les temps d'attente sont comptés pour être exposés par `stats()`.
+
+    pool = ConnectionPool(lambda: psycopg2.connect(**DB_PARAMS), minconn=1, maxconn=5)
+    with pool.connection() as conn:
+        ...
+        conn.commit()
+"""
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional
+
+
+class PoolTimeout(Exception):
+    """Aucune connexion libérée avant l'expiration du délai"""
+
+
+class ConnectionPool:
+    def __init__(self, connect: Callable, minconn: int = 1, maxconn: int = 5, timeout: Optional[float] = 30):
+        if maxconn < max(minconn, 1):
+            raise ValueError("maxconn doit être supérieur ou égal à minconn et à 1")
+        self._connect = connect
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self._idle: List = []
+        self._in_use = 0
+        self._closed = False
+        self._cond = threading.Condition()
+
+        self.created = 0
+        self.checkouts = 0
+        self.waits = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.discarded = 0
+        self.timeouts = 0
+
+        for _ in range(minconn):
+            self._idle.append(self._new_connection())
+
+    def _new_connection(self):
+        conn = self._connect()
+        with self._cond:
+            self.created += 1
+        return conn
+
+    def getconn(self):
+        started = time.perf_counter()
+        deadline = None if self.timeout is None else started + self.timeout
+        waited = False
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise PoolTimeout("Pool fermé")
+                if self._idle:
+                    conn = self._idle.pop()
+                    break
+                if self._in_use < self.maxconn:
+                    conn = None
+                    break
+                remaining = None if deadline is None else deadline - time.perf_counter()
+                if remaining is not None and remaining <= 0:
+                    self.timeouts += 1
+                    raise PoolTimeout(f"Aucune connexion libre après {self.timeout}s ({self.maxconn} en cours)")
+                waited = True
+                self._cond.wait(remaining)
+            self._in_use += 1
+            self.checkouts += 1
+            if waited:
+                wait = time.perf_counter() - started
+                self.waits += 1
+                self.wait_total += wait
+                self.wait_max = max(self.wait_max, wait)
+
+        if conn is None:
+            # Ouverture hors du verrou : un nœud lent ne bloque pas les autres emprunts
+            try:
+                conn = self._new_connection()
+            except Exception:
+                self._release_slot()
+                raise
+        return conn
+
+    def _release_slot(self):
+        with self._cond:
+            self._in_use -= 1
+            self._cond.notify()
+
+    def putconn(self, conn, broken: bool = False):
+        if not broken:
+            try:
+                # Une transaction laissée ouverte ne doit pas suivre la connexion
+                conn.rollback()
+            except Exception:
+                broken = True
+        with self._cond:
+            self._in_use -= 1
+            if broken or self._closed:
+                self.discarded += 1
+                self._close_quietly(conn)
+            else:
+                self._idle.append(conn)
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        conn = self.getconn()
+        broken = False
+        try:
+            yield conn
+        except Exception:
+            broken = _is_disconnect(conn)
+            raise
+        finally:
+            self.putconn(conn, broken=broken)
+
+    def stats(self) -> Dict:
+        with self._cond:
+            return {
+                'maxconn': self.maxconn,
+                'in_use': self._in_use,
+                'idle': len(self._idle),
+                'created': self.created,
+                'discarded': self.discarded,
+                'checkouts': self.checkouts,
+                'waits': self.waits,
+                'timeouts': self.timeouts,
+                'wait_total': round(self.wait_total, 6),
+                'wait_max': round(self.wait_max, 6),
+                'wait_avg': round(self.wait_total / self.waits, 6) if self.waits else 0.0
+            }
+
+    def closeall(self):
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._cond.notify_all()
+        for conn in idle:
+            self._close_quietly(conn)
+
+    @staticmethod
+    def _close_quietly(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
+def _is_disconnect(conn) -> bool:
+    # psycopg2 expose `closed` (0 si ouverte) ; sqlite3 n'a pas d'équivalent
+    return bool(getattr(conn, 'closed', 0))
@@ -0,0 +1,98 @@
+"""
+Identité des événements ingérés et réorganisations de chaîne.
+
+Chaque étape écrite en base provient d'un journal (log) identifié par
+(hash du bloc, hash de la transaction, indice du log) ; un index unique
+sur ce triplet garantit qu'un log n'est écrit qu'une fois, sans comparer
+le contenu des étapes : deux opérations réelles identiques restent deux
+lignes.
+
+L'indice d'une étape dans `etapesProduit` se déduit de l'ordre des logs :
+l'étape 0 (récolte) vient du log ProduitEnregistre, l'étape k du k-ième
+log EtapeAjoutee du produit, dans l'ordre (bloc, indice du log). Les
+étapes écrites avant l'identité par log (colonnes NULL) précèdent tous
+les logs lus depuis : elles comptent en tête, dans leur ordre d'écriture.
+
+Les hash des blocs jusqu'auxquels les curseurs ont avancé sont conservés ;
+si la chaîne ne les contient plus, les lignes écrites au-delà du dernier
+bloc commun sont annulées puis réingérées.
+"""
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+
+def hex_hash(value) -> Optional[str]:
+    # Hash en chaîne 0x..., qu'il vienne d'une réponse JSON ou de web3 (HexBytes)
+    if value is None or isinstance(value, str):
+        return value
+    return '0x' + bytes(value).hex()
+
+
+def cle(event: Dict) -> Tuple[int, str, str, int]:
+    """
+    (bloc, hash du bloc, hash de la transaction, indice du log) d'un événement décodé
+    """
+    return (event['blockNumber'], hex_hash(event['blockHash']), hex_hash(event['transactionHash']),
+            event['logIndex'])
+
+
+def etapes_par_produit(rows: Iterable[Sequence]) -> Dict[str, List[Tuple]]:
+    """
+    Clés des étapes en base, par produit, à partir des lignes (produit_id,
+    bloc, hash du bloc, hash de la transaction, indice du log) triées par id.
+    Une étape antérieure à l'identité par log reçoit la clé (-1, None, None,
+    rang), placée avant celles des logs.
+    """
+    connues: Dict[str, List[Tuple]] = {}
+    for produit_id, bloc, bloc_hash, tx_hash, log_index in rows:
+        etapes = connues.setdefault(produit_id, [])
+        if log_index is None:
+            etapes.append((-1, None, None, len(etapes)))
+        else:
+            etapes.append((bloc, bloc_hash, tx_hash, log_index))
+    return connues
+
+
+def indexer_etapes(connues: Dict[str, Sequence[Tuple]], events: Iterable[Dict]) -> List[Tuple[Dict, int]]:
+    """
+    Indices des étapes des logs EtapeAjoutee pas encore écrits.
+
+    `connues` associe à chaque produit les clés (bloc, hash du bloc, hash de
+    la transaction, indice du log) de ses étapes déjà en base, étape 0 comprise.
+    Retourne [(événement, indice), ...] dans l'ordre de la chaîne.
+    """
+    par_produit: Dict[str, Dict[Tuple, Optional[Dict]]] = {}
+    for event in events:
+        par_produit.setdefault(event['args']['idProduit'], {})[cle(event)] = event
+
+    nouvelles = []
+    for produit_id, logs in par_produit.items():
+        toutes = {tuple(c): None for c in connues.get(produit_id, ())}
+        for c, event in logs.items():
+            if c not in toutes:
+                toutes[c] = event
+        for indice, c in enumerate(sorted(toutes, key=lambda c: (c[0], c[3]))):
+            if toutes[c] is not None:
+                nouvelles.append((toutes[c], indice))
+    nouvelles.sort(key=lambda item: (item[0]['blockNumber'], item[0]['logIndex']))
+    return nouvelles
+
+
+def point_de_fork(blocs: Sequence[Tuple[int, str]], hash_chaine: Callable[[Sequence[int]], Dict[int, str]]) -> Optional[int]:
+    """
+    Dernier bloc commun entre les blocs enregistrés [(numéro, hash), ...] et
+    la chaîne, ou None si le plus récent est toujours sur la chaîne.
+    `hash_chaine(numeros)` retourne {numéro: hash} pour les blocs demandés.
+    Retourne -1 si aucun bloc enregistré n'est plus sur la chaîne.
+    """
+    if not blocs:
+        return None
+    blocs = sorted(blocs, reverse=True)
+    numero, hash_ = blocs[0]
+    if hash_chaine([numero]).get(numero) == hash_:
+        return None
+    # Réorganisation : recherche du dernier bloc enregistré encore présent
+    hashes = hash_chaine([n for n, _ in blocs[1:]])
+    for numero, hash_ in blocs[1:]:
+        if hashes.get(numero) == hash_:
+            return numero
+    return -1
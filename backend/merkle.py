@@ -0,0 +1,64 @@
+import hashlib
+import json
+from typing import Dict, List, Tuple
+
+# Préfixes distincts pour les feuilles et les nœuds internes (évite les collisions de second préimage)
+LEAF_PREFIX = b'\x00'
+NODE_PREFIX = b'\x01'
+
+
+def record_hash(record: Dict) -> str:
+    """
+    Hash d'une feuille : SHA-256 de l'encodage canonique de l'enregistrement
+    """
+    encoded = json.dumps(record, sort_keys=True, separators=(',', ':')).encode()
+    return hashlib.sha256(LEAF_PREFIX + encoded).hexdigest()
+
+
+def _node_hash(left: str, right: str) -> str:
+    return hashlib.sha256(NODE_PREFIX + bytes.fromhex(left) + bytes.fromhex(right)).hexdigest()
+
+
+def build_tree(leaves: List[str]) -> List[List[str]]:
+    """
+    Construit tous les niveaux de l'arbre, des feuilles jusqu'à la racine.
+    Un nœud sans frère est promu tel quel au niveau supérieur.
+    """
+    if not leaves:
+        raise ValueError("Impossible de construire un arbre de Merkle vide")
+    levels = [list(leaves)]
+    while len(levels[-1]) > 1:
+        level = levels[-1]
+        parent = [_node_hash(level[i], level[i + 1]) for i in range(0, len(level) - 1, 2)]
+        if len(level) % 2:
+            parent.append(level[-1])
+        levels.append(parent)
+    return levels
+
+
+def merkle_root(leaves: List[str]) -> str:
+    return build_tree(leaves)[-1][0]
+
+
+def merkle_proof(levels: List[List[str]], leaf_index: int) -> List[Tuple[str, str]]:
+    """
+    Chemin de preuve pour une feuille : liste de (côté du frère, hash du frère)
+    """
+    proof = []
+    index = leaf_index
+    for level in levels[:-1]:
+        sibling = index ^ 1
+        if sibling < len(level):
+            proof.append(('L' if sibling < index else 'R', level[sibling]))
+        index //= 2
+    return proof
+
+
+def verify_proof(leaf: str, proof: List[Tuple[str, str]], root: str) -> bool:
+    """
+    Recalcule la racine à partir d'une feuille et de son chemin : O(log n) hash
+    """
+    current = leaf
+    for side, sibling in proof:
+        current = _node_hash(sibling, current) if side == 'L' else _node_hash(current, sibling)
+    return current == root
@@ -6,10 +6,29 @@ from web3 import Web3
 import psycopg2
 from datetime import datetime
 import random
+import os
+import sqlite3
+import threading
+import argparse
+from rpc_batch import BatchCaller, contract_events, log_topic
+from bulk_upsert import writer_for
+from db_pool import ConnectionPool
+from prix_historique import PrixHistorique
+from journal_evenements import cle, etapes_par_produit, hex_hash, indexer_etapes, point_de_fork
+from recuperation_journaux import RecuperateurJournaux
 
 # Configuration
 WEB3_PROVIDER = 'http://localhost:7545'
 CONTRACT_ADDRESS = '0x480608b80112000Fd2854EfDb37Bd2e4CbE29F92'  # Remplacez par l'adresse de votre contrat
+RPC_BATCH_SIZE = 100  # Appels eth_call par requête JSON-RPC batch
+STREAM_POLL_INTERVAL = 0.5  # Secondes entre deux eth_getFilterChanges
+STREAM_MAX_LOT = 500  # Événements au plus par écriture
+STREAM_MAX_DELAI = 1.0  # Secondes au plus entre la réception d'un événement et son écriture
+# Blocs de confirmation avant ingestion (0 pour Ganache, 12 ou plus sur un réseau public)
+CONFIRMATIONS = int(os.environ.get('ORACLE_CONFIRMATIONS', 0))
+BLOCS_CONSERVES = 256  # Hash de blocs gardés pour détecter une réorganisation
+LOGS_FENETRE = 2000  # Blocs par requête eth_getLogs au départ (ajusté selon les réponses du nœud)
+LOGS_WORKERS = 4  # Requêtes eth_getLogs en parallèle
 
 # Connexion à la base de données
 DB_PARAMS = {
@@ -18,30 +37,297 @@ DB_PARAMS = {
     'password': '12345',
     'host': 'localhost'
 }
+SQLITE_PATH = os.environ.get('ORACLE_SQLITE_PATH')
+CONTRACT_ARTIFACT = '../build/contracts/TracabiliteAgricoleMaroc.json'
 
-# Charger l'ABI du contrat
+# Ressources gardées d'une exécution planifiée à l'autre
+DB_POOL_MIN = 1
+DB_POOL_MAX = 4
+_contract_abi = None
+_session = None
+_web3 = None
+_contract = None
+_caller = None
+_pool = None
+_historique = None
+_recuperateur = None
+# Ingestion exclusive : la synchronisation planifiée et la phase d'écriture du flux partagent
+# le BatchCaller, le récupérateur de journaux, les curseurs et les lignes d'étapes
+_ingestion = threading.Lock()
+
+# Charger l'ABI du contrat (l'artefact n'est lu qu'une fois)
 def load_contract_abi():
-    try:
-        with open('../build/contracts/TracabiliteAgricoleMaroc.json', 'r') as f:
-            contract_json = json.load(f)
-        return contract_json['abi']
-    except Exception as e:
-        print(f"Erreur lors du chargement de l'ABI: {e}")
-        return None
+    global _contract_abi
+    if _contract_abi is None:
+        try:
+            with open(CONTRACT_ARTIFACT, 'r') as f:
+                contract_json = json.load(f)
+            _contract_abi = contract_json['abi']
+        except Exception as e:
+            print(f"Erreur lors du chargement de l'ABI: {e}")
+            return None
+    return _contract_abi
 
-# Initialiser Web3 et le contrat
+# Initialiser Web3 et le contrat, une seule fois ; la session HTTP garde les connexions ouvertes (keep-alive)
 def init_contract():
-    try:
-        web3 = Web3(Web3.HTTPProvider(WEB3_PROVIDER))
-        contract_abi = load_contract_abi()
-        if not contract_abi:
+    global _session, _web3, _contract
+    if _contract is None:
+        try:
+            contract_abi = load_contract_abi()
+            if not contract_abi:
+                return None, None
+            _session = requests.Session()
+            _web3 = Web3(Web3.HTTPProvider(WEB3_PROVIDER, session=_session))
+            _contract = _web3.eth.contract(address=CONTRACT_ADDRESS, abi=contract_abi)
+        except Exception as e:
+            print(f"Erreur lors de l'initialisation du contrat: {e}")
             return None, None
-            
-        contract = web3.eth.contract(address=CONTRACT_ADDRESS, abi=contract_abi)
-        return web3, contract
-    except Exception as e:
-        print(f"Erreur lors de l'initialisation du contrat: {e}")
-        return None, None
+    return _web3, _contract
+
+def get_batch_caller(contract):
+    # Les requêtes batch passent par la même session que le fournisseur
+    global _caller
+    if _caller is None:
+        _caller = BatchCaller(contract, RPC_BATCH_SIZE, session=_session)
+    return _caller
+
+def get_recuperateur():
+    # La taille de fenêtre apprise sur le nœud est gardée d'une synchronisation à l'autre
+    global _recuperateur
+    if _recuperateur is None:
+        _recuperateur = RecuperateurJournaux(LOGS_FENETRE, LOGS_WORKERS)
+    return _recuperateur
+
+# Connexion à la base de l'oracle : PostgreSQL, ou SQLite si ORACLE_SQLITE_PATH est défini
+def connect_db():
+    if SQLITE_PATH:
+        # Les connexions du pool peuvent être empruntées depuis un autre thread
+        return sqlite3.connect(SQLITE_PATH, check_same_thread=False)
+    return psycopg2.connect(**DB_PARAMS)
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        _pool = ConnectionPool(connect_db, minconn=DB_POOL_MIN, maxconn=DB_POOL_MAX)
+    return _pool
+
+def get_historique(conn):
+    # Historique des prix : schéma créé à la première utilisation
+    global _historique
+    if _historique is None:
+        historique = PrixHistorique.pour_connexion(conn)
+        historique.creer_schema(conn)
+        conn.commit()
+        _historique = historique
+    return _historique
+
+def statistiques_pool():
+    return get_pool().stats()
+
+def fermer_ressources():
+    global _session, _web3, _contract, _caller, _pool, _historique, _recuperateur
+    if _pool is not None:
+        _pool.closeall()
+    if _session is not None:
+        _session.close()
+    _session = _web3 = _contract = _caller = _pool = _historique = _recuperateur = None
+
+# Curseur de synchronisation : dernier bloc entièrement traité par type d'événement,
+# et hash des blocs atteints par les curseurs pour détecter les réorganisations
+def init_curseurs(writer):
+    cur = writer.conn.cursor()
+    cur.execute(
+        """CREATE TABLE IF NOT EXISTS sync_curseur (
+               evenement VARCHAR(64) PRIMARY KEY,
+               dernier_bloc BIGINT NOT NULL,
+               date_maj TIMESTAMP NOT NULL
+           )"""
+    )
+    cur.execute(
+        """CREATE TABLE IF NOT EXISTS sync_bloc (
+               numero BIGINT PRIMARY KEY,
+               hash VARCHAR(66) NOT NULL
+           )"""
+    )
+    cur.close()
+
+def lire_curseur(writer, evenement):
+    cur = writer.conn.cursor()
+    cur.execute(writer.sql("SELECT dernier_bloc FROM sync_curseur WHERE evenement = %s"), (evenement,))
+    row = cur.fetchone()
+    cur.close()
+    return row[0] if row else -1
+
+def avancer_curseur(writer, evenement, bloc):
+    # Le curseur ne recule jamais : le flux et la synchronisation périodique peuvent l'avancer tous les deux
+    plus_grand = 'MAX' if writer.backend == 'sqlite' else 'GREATEST'
+    cur = writer.conn.cursor()
+    cur.execute(
+        writer.sql(f"""INSERT INTO sync_curseur (evenement, dernier_bloc, date_maj) VALUES (%s, %s, %s)
+           ON CONFLICT (evenement) DO UPDATE
+           SET dernier_bloc = {plus_grand}(sync_curseur.dernier_bloc, EXCLUDED.dernier_bloc),
+               date_maj = EXCLUDED.date_maj"""),
+        (evenement, bloc, datetime.now())
+    )
+    cur.close()
+
+def enregistrer_bloc(writer, numero, hash_bloc):
+    cur = writer.conn.cursor()
+    cur.execute(writer.sql("""INSERT INTO sync_bloc (numero, hash) VALUES (%s, %s)
+           ON CONFLICT (numero) DO UPDATE SET hash = EXCLUDED.hash"""), (numero, hex_hash(hash_bloc)))
+    cur.execute(writer.sql("DELETE FROM sync_bloc WHERE numero < %s"), (numero - BLOCS_CONSERVES,))
+    cur.close()
+
+def blocs_enregistres(writer):
+    cur = writer.conn.cursor()
+    cur.execute("SELECT numero, hash FROM sync_bloc")
+    rows = cur.fetchall()
+    cur.close()
+    return rows
+
+def annuler_blocs(writer, bloc):
+    """
+    Supprime les lignes écrites depuis les blocs postérieurs à `bloc` et
+    ramène les curseurs à ce bloc (dans la transaction de l'appelant)
+    """
+    cur = writer.conn.cursor()
+    for table in ('etape', 'produit', 'producteur'):
+        cur.execute(writer.sql(f"DELETE FROM {table} WHERE bloc > %s"), (bloc,))
+    cur.execute(writer.sql("UPDATE sync_curseur SET dernier_bloc = %s WHERE dernier_bloc > %s"), (bloc, bloc))
+    cur.execute(writer.sql("DELETE FROM sync_bloc WHERE numero > %s"), (bloc,))
+    cur.close()
+
+def verifier_reorganisation(web3, writer):
+    """
+    Annule les lignes issues de blocs qui ne sont plus sur la chaîne.
+    Retourne le dernier bloc commun, ou None s'il n'y a pas eu de réorganisation.
+    """
+    def hash_chaine(numeros):
+        return {numero: hex_hash(web3.eth.get_block(numero)['hash']) for numero in numeros}
+    
+    fork = point_de_fork(blocs_enregistres(writer), hash_chaine)
+    if fork is not None:
+        annuler_blocs(writer, fork)
+        writer.conn.commit()
+        print(f"Réorganisation détectée : lignes postérieures au bloc {fork} annulées")
+    return fork
+
+def tete_confirmee(web3):
+    return web3.eth.block_number - CONFIRMATIONS
+
+# Lignes insérées pour chaque type d'événement (partagées avec async_oracle)
+COLONNES_PRODUCTEUR = ('id', 'nom', 'region', 'est_verifie', 'date_ajout', 'bloc')
+COLONNES_PRODUIT = ('id', 'nom', 'producteur_id', 'region', 'date_recolte', 'est_bio', 'qualite_score', 'prix_marche',
+                    'bloc')
+COLONNES_ETAPE = ('produit_id', 'date', 'operation', 'operateur', 'lieu', 'temperature', 'humidite',
+                  'bloc', 'bloc_hash', 'tx_hash', 'log_index')
+
+def lignes_producteurs(events):
+    return [(e['args']['id'], e['args']['nom'], e['args']['region'], False, datetime.now(), e['blockNumber'])
+            for e in events]
+
+def nouveaux_produits(events):
+    # Un même produit n'est retenu qu'une fois ; l'appelant retire ceux déjà en base
+    return {event['args']['id']: event for event in events}
+
+def lignes_produits(nouveaux, details):
+    return [
+        (
+            event['args']['id'],
+            event['args']['nom'],
+            event['args']['idProducteur'],
+            produit_details[3],  # région
+            datetime.fromtimestamp(produit_details[4]),  # date_recolte
+            produit_details[5],  # est_bio
+            random.uniform(60, 95),  # qualité fictive
+            random.uniform(10, 100),  # prix fictif
+            event['blockNumber']
+        )
+        for event, produit_details in zip(nouveaux.values(), details)
+    ]
+
+def lignes_recoltes(nouveaux, details):
+    # Étape 0, ajoutée par enregistrerProduit : elle a l'identité du log ProduitEnregistre
+    return [
+        (
+            event['args']['id'],
+            datetime.fromtimestamp(produit_details[4]),  # date de récolte
+            'Recolte',
+            event['args']['idProducteur'],
+            produit_details[3],  # région
+            random.uniform(20, 30),  # température fictive
+            random.uniform(40, 80),  # humidité fictive
+            *cle(event)
+        )
+        for event, produit_details in zip(nouveaux.values(), details)
+    ]
+
+def produits_des_etapes(events):
+    # Chaque produit n'est relu qu'une fois, même s'il a reçu plusieurs étapes
+    return list(dict.fromkeys(event['args']['idProduit'] for event in events))
+
+def etapes_connues(writer, produit_ids, chunk_size=1000):
+    """
+    Clés (bloc, hash du bloc, hash de la transaction, indice du log) des étapes en base, par produit
+    """
+    rows = []
+    cur = writer.conn.cursor()
+    for start in range(0, len(produit_ids), chunk_size):
+        chunk = list(produit_ids[start:start + chunk_size])
+        marks = ', '.join([writer.placeholder] * len(chunk))
+        # Triées par id : les étapes antérieures à l'identité par log gardent leur rang
+        cur.execute(f"SELECT produit_id, bloc, bloc_hash, tx_hash, log_index FROM etape "
+                    f"WHERE produit_id IN ({marks}) ORDER BY id", chunk)
+        rows.extend(cur.fetchall())
+    cur.close()
+    return etapes_par_produit(rows)
+
+def appels_etapes(nouvelles):
+    return [(event['args']['idProduit'], indice) for event, indice in nouvelles]
+
+def lignes_etapes(nouvelles, etapes):
+    return [
+        (
+            event['args']['idProduit'],
+            datetime.fromtimestamp(etape_details[0]),  # date
+            etape_details[1],  # operation
+            etape_details[2],  # operateur
+            etape_details[3],  # lieu
+            random.uniform(20, 30),  # température fictive
+            random.uniform(40, 80),  # humidité fictive
+            *cle(event)
+        )
+        for (event, _), etape_details in zip(nouvelles, etapes)
+    ]
+
+# Les événements décodés sont écrits par lots ; les doublons sont ignorés par la base
+def traiter_producteurs(writer, caller, events):
+    writer.upsert('producteur', COLONNES_PRODUCTEUR, lignes_producteurs(events))
+
+def traiter_produits(writer, caller, events):
+    nouveaux = nouveaux_produits(events)
+    for produit_id in writer.existing('produit', 'id', list(nouveaux)):
+        del nouveaux[produit_id]
+    
+    # Récupérer les détails des produits depuis le contrat, par requêtes batch
+    details = caller.call_many('obtenirProduit', [(produit_id,) for produit_id in nouveaux])
+    writer.upsert('produit', COLONNES_PRODUIT, lignes_produits(nouveaux, details))
+    writer.upsert('etape', COLONNES_ETAPE, lignes_recoltes(nouveaux, details))
+
+def traiter_etapes(writer, caller, events):
+    # Une étape par log : son indice se déduit des étapes déjà en base, sans relire tout le produit
+    nouvelles = indexer_etapes(etapes_connues(writer, produits_des_etapes(events)), events)
+    etapes = caller.call_many('obtenirEtape', appels_etapes(nouvelles))
+    
+    # Un log déjà écrit est écarté par l'index unique (hash du bloc, hash de la transaction, indice du log)
+    writer.upsert('etape', COLONNES_ETAPE, lignes_etapes(nouvelles, etapes))
+
+# Événements synchronisés, dans l'ordre des dépendances (producteur -> produit -> étape)
+EVENEMENTS = [
+    ('ProducteurAjoute', traiter_producteurs),
+    ('ProduitEnregistre', traiter_produits),
+    ('EtapeAjoutee', traiter_etapes),
+]
 
 # Synchroniser les événements de la blockchain
 def synchroniser_blockchain():
@@ -52,158 +338,222 @@ def synchroniser_blockchain():
         return
     
     try:
-        conn = psycopg2.connect(**DB_PARAMS)
-        cur = conn.cursor()
-        
-        # Synchroniser les producteurs
-        producteur_filter = contract.events.ProducteurAjoute.createFilter(fromBlock=0)
-        for event in producteur_filter.get_all_entries():
-            args = event['args']
-            
-            # Vérifier si le producteur existe déjà
-            cur.execute("SELECT id FROM producteur WHERE id = %s", (args['id'],))
-            if not cur.fetchone():
-                # Ajouter le producteur à la base de données
-                cur.execute(
-                    "INSERT INTO producteur (id, nom, region, est_verifie, date_ajout) VALUES (%s, %s, %s, %s, %s)",
-                    (args['id'], args['nom'], args['region'], False, datetime.now())
-                )
-        
-        # Synchroniser les produits
-        produit_filter = contract.events.ProduitEnregistre.createFilter(fromBlock=0)
-        for event in produit_filter.get_all_entries():
-            args = event['args']
+        with _ingestion, get_pool().connection() as conn:
+            writer = writer_for(conn)
+            init_curseurs(writer)
+            writer.ensure_schema()
+            conn.commit()
             
-            # Vérifier si le produit existe déjà
-            cur.execute("SELECT id FROM produit WHERE id = %s", (args['id'],))
-            if not cur.fetchone():
-                # Récupérer les détails du produit depuis le contrat
-                produit_details = contract.functions.obtenirProduit(args['id']).call()
-                
-                # Ajouter le produit à la base de données
-                cur.execute(
-                    """INSERT INTO produit 
-                       (id, nom, producteur_id, region, date_recolte, est_bio, qualite_score, prix_marche) 
-                       VALUES (%s, %s, %s, %s, %s, %s, %s, %s)""",
-                    (
-                        args['id'], 
-                        args['nom'], 
-                        args['idProducteur'], 
-                        produit_details[3],  # région
-                        datetime.fromtimestamp(produit_details[4]),  # date_recolte
-                        produit_details[5],  # est_bio
-                        random.uniform(60, 95),  # qualité fictive
-                        random.uniform(10, 100)  # prix fictif
-                    )
-                )
-        
-        # Synchroniser les étapes
-        etape_filter = contract.events.EtapeAjoutee.createFilter(fromBlock=0)
-        for event in etape_filter.get_all_entries():
-            args = event['args']
-            produit_id = args['idProduit']
+            # Lectures du contrat regroupées en requêtes JSON-RPC batch
+            caller = get_batch_caller(contract)
             
-            # Récupérer le nombre d'étapes pour ce produit
-            etapes_count = contract.functions.nombreEtapes(produit_id).call()
+            # Lignes issues de blocs orphelins annulées avant de reprendre depuis les curseurs
+            verifier_reorganisation(web3, writer)
             
-            # Récupérer toutes les étapes du produit
-            for i in range(etapes_count):
-                etape_details = contract.functions.obtenirEtape(produit_id, i).call()
+            # Seuls les blocs (curseur + 1 .. tête confirmée) sont lus : le coût suit la nouvelle activité
+            tete = tete_confirmee(web3)
+            if tete >= 0:
+                enregistrer_bloc(writer, tete, web3.eth.get_block(tete)['hash'])
+            decodeurs = decodeurs_evenements(contract)
+            for evenement, traiter in EVENEMENTS:
+                depuis = lire_curseur(writer, evenement) + 1
+                if depuis > tete:
+                    continue
+                events = lire_journaux(web3, contract, {topic: decodeur for topic, decodeur in decodeurs.items()
+                                                        if decodeur.name == evenement}, depuis, tete)
+                traiter(writer, caller, events)
                 
-                # Vérifier si cette étape existe déjà
-                cur.execute(
-                    """SELECT id FROM etape 
-                       WHERE produit_id = %s AND operation = %s AND operateur = %s AND lieu = %s AND 
-                             date = %s""",
-                    (
-                        produit_id, 
-                        etape_details[1],  # operation
-                        etape_details[2],  # operateur
-                        etape_details[3],  # lieu
-                        datetime.fromtimestamp(etape_details[0])  # date
-                    )
-                )
-                
-                if not cur.fetchone():
-                    # Ajouter l'étape à la base de données
-                    cur.execute(
-                        """INSERT INTO etape 
-                           (produit_id, date, operation, operateur, lieu, temperature, humidite) 
-                           VALUES (%s, %s, %s, %s, %s, %s, %s)""",
-                        (
-                            produit_id,
-                            datetime.fromtimestamp(etape_details[0]),  # date
-                            etape_details[1],  # operation
-                            etape_details[2],  # operateur
-                            etape_details[3],  # lieu
-                            random.uniform(20, 30),  # température fictive
-                            random.uniform(40, 80)  # humidité fictive
-                        )
-                    )
-        
-        conn.commit()
+                # Le curseur avance dans la même transaction que les insertions
+                avancer_curseur(writer, evenement, tete)
+                conn.commit()
+                print(f"{evenement}: {len(events)} événements (blocs {depuis} à {tete})")
+            conn.commit()
+            
+            for ligne in writer.report():
+                print(ligne)
+        print(f"eth_getLogs: {get_recuperateur().stats()}")
         print("Synchronisation terminée avec succès")
     
     except Exception as e:
+        # La transaction en cours est annulée au retour de la connexion dans le pool
         print(f"Erreur lors de la synchronisation: {e}")
-        if conn:
-            conn.rollback()
-    finally:
-        if cur:
-            cur.close()
-        if conn:
-            conn.close()
 
-# Mettre à jour les prix de marché (simulation)
+# Ingestion en flux : un filtre eth_newFilter sur les trois événements du contrat, interrogé en continu
+def decodeurs_evenements(contract):
+    decodeurs = contract_events(contract.abi)
+    return {decodeurs[evenement].topic: decodeurs[evenement] for evenement, _ in EVENEMENTS}
+
+def requete_journaux(contract, decodeurs, depuis, jusqua=None):
+    requete = {'address': contract.address, 'fromBlock': depuis, 'topics': [list(decodeurs)]}
+    if jusqua is not None:
+        requete['toBlock'] = jusqua
+    return requete
+
+def decoder_journaux(decodeurs, logs):
+    return [decodeurs[log_topic(log)].decode(log) for log in logs]
+
+def lire_journaux(web3, contract, decodeurs, depuis, jusqua):
+    """
+    Événements décodés des blocs `depuis` à `jusqua`, récupérés par fenêtres
+    parallèles puis remis dans l'ordre de la chaîne
+    """
+    def get_logs(debut, fin):
+        return web3.eth.get_logs(requete_journaux(contract, decodeurs, debut, fin))
+    return decoder_journaux(decodeurs, get_recuperateur().recuperer(get_logs, depuis, jusqua))
+
+def ingerer_evenements(writer, caller, events, bloc=None, hash_bloc=None):
+    """
+    Écrit un lot d'événements décodés, tous types confondus, dans l'ordre des
+    dépendances et en une transaction. Si `bloc` est donné, les curseurs
+    avancent jusqu'à ce bloc dans la même transaction.
+    """
+    par_type = {evenement: [] for evenement, _ in EVENEMENTS}
+    for event in events:
+        par_type[event['event']].append(event)
+    for evenement, traiter in EVENEMENTS:
+        if par_type[evenement]:
+            traiter(writer, caller, par_type[evenement])
+        if bloc is not None:
+            avancer_curseur(writer, evenement, bloc)
+    if hash_bloc is not None:
+        enregistrer_bloc(writer, bloc, hash_bloc)
+    writer.conn.commit()
+
+def rattraper(web3, contract, caller, decodeurs, tete=None):
+    """
+    Écrit les blocs manqués depuis le plus ancien curseur jusqu'à `tete` (par
+    défaut la tête confirmée), les trois événements dans les mêmes fenêtres
+    eth_getLogs. Retourne le bloc jusqu'auquel les curseurs ont avancé.
+    """
+    with get_pool().connection() as conn:
+        writer = writer_for(conn)
+        init_curseurs(writer)
+        writer.ensure_schema()
+        conn.commit()
+        verifier_reorganisation(web3, writer)
+        depuis = min(lire_curseur(writer, evenement) for evenement, _ in EVENEMENTS) + 1
+        tete = tete_confirmee(web3) if tete is None else tete
+        if depuis > tete:
+            return tete
+        events = lire_journaux(web3, contract, decodeurs, depuis, tete)
+        ingerer_evenements(writer, caller, events, tete, web3.eth.get_block(tete)['hash'])
+    print(f"Rattrapage: {len(events)} événements (blocs {depuis} à {tete})")
+    return tete
+
+def flux_evenements(intervalle=STREAM_POLL_INTERVAL, max_lot=STREAM_MAX_LOT, max_delai=STREAM_MAX_DELAI, arret=None):
+    """
+    Traite les événements au fil des blocs. Les événements reçus attendent
+    CONFIRMATIONS blocs, puis sont regroupés et écrits dès que le nœud n'en
+    renvoie plus, qu'il y en a `max_lot` ou que le plus ancien attend depuis
+    `max_delai` secondes. Un log retiré par le nœud (réorganisation) avant
+    d'être confirmé est abandonné ; après écriture, la réorganisation est
+    détectée par le hash des blocs et les lignes concernées sont annulées.
+    Les doublons avec la synchronisation périodique sont ignorés par la base.
+    """
+    web3, contract = init_contract()
+    if not web3 or not contract:
+        print("Impossible d'initialiser la connexion à la blockchain")
+        return
+    caller = get_batch_caller(contract)
+    decodeurs = decodeurs_evenements(contract)
+    filtre = None
+    tampon, recu_depuis = {}, None
+    
+    while arret is None or not arret.is_set():
+        try:
+            if filtre is None:
+                # Le filtre est créé avant de lire la tête : les blocs postérieurs à `tete` lui parviennent
+                filtre = web3.eth.filter(requete_journaux(contract, decodeurs, 'latest'))
+                tete = web3.eth.block_number
+                with _ingestion:
+                    confirme = rattraper(web3, contract, caller, decodeurs, tete - CONFIRMATIONS)
+                    # Blocs pas encore confirmés au démarrage : lus une fois puis mis en attente avec
+                    # ceux du filtre, les curseurs n'avançant qu'avec leur écriture
+                    for event in lire_journaux(web3, contract, decodeurs, max(confirme, -1) + 1, tete):
+                        tampon[cle(event)] = event
+                recu_depuis = time.monotonic() if tampon else None
+            
+            # Tête lue avant les journaux : tous ceux des blocs jusqu'à `tete` sont alors reçus
+            tete = tete_confirmee(web3)
+            logs = filtre.get_new_entries()
+            for event in decoder_journaux(decodeurs, logs):
+                if event['removed']:
+                    tampon.pop(cle(event), None)
+                else:
+                    tampon[cle(event)] = event
+            if logs and tampon:
+                recu_depuis = recu_depuis or time.monotonic()
+            
+            prets = sorted((event for c, event in tampon.items() if c[0] <= tete),
+                           key=lambda event: (event['blockNumber'], event['logIndex']))
+            if prets and (not logs or len(prets) >= max_lot or time.monotonic() - recu_depuis >= max_delai):
+                with _ingestion, get_pool().connection() as conn:
+                    writer = writer_for(conn)
+                    if verifier_reorganisation(web3, writer) is not None:
+                        # Curseurs ramenés au dernier bloc commun : nouveau filtre et rattrapage
+                        filtre = None
+                        tampon, recu_depuis = {}, None
+                        continue
+                    ingerer_evenements(writer, caller, prets, tete, web3.eth.get_block(tete)['hash'])
+                for event in prets:
+                    del tampon[cle(event)]
+                print(f"Flux: {len(prets)} événements écrits en {time.monotonic() - recu_depuis:.2f}s")
+                recu_depuis = time.monotonic() if tampon else None
+        
+        except Exception as e:
+            # Filtre expiré côté nœud ou écriture refusée : nouveau filtre, puis rattrapage depuis les curseurs
+            print(f"Erreur du flux d'événements: {e}")
+            filtre = None
+            tampon, recu_depuis = {}, None
+        
+        time.sleep(intervalle)
+
+# Mettre à jour les prix de marché (simulation) : un tick de l'historique, sans écraser les prix passés
 def mettre_a_jour_prix_marche():
     print("Mise à jour des prix de marché...")
     try:
-        conn = psycopg2.connect(**DB_PARAMS)
-        cur = conn.cursor()
-        
-        # Récupérer tous les produits
-        cur.execute("SELECT id, nom FROM produit")
-        produits = cur.fetchall()
-        
-        for produit_id, produit_nom in produits:
-            # Simuler une fluctuation de prix
-            nouveau_prix = random.uniform(10, 100)
-            
-            # Mettre à jour le prix dans la base de données
-            cur.execute(
-                "UPDATE produit SET prix_marche = %s WHERE id = %s",
-                (nouveau_prix, produit_id)
-            )
-        
-        conn.commit()
+        with get_pool().connection() as conn:
+            get_historique(conn).enregistrer_tick(conn)
+            conn.commit()
         print("Prix de marché mis à jour avec succès")
     
     except Exception as e:
         print(f"Erreur lors de la mise à jour des prix: {e}")
-        if conn:
-            conn.rollback()
-    finally:
-        if cur:
-            cur.close()
-        if conn:
-            conn.close()
+
+# Tâches planifiées : synchronisation complète (filet de sécurité en mode flux) et prix
+def boucle_planifiee():
+    while True:
+        schedule.run_pending()
+        time.sleep(1)
 
 # Programme principal
 def main():
+    parser = argparse.ArgumentParser(description="Service d'oracle et d'indexation")
+    parser.add_argument('--mode', choices=['flux', 'planifie'], default='flux',
+                        help="flux : événements traités au fil des blocs ; planifie : synchronisation toutes les 5 minutes")
+    args = parser.parse_args()
     print("Démarrage du service d'oracle et d'indexation...")
     
-    # Exécuter la synchronisation immédiatement au démarrage
-    synchroniser_blockchain()
+    # En mode flux, le rattrapage au démarrage est fait par le flux lui-même
+    if args.mode == 'planifie':
+        synchroniser_blockchain()
     mettre_a_jour_prix_marche()
     
     # Planifier les tâches récurrentes
     schedule.every(5).minutes.do(synchroniser_blockchain)
     schedule.every(1).hour.do(mettre_a_jour_prix_marche)
+    schedule.every(5).minutes.do(lambda: print(f"Pool de connexions: {statistiques_pool()}"))
     
     # Boucle principale
-    while True:
-        schedule.run_pending()
-        time.sleep(1)
+    try:
+        if args.mode == 'flux':
+            # La synchronisation planifiée sert de réconciliation ; elle n'écrit jamais en même temps que le flux
+            threading.Thread(target=boucle_planifiee, daemon=True).start()
+            flux_evenements()
+        else:
+            boucle_planifiee()
+    finally:
+        fermer_ressources()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
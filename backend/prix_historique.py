@@ -0,0 +1,268 @@
+"""
+Historique des prix de marché.
+
+- `prix_historique` : ticks bruts, en ajout seul. Sur PostgreSQL la table est
+  partitionnée par mois (partitions créées à la demande) ; SQLite n'a pas de
+  partitionnement, la table y est simple.
+- `prix_ohlc` : agrégats ouverture/haut/bas/clôture par minute, heure et
+  jour, mis à jour de façon incrémentale à chaque tick (upsert).
+- Un tick = une requête ensembliste sur PostgreSQL : l'insertion des prix
+  bruts (RETURNING) alimente les trois agrégats et `produit.prix_marche`.
+  SQLite passe par une table temporaire des lignes du tick. Seules les
+  lignes insérées par le tick sont agrégées, même si l'instant existe déjà.
+- Les lectures sur une période choisissent l'agrégat le plus grossier dont
+  le pas ne dépasse pas la résolution demandée : un graphique sur un an lit
+  quelques milliers de lignes agrégées, jamais les ticks bruts.
+
+Les requêtes sont écrites avec des paramètres %s ; `PrixHistorique` les
+adapte au pilote (psycopg2, sqlite3 ou asyncpg).
+"""
+import sqlite3
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Du plus grossier au plus fin : (nom, pas en secondes, troncature)
+RESOLUTIONS = [
+    ('jour', 86400, lambda ts: ts.replace(hour=0, minute=0, second=0, microsecond=0)),
+    ('heure', 3600, lambda ts: ts.replace(minute=0, second=0, microsecond=0)),
+    ('minute', 60, lambda ts: ts.replace(second=0, microsecond=0)),
+]
+BRUT = 'brut'
+POINTS_PAR_DEFAUT = 500
+
+
+def _mois(ts: datetime) -> Tuple[datetime, datetime]:
+    debut = ts.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    fin = (debut + timedelta(days=32)).replace(day=1)
+    return debut, fin
+
+
+def _datetime(value):
+    # sqlite3 retourne les horodatages sous forme de chaînes ISO
+    return datetime.fromisoformat(value) if isinstance(value, str) else value
+
+
+def choisir_resolution(pas: float) -> str:
+    """
+    Agrégat le plus grossier dont le pas ne dépasse pas `pas` secondes
+    """
+    for nom, secondes, _ in RESOLUTIONS:
+        if secondes <= pas:
+            return nom
+    return BRUT
+
+
+class PrixHistorique:
+    """
+    Générateur des requêtes de l'historique pour un pilote donné.
+
+        historique = PrixHistorique.pour_connexion(conn)
+        historique.enregistrer_tick(conn)
+        conn.commit()
+    """
+    def __init__(self, backend: str = 'postgresql', placeholder: str = '%s'):
+        self.backend = backend
+        self.placeholder = placeholder
+        self._partitions = set()
+
+    @classmethod
+    def pour_connexion(cls, conn) -> 'PrixHistorique':
+        if isinstance(conn, sqlite3.Connection):
+            return cls('sqlite', '?')
+        return cls('postgresql', '%s')
+
+    def sql(self, query: str) -> str:
+        if self.placeholder == '%s':
+            return query
+        if self.placeholder == '$':
+            # asyncpg : paramètres numérotés
+            parts = query.split('%s')
+            return parts[0] + ''.join(f"${i}{part}" for i, part in enumerate(parts[1:], 1))
+        return query.replace('%s', self.placeholder)
+
+    def _ts(self) -> str:
+        # Sans type explicite, PostgreSQL ne peut pas typer un paramètre d'un SELECT ... UNION ALL
+        return '%s' if self.backend == 'sqlite' else 'CAST(%s AS TIMESTAMP)'
+
+    # ------------------------------------------------------------------
+    # Schéma
+    # ------------------------------------------------------------------
+    def schema(self) -> List[str]:
+        partition = '' if self.backend == 'sqlite' else ' PARTITION BY RANGE (ts)'
+        return [
+            f"""CREATE TABLE IF NOT EXISTS prix_historique (
+                   produit_id VARCHAR(64) NOT NULL,
+                   ts TIMESTAMP NOT NULL,
+                   prix DOUBLE PRECISION NOT NULL
+               ){partition}""",
+            "CREATE INDEX IF NOT EXISTS prix_historique_produit_idx ON prix_historique (produit_id, ts)",
+            "CREATE INDEX IF NOT EXISTS prix_historique_ts_idx ON prix_historique (ts)",
+            """CREATE TABLE IF NOT EXISTS prix_ohlc (
+                   resolution VARCHAR(8) NOT NULL,
+                   produit_id VARCHAR(64) NOT NULL,
+                   periode TIMESTAMP NOT NULL,
+                   ouverture DOUBLE PRECISION NOT NULL,
+                   haut DOUBLE PRECISION NOT NULL,
+                   bas DOUBLE PRECISION NOT NULL,
+                   cloture DOUBLE PRECISION NOT NULL,
+                   nb INTEGER NOT NULL,
+                   debut TIMESTAMP NOT NULL,
+                   fin TIMESTAMP NOT NULL,
+                   PRIMARY KEY (resolution, produit_id, periode)
+               )""",
+        ]
+
+    def partition(self, ts: datetime) -> List[str]:
+        """
+        Partition mensuelle couvrant `ts` (PostgreSQL), créée une fois par processus
+        """
+        if self.backend == 'sqlite':
+            return []
+        debut, fin = _mois(ts)
+        nom = f"prix_historique_{debut:%Y%m}"
+        if nom in self._partitions:
+            return []
+        self._partitions.add(nom)
+        return [f"CREATE TABLE IF NOT EXISTS {nom} PARTITION OF prix_historique "
+                f"FOR VALUES FROM ('{debut:%Y-%m-%d}') TO ('{fin:%Y-%m-%d}')"]
+
+    # ------------------------------------------------------------------
+    # Écriture
+    # ------------------------------------------------------------------
+    def tick(self, ts: datetime, prix: Optional[Sequence[Tuple[str, float]]] = None) -> List[Tuple[str, tuple, bool]]:
+        """
+        Requêtes d'un tick à l'instant `ts` : [(sql, paramètres, executemany), ...].
+        Sans `prix`, une fluctuation est simulée pour tous les produits.
+        """
+        statements = [(self.sql(query), (), False) for query in self.partition(ts)]
+
+        # Chaque tick est combiné à la période qui le contient, pour les trois agrégats
+        periodes = ' UNION ALL '.join(f"SELECT %s AS resolution, {self._ts()} AS periode" for _ in RESOLUTIONS)
+        params_periodes = tuple(value for nom, _, tronquer in RESOLUTIONS for value in (nom, tronquer(ts)))
+        plus_grand, plus_petit = ('MAX', 'MIN') if self.backend == 'sqlite' else ('GREATEST', 'LEAST')
+        # Le WHERE lève l'ambiguïté de SQLite entre ON d'une jointure et ON CONFLICT
+        cumul = f"""INSERT INTO prix_ohlc (resolution, produit_id, periode, ouverture, haut, bas, cloture, nb, debut, fin)
+                SELECT r.resolution, t.produit_id, r.periode, t.prix, t.prix, t.prix, t.prix, 1, t.ts, t.ts
+                FROM {{source}} t CROSS JOIN ({periodes}) r
+                WHERE true
+                ON CONFLICT (resolution, produit_id, periode) DO UPDATE SET
+                    ouverture = CASE WHEN EXCLUDED.debut < prix_ohlc.debut
+                                     THEN EXCLUDED.ouverture ELSE prix_ohlc.ouverture END,
+                    cloture = CASE WHEN EXCLUDED.fin >= prix_ohlc.fin
+                                   THEN EXCLUDED.cloture ELSE prix_ohlc.cloture END,
+                    haut = {plus_grand}(prix_ohlc.haut, EXCLUDED.haut),
+                    bas = {plus_petit}(prix_ohlc.bas, EXCLUDED.bas),
+                    debut = {plus_petit}(prix_ohlc.debut, EXCLUDED.debut),
+                    fin = {plus_grand}(prix_ohlc.fin, EXCLUDED.fin),
+                    nb = prix_ohlc.nb + 1"""
+
+        if self.backend == 'sqlite':
+            # Lignes du tick dans une table temporaire : les agrégats et le dernier prix ne lisent
+            # qu'elles, jamais un tick déjà enregistré au même instant
+            statements += [
+                (self.sql("CREATE TEMP TABLE IF NOT EXISTS tick_prix "
+                          "(produit_id VARCHAR(64) NOT NULL, ts TIMESTAMP NOT NULL, prix DOUBLE PRECISION NOT NULL)"),
+                 (), False),
+                (self.sql("DELETE FROM tick_prix"), (), False),
+            ]
+            if prix is None:
+                statements.append((self.sql("INSERT INTO tick_prix (produit_id, ts, prix) "
+                                            "SELECT id, %s, 10 + (abs(random()) % 9000) / 100.0 FROM produit"),
+                                   (ts,), False))
+            else:
+                statements.append((self.sql("INSERT INTO tick_prix (produit_id, ts, prix) VALUES (%s, %s, %s)"),
+                                   [(produit_id, ts, valeur) for produit_id, valeur in prix], True))
+            statements += [
+                (self.sql("INSERT INTO prix_historique (produit_id, ts, prix) SELECT produit_id, ts, prix FROM tick_prix"),
+                 (), False),
+                (self.sql(cumul.format(source='tick_prix')), params_periodes, False),
+                # Dernier prix connu sur le produit, pour les écrans existants
+                (self.sql("""UPDATE produit SET prix_marche = (
+                                 SELECT t.prix FROM tick_prix t WHERE t.produit_id = produit.id
+                                 ORDER BY t.rowid DESC LIMIT 1
+                             )
+                             WHERE id IN (SELECT produit_id FROM tick_prix)"""), (), False),
+            ]
+            return statements
+
+        if prix is None:
+            source, params_source = (f"SELECT id, {self._ts()}, 10 + random() * 90 FROM produit", (ts,))
+        else:
+            source, params_source = (f"SELECT p.produit_id, {self._ts()}, p.prix "
+                                     f"FROM unnest(CAST(%s AS VARCHAR[]), CAST(%s AS DOUBLE PRECISION[])) "
+                                     f"AS p (produit_id, prix)",
+                                     (ts, [p for p, _ in prix], [v for _, v in prix]))
+        # Une requête : les agrégats et le dernier prix lisent les lignes renvoyées par l'insertion
+        statements.append((self.sql(
+            f"""WITH tick AS (
+                    INSERT INTO prix_historique (produit_id, ts, prix) {source}
+                    RETURNING produit_id, ts, prix
+                ), cumul AS (
+                    {cumul.format(source='tick')}
+                )
+                UPDATE produit SET prix_marche = t.prix FROM tick t WHERE produit.id = t.produit_id"""),
+            params_source + params_periodes, False))
+        return statements
+
+    def enregistrer_tick(self, conn, ts: Optional[datetime] = None,
+                         prix: Optional[Sequence[Tuple[str, float]]] = None) -> datetime:
+        """
+        Exécute un tick sur une connexion DB-API ; la validation revient à l'appelant
+        """
+        ts = ts or datetime.now()
+        cur = conn.cursor()
+        for query, params, many in self.tick(ts, prix):
+            if many:
+                cur.executemany(query, params)
+            else:
+                cur.execute(query, params)
+        cur.close()
+        return ts
+
+    def creer_schema(self, conn):
+        cur = conn.cursor()
+        for query in self.schema():
+            cur.execute(query)
+        cur.close()
+
+    # ------------------------------------------------------------------
+    # Lecture
+    # ------------------------------------------------------------------
+    def requete(self, produit_id: str, debut: datetime, fin: datetime, pas: Optional[float] = None,
+                points: int = POINTS_PAR_DEFAUT) -> Tuple[str, str, tuple]:
+        """
+        (résolution, sql, paramètres) pour la série de `produit_id` entre `debut` et `fin`.
+        Sans `pas` explicite, il est déduit du nombre de points souhaité.
+        """
+        if pas is None:
+            pas = (fin - debut).total_seconds() / max(points, 1)
+        resolution = choisir_resolution(pas)
+        if resolution == BRUT:
+            return resolution, self.sql(
+                "SELECT ts, prix, prix, prix, prix FROM prix_historique "
+                "WHERE produit_id = %s AND ts >= %s AND ts <= %s ORDER BY ts"), (produit_id, debut, fin)
+        tronquer = next(t for nom, _, t in RESOLUTIONS if nom == resolution)
+        return resolution, self.sql(
+            "SELECT periode, ouverture, haut, bas, cloture FROM prix_ohlc "
+            "WHERE resolution = %s AND produit_id = %s AND periode >= %s AND periode <= %s ORDER BY periode"
+        ), (resolution, produit_id, tronquer(debut), fin)
+
+    @staticmethod
+    def serie(resolution: str, rows) -> Dict:
+        return {
+            'resolution': resolution,
+            'points': [
+                {'periode': _datetime(periode).isoformat(), 'ouverture': ouverture, 'haut': haut,
+                 'bas': bas, 'cloture': cloture}
+                for periode, ouverture, haut, bas, cloture in rows
+            ]
+        }
+
+    def historique(self, conn, produit_id: str, debut: datetime, fin: datetime, pas: Optional[float] = None,
+                   points: int = POINTS_PAR_DEFAUT) -> Dict:
+        resolution, query, params = self.requete(produit_id, debut, fin, pas, points)
+        cur = conn.cursor()
+        cur.execute(query, params)
+        rows = cur.fetchall()
+        cur.close()
+        return self.serie(resolution, rows)
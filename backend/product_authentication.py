@@ -0,0 +1,172 @@
+"""
+Authentification publique des produits (scan de QR code par les consommateurs).
+
+Résout un hash de bloc ou un identifiant de produit vers l'enregistrement
+sécurisé et son statut dans la chaîne. Le chemin de lecture n'utilise que
+l'index hash -> bloc (filtre de Bloom, O(1)) et, pour un identifiant, une
+requête SQL directe sur une connexion du pool : ni session SQLAlchemy, ni
+écriture. Les réponses sérialisées (y compris les hash inconnus) sont mises
+en cache en mémoire avec leur ETag, si bien qu'un pic de scans sur les mêmes
+produits ne coûte qu'une recherche dans un dictionnaire. Les blocs écrits par
+d'autres processus sont relus au plus une fois par REFRESH_INTERVAL.
+
+Un identifiant n'est résolu que si la table produit porte la colonne
+data_hash (schéma du tableau de bord) ; avec le schéma de l'API, où les
+produits viennent du contrat, seul le hash scanné est reconnu.
+"""
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import NoSuchTableError, SQLAlchemyError
+
+HASH_PATTERN = re.compile(r'^[0-9a-fA-F]{64}$')
+
+# Durées de cache (secondes) : un hash inconnu peut apparaître au prochain bloc
+FOUND_MAX_AGE = 300
+NOT_FOUND_MAX_AGE = 10
+# Intervalle minimal (secondes) entre deux relectures du stockage, toutes clés confondues
+REFRESH_INTERVAL = 1.0
+
+
+class CachedResponse:
+    __slots__ = ('body', 'etag', 'status', 'max_age', 'expires')
+
+    def __init__(self, payload: dict, status: int, max_age: int):
+        self.body = json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode()
+        self.etag = '"%s"' % hashlib.sha256(self.body).hexdigest()[:32]
+        self.status = status
+        self.max_age = max_age
+        self.expires = time.monotonic() + max_age
+
+
+class ProductAuthenticator:
+    """
+    Service en lecture seule partagé par les requêtes du blueprint app.api.
+    """
+    def __init__(self, data_security, engine=None, max_entries: int = 100000,
+                 refresh_interval: float = REFRESH_INTERVAL):
+        self.data_security = data_security
+        self.engine = engine
+        self.max_entries = max_entries
+        self.refresh_interval = refresh_interval
+        self._cache: "OrderedDict[str, CachedResponse]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._last_refresh = None
+        self._has_hash_column = None
+        self.hits = 0
+        self.misses = 0
+
+    def _cache_get(self, key: str) -> Optional[CachedResponse]:
+        entry = self._cache.get(key)
+        if entry is None or entry.expires < time.monotonic():
+            return None
+        return entry
+
+    def _cache_put(self, key: str, entry: CachedResponse):
+        with self._lock:
+            self._cache[key] = entry
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+
+    def _hash_for_product(self, produit_id: str) -> Optional[str]:
+        if self.engine is None:
+            return None
+        if self._has_hash_column is None:
+            try:
+                columns = inspect(self.engine).get_columns('produit')
+            except NoSuchTableError:
+                columns = []
+            self._has_hash_column = any(column['name'] == 'data_hash' for column in columns)
+        if not self._has_hash_column:
+            return None
+        with self.engine.connect() as conn:
+            return conn.execute(
+                text("SELECT data_hash FROM produit WHERE id = :id"), {"id": produit_id}
+            ).scalar()
+
+    def _refresh_due(self) -> bool:
+        # Une relecture du stockage au plus par intervalle : une rafale de hash inconnus
+        # ne relit pas les segments à chaque requête
+        now = time.monotonic()
+        with self._lock:
+            if self._last_refresh is not None and now - self._last_refresh < self.refresh_interval:
+                return False
+            self._last_refresh = now
+            return True
+
+    def _locate(self, data_hash: Optional[str]):
+        if not data_hash:
+            return None, None
+        blockchain, position = self.data_security.locate(data_hash, refresh=False)
+        if blockchain is None and self._refresh_due():
+            blockchain, position = self.data_security.locate(data_hash)
+        return blockchain, position
+
+    def _build(self, data_hash: Optional[str], produit_id: Optional[str]) -> CachedResponse:
+        blockchain, position = self._locate(data_hash)
+        if blockchain is None:
+            return CachedResponse({
+                'authentique': False,
+                'hash': data_hash,
+                'produit_id': produit_id,
+                'message': "Aucun enregistrement correspondant dans la blockchain"
+            }, 404, NOT_FOUND_MAX_AGE)
+
+        block = blockchain.chain[position]
+        validator = blockchain.validator
+        if validator.verified_height < position:
+            validator.reload_checkpoint()
+        return CachedResponse({
+            'authentique': True,
+            'hash': block.hash,
+            'produit_id': produit_id,
+            'enregistrement': block.data,
+            'bloc': {
+                'index': block.index,
+                'timestamp': block.timestamp,
+                'previous_hash': block.previous_hash
+            },
+            # Statut à l'émission de la réponse : la chaîne ne fait que s'allonger
+            'chaine': {
+                'hauteur': len(blockchain.chain) - 1,
+                'valide_jusqu_a': validator.verified_height,
+                'bloc_valide': position <= validator.verified_height
+            }
+        }, 200, FOUND_MAX_AGE)
+
+    def lookup(self, identifiant: str) -> CachedResponse:
+        """
+        Résout un hash de bloc (64 caractères hexadécimaux) ou un identifiant de produit
+        """
+        key = identifiant.lower() if HASH_PATTERN.match(identifiant) else f"produit:{identifiant}"
+        entry = self._cache_get(key)
+        if entry is not None:
+            self.hits += 1
+            return entry
+
+        self.misses += 1
+        if key.startswith('produit:'):
+            try:
+                data_hash = self._hash_for_product(identifiant)
+            except SQLAlchemyError:
+                # Base indisponible : réponse non mise en cache
+                return CachedResponse({
+                    'authentique': None,
+                    'produit_id': identifiant,
+                    'message': "Service temporairement indisponible"
+                }, 503, 0)
+            entry = self._build(data_hash, identifiant)
+        else:
+            entry = self._build(key, None)
+        self._cache_put(key, entry)
+        return entry
+
+    def stats(self) -> Dict[str, int]:
+        return {'hits': self.hits, 'misses': self.misses, 'entries': len(self._cache)}
@@ -0,0 +1,264 @@
+"""
+Preuves compactes vérifiables hors ligne pour les QR codes.
+
+Une preuve atteste, par une signature, le hash et la position d'un bloc
+ainsi que la tête de chaîne au moment de l'émission. Les données elles-mêmes
+n'y figurent que sur demande explicite (include_payload=True) : un QR code
+est public, et un producteur y exposerait son adresse, son téléphone et son
+e-mail. Dans ce cas seulement, la preuve porte aussi le digest des données
+et l'en-tête du bloc, d'où le vérificateur recalcule le hash (selon la
+version du bloc). Elle est encodée en binaire compact puis en base45
+(RFC 9285), dont l'alphabet correspond au mode alphanumérique des QR codes.
+
+Signature Ed25519 si le paquet `cryptography` est installé (les inspecteurs
+n'ont besoin que de la clé publique), sinon HMAC-SHA256 avec une clé partagée.
+"""
+import hashlib
+import hmac
+import json
+import struct
+from typing import Dict, Iterable, List, Optional
+
+try:
+    from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey, Ed25519PublicKey
+    from cryptography.exceptions import InvalidSignature
+except ImportError:
+    Ed25519PrivateKey = None
+
+from blockchain import BLOCK_HEADER
+
+PROOF_PREFIX = 'TAM1:'
+PROOF_VERSION = 2
+FLAG_PAYLOAD = 0x01
+FLAG_ED25519 = 0x02
+
+BASE45_ALPHABET = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ $%*+-./:'
+_BASE45_VALUES = {c: i for i, c in enumerate(BASE45_ALPHABET)}
+
+
+# ----------------------------------------------------------------------
+# Base45 (RFC 9285)
+# ----------------------------------------------------------------------
+def b45encode(data: bytes) -> str:
+    out = []
+    for i in range(0, len(data) - 1, 2):
+        n = data[i] * 256 + data[i + 1]
+        c, n = divmod(n, 45 * 45)
+        b, a = divmod(n, 45)
+        out.append(BASE45_ALPHABET[a] + BASE45_ALPHABET[b] + BASE45_ALPHABET[c])
+    if len(data) % 2:
+        b, a = divmod(data[-1], 45)
+        out.append(BASE45_ALPHABET[a] + BASE45_ALPHABET[b])
+    return ''.join(out)
+
+
+def b45decode(text: str) -> bytes:
+    try:
+        values = [_BASE45_VALUES[c] for c in text]
+    except KeyError:
+        raise ValueError("Caractère base45 invalide")
+    out = bytearray()
+    for i in range(0, len(values), 3):
+        chunk = values[i:i + 3]
+        if len(chunk) == 3:
+            n = chunk[0] + chunk[1] * 45 + chunk[2] * 45 * 45
+            if n > 0xFFFF:
+                raise ValueError("Bloc base45 invalide")
+            out.extend(divmod(n, 256))
+        elif len(chunk) == 2:
+            n = chunk[0] + chunk[1] * 45
+            if n > 0xFF:
+                raise ValueError("Bloc base45 invalide")
+            out.append(n)
+        else:
+            raise ValueError("Longueur base45 invalide")
+    return bytes(out)
+
+
+# ----------------------------------------------------------------------
+# Encodage binaire (entiers variables à la CBOR/LEB128)
+# ----------------------------------------------------------------------
+def _write_varint(out: bytearray, value: int):
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return
+
+
+def _read_varint(data: bytes, offset: int):
+    value = shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return value, offset
+        shift += 7
+
+
+def _hex32(value: str) -> bytes:
+    return bytes.fromhex(value.rjust(64, '0'))
+
+
+def _block_hash(version: int, index: int, timestamp: float, previous: bytes, payload: bytes) -> str:
+    # Même calcul que Block.calculate_hash, pour chaque version de bloc
+    if version == 1:
+        return hashlib.sha256(json.dumps({
+            "index": index,
+            "timestamp": timestamp,
+            "data": json.loads(payload),
+            # Le bloc de genèse des chaînes version 1 a pour précédent "0"
+            "previous_hash": previous.hex() if index else "0"
+        }, sort_keys=True).encode()).hexdigest()
+    return hashlib.sha256(BLOCK_HEADER.pack(version, index, timestamp, previous, len(payload)) + payload).hexdigest()
+
+
+def signing_key_from_secret(secret: str):
+    """
+    Dérive la clé de signature à partir d'un secret (ex. Config.SECRET_KEY)
+    """
+    seed = hashlib.sha256(f"qr-proof:{secret}".encode()).digest()
+    if Ed25519PrivateKey is not None:
+        return Ed25519PrivateKey.from_private_bytes(seed)
+    return seed
+
+
+def verification_key(signing_key):
+    """
+    Clé à distribuer aux inspecteurs : clé publique Ed25519, ou secret HMAC
+    """
+    if Ed25519PrivateKey is not None and isinstance(signing_key, Ed25519PrivateKey):
+        return signing_key.public_key()
+    return signing_key
+
+
+class ProofIssuer:
+    """
+    Émet les preuves pour les blocs de la chaîne (côté serveur).
+    """
+    def __init__(self, data_security, signing_key, key_id: int = 0, include_payload: bool = False):
+        if not 0 <= key_id <= 0xFF:
+            raise ValueError(f"Identifiant de clé hors de l'intervalle 0-255 : {key_id}")
+        self.data_security = data_security
+        self.signing_key = signing_key
+        self.key_id = key_id
+        self.include_payload = include_payload
+
+    def issue(self, data_hash: str) -> Optional[str]:
+        """
+        Retourne la preuve (texte pour QR code) du bloc `data_hash`, ou None s'il est inconnu
+        """
+        blockchain, position = self.data_security.locate(data_hash)
+        if blockchain is None:
+            return None
+        block = blockchain.chain[position]
+        tip = blockchain.get_latest_block()
+
+        ed25519 = Ed25519PrivateKey is not None and isinstance(self.signing_key, Ed25519PrivateKey)
+        flags = (FLAG_PAYLOAD if self.include_payload else 0) | (FLAG_ED25519 if ed25519 else 0)
+        out = bytearray(struct.pack('<BBB', PROOF_VERSION, flags, self.key_id))
+        _write_varint(out, block.index)
+        if self.include_payload:
+            # De quoi recalculer le hash du bloc à partir des données
+            out += hashlib.sha256(block.payload).digest()
+            out += struct.pack('<Bd', block.version, block.timestamp)
+            out += _hex32(block.previous_hash)
+            _write_varint(out, len(block.payload))
+            out += block.payload
+        else:
+            out += _hex32(block.hash)
+        _write_varint(out, tip.index)
+        out += _hex32(tip.hash)
+
+        if ed25519:
+            out += self.signing_key.sign(bytes(out))
+        else:
+            out += hmac.new(self.signing_key, bytes(out), hashlib.sha256).digest()
+        return PROOF_PREFIX + b45encode(bytes(out))
+
+
+class ProofVerifier:
+    """
+    Vérifie les preuves hors ligne, sans accès à la chaîne ni au serveur.
+    `keys` associe un identifiant de clé à une clé publique Ed25519 ou à un secret HMAC.
+    """
+    def __init__(self, keys: Dict[int, object]):
+        self.keys = keys
+
+    def _check_signature(self, key, ed25519: bool, message: bytes, signature: bytes) -> bool:
+        if ed25519:
+            if Ed25519PrivateKey is None or not isinstance(key, Ed25519PublicKey):
+                return False
+            try:
+                key.verify(signature, message)
+                return True
+            except InvalidSignature:
+                return False
+        if not isinstance(key, bytes):
+            return False
+        return hmac.compare_digest(hmac.new(key, message, hashlib.sha256).digest(), signature)
+
+    def verify(self, proof: str) -> Dict:
+        """
+        Retourne {'valid': bool, 'reason': ...} et, si la preuve est valide,
+        le bloc attesté, la tête de chaîne et les données éventuelles.
+        """
+        if not proof.startswith(PROOF_PREFIX):
+            return {'valid': False, 'reason': 'format'}
+        try:
+            raw = b45decode(proof[len(PROOF_PREFIX):])
+            version, flags, key_id = struct.unpack_from('<BBB', raw, 0)
+            if version != PROOF_VERSION:
+                return {'valid': False, 'reason': 'version'}
+            index, offset = _read_varint(raw, 3)
+            record_digest = payload = None
+            if flags & FLAG_PAYLOAD:
+                record_digest = raw[offset:offset + 32]
+                offset += 32
+                block_version, timestamp = struct.unpack_from('<Bd', raw, offset)
+                offset += 9
+                previous = raw[offset:offset + 32]
+                offset += 32
+                length, offset = _read_varint(raw, offset)
+                payload = raw[offset:offset + length]
+                offset += length
+                if len(payload) != length or len(previous) != 32:
+                    raise ValueError("Données tronquées")
+                block_hash = _block_hash(block_version, index, timestamp, previous, payload)
+            else:
+                block_hash = raw[offset:offset + 32].hex()
+                offset += 32
+            tip_height, offset = _read_varint(raw, offset)
+            tip_hash = raw[offset:offset + 32]
+            offset += 32
+            message, signature = raw[:offset], raw[offset:]
+        except (ValueError, IndexError, struct.error):
+            return {'valid': False, 'reason': 'format'}
+
+        key = self.keys.get(key_id)
+        if key is None:
+            return {'valid': False, 'reason': 'cle_inconnue'}
+        if not self._check_signature(key, bool(flags & FLAG_ED25519), message, signature):
+            return {'valid': False, 'reason': 'signature'}
+        if payload is not None and hashlib.sha256(payload).digest() != record_digest:
+            return {'valid': False, 'reason': 'digest'}
+        if tip_height < index:
+            return {'valid': False, 'reason': 'tete_de_chaine'}
+
+        return {
+            'valid': True,
+            'reason': None,
+            'block_index': index,
+            'block_hash': block_hash,
+            'record_digest': record_digest.hex() if record_digest is not None else None,
+            'tip_height': tip_height,
+            'tip_hash': tip_hash.hex(),
+            'payload': payload.decode() if payload is not None else None
+        }
+
+    def verify_many(self, proofs: Iterable[str]) -> List[Dict]:
+        return [self.verify(proof) for proof in proofs]
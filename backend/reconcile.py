@@ -0,0 +1,142 @@
+"""
+Réconciliation base de données <-> blockchain.
+
+Vérifie en masse que les data_hash des tables producteur et produit existent
+dans la chaîne : lignes orphelines, blocs non référencés et doublons.
+Les hash sont traités par lots avec des opérations ensemblistes numpy
+(recherche dichotomique vectorisée), sans boucle par ligne.
+
+Usage :
+    python reconcile.py [--storage blockchain_data] [--chunk-size 100000]
+"""
+import argparse
+import glob
+import json
+import os
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine
+
+from config import Config
+from chain_index import DIGEST_SIZE
+
+RECONCILED_TABLES = ('producteur', 'produit')
+_HEX_DIGITS = np.frombuffer(b'0123456789abcdef', dtype='S1')
+
+
+def digests_to_hex(raw: bytes) -> np.ndarray:
+    """
+    Convertit une suite de digests de 32 octets en tableau de hash hexadécimaux (S64)
+    """
+    octets = np.frombuffer(raw, dtype=np.uint8).reshape(-1, DIGEST_SIZE)
+    hex_chars = np.empty((octets.shape[0], DIGEST_SIZE * 2), dtype='S1')
+    hex_chars[:, 0::2] = _HEX_DIGITS[octets >> 4]
+    hex_chars[:, 1::2] = _HEX_DIGITS[octets & 0x0F]
+    return hex_chars.view('S64').ravel()
+
+
+def load_chain_hashes(storage_path: Optional[str] = None, data_security=None) -> np.ndarray:
+    """
+    Charge les hash de tous les blocs (hors genèse) : depuis les fichiers
+    index/hashes.bin du stockage, sans verrou, ou depuis une instance en mémoire.
+    En mode shardé, les hash de toutes les sous-chaînes sont concaténés.
+    """
+    if data_security is not None:
+        shards = getattr(data_security, 'shards', None)
+        instances = list(shards.values()) if shards else [data_security]
+        hashes = [block.hash.encode() for ds in instances for block in ds.blockchain.chain[1:]]
+        return np.array(hashes, dtype='S64')
+
+    paths = [os.path.join(storage_path, 'index', 'hashes.bin')]
+    paths += sorted(glob.glob(os.path.join(storage_path, 'shards', '*', 'index', 'hashes.bin')))
+    arrays = []
+    for path in paths:
+        if not os.path.exists(path):
+            continue
+        with open(path, 'rb') as f:
+            raw = f.read()
+        raw = raw[DIGEST_SIZE:len(raw) - len(raw) % DIGEST_SIZE]  # exclure le bloc de genèse
+        arrays.append(digests_to_hex(raw))
+    return np.concatenate(arrays) if arrays else np.array([], dtype='S64')
+
+
+def _contains(sorted_hashes: np.ndarray, values: np.ndarray) -> np.ndarray:
+    if len(sorted_hashes) == 0:
+        return np.zeros(len(values), dtype=bool)
+    positions = np.searchsorted(sorted_hashes, values)
+    positions[positions == len(sorted_hashes)] = 0
+    return sorted_hashes[positions] == values
+
+
+def reconcile(engine, storage_path: Optional[str] = None, data_security=None,
+              chunk_size: int = 100000, sample_size: int = 100) -> Dict:
+    """
+    Compare les data_hash des tables avec les blocs de la chaîne.
+    Retourne les totaux et un échantillon de chaque anomalie.
+    """
+    started = time.perf_counter()
+    chain_hashes = np.sort(load_chain_hashes(storage_path, data_security))
+    referenced = []
+    rows_checked = 0
+    missing_hash = 0
+    orphaned_count = 0
+    orphaned_sample: List[Dict] = []
+
+    for table in RECONCILED_TABLES:
+        query = f"SELECT id, data_hash FROM {table}"
+        for chunk in pd.read_sql(query, engine, chunksize=chunk_size):
+            rows_checked += len(chunk)
+            present = chunk['data_hash'].notna().to_numpy()
+            missing_hash += int((~present).sum())
+            chunk = chunk[present]
+            values = chunk['data_hash'].str.lower().to_numpy(dtype='S64')
+            referenced.append(values)
+
+            orphaned = ~_contains(chain_hashes, values)
+            orphaned_count += int(orphaned.sum())
+            if orphaned.any() and len(orphaned_sample) < sample_size:
+                for row_id, data_hash in chunk[orphaned][['id', 'data_hash']].head(sample_size - len(orphaned_sample)).itertuples(index=False):
+                    orphaned_sample.append({'table': table, 'id': row_id, 'data_hash': data_hash})
+
+    referenced = np.concatenate(referenced) if referenced else np.array([], dtype='S64')
+    unique_hashes, counts = np.unique(referenced, return_counts=True)
+    duplicated = unique_hashes[counts > 1]
+
+    unreferenced = chain_hashes[~_contains(unique_hashes, chain_hashes)]
+    elapsed = time.perf_counter() - started
+    return {
+        'rows_checked': rows_checked,
+        'chain_blocks': int(len(chain_hashes)),
+        'rows_without_hash': missing_hash,
+        'orphaned_rows': orphaned_count,
+        'orphaned_sample': orphaned_sample,
+        'unreferenced_blocks': int(len(unreferenced)),
+        'unreferenced_sample': [h.decode() for h in unreferenced[:sample_size]],
+        'duplicated_hashes': int(len(duplicated)),
+        'duplicated_sample': [
+            {'data_hash': h.decode(), 'rows': int(c)}
+            for h, c in zip(duplicated[:sample_size], counts[counts > 1][:sample_size])
+        ],
+        'elapsed': elapsed,
+        'rows_per_second': rows_checked / elapsed if elapsed > 0 else float(rows_checked)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Réconciliation base de données / blockchain")
+    parser.add_argument('--database', default=Config.SQLALCHEMY_DATABASE_URI)
+    parser.add_argument('--storage', default=Config.BLOCKCHAIN_STORAGE_PATH)
+    parser.add_argument('--chunk-size', type=int, default=100000)
+    parser.add_argument('--sample-size', type=int, default=20)
+    args = parser.parse_args()
+
+    rapport = reconcile(create_engine(args.database), args.storage,
+                        chunk_size=args.chunk_size, sample_size=args.sample_size)
+    print(json.dumps(rapport, indent=2, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
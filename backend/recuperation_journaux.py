@@ -0,0 +1,147 @@
+"""
+Récupération des journaux (eth_getLogs) par plages de blocs parallèles.
+
+Une seule requête sur tout l'historique finit par dépasser les limites du
+nœud (nombre de résultats, taille de réponse, délai). La plage demandée est
+donc découpée en fenêtres de blocs, récupérées en parallèle par un pool de
+threads :
+
+- une fenêtre refusée pour « trop de résultats » est coupée en deux et
+  redemandée, et la taille des fenêtres suivantes est réduite d'autant ;
+- une fenêtre qui renvoie peu de journaux fait grandir les suivantes, dans
+  la limite de `fenetre_max` ;
+- les journaux sont fusionnés dans l'ordre de la chaîne (bloc, indice du
+  log) avant d'être rendus à l'appelant.
+
+La taille de fenêtre apprise est gardée par l'instance d'une exécution à
+l'autre.
+
+    recuperateur = RecuperateurJournaux(workers=4)
+    get_logs = lambda debut, fin: web3.eth.get_logs({**filtre, 'fromBlock': debut, 'toBlock': fin})
+    logs = recuperateur.recuperer(get_logs, 0, web3.eth.block_number)
+"""
+import threading
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict, List
+
+import requests
+
+# Messages renvoyés par les nœuds courants quand une plage contient trop de journaux
+# (geth, Erigon, Infura, Alchemy, QuickNode, Ganache/Hardhat...)
+MESSAGES_TROP_DE_RESULTATS = (
+    'more than',
+    'too many',
+    'limit exceeded',
+    'response size',
+    'block range',
+    'range is too large',
+    'query timeout',
+    'exceeds',
+)
+CODES_TROP_DE_RESULTATS = (-32005,)
+
+
+def trop_de_resultats(erreur: Exception) -> bool:
+    """
+    Vrai si l'erreur indique qu'une plage plus petite aboutirait
+    """
+    if isinstance(erreur, requests.exceptions.Timeout):
+        # Réponse trop longue à produire : même remède qu'une limite explicite
+        return True
+    details = erreur.args[0] if erreur.args else None
+    if isinstance(details, dict):
+        if details.get('code') in CODES_TROP_DE_RESULTATS:
+            return True
+        message = str(details.get('message', ''))
+    else:
+        message = str(erreur)
+    message = message.lower()
+    return any(fragment in message for fragment in MESSAGES_TROP_DE_RESULTATS)
+
+
+def _entier(value) -> int:
+    return int(value, 16) if isinstance(value, str) else int(value)
+
+
+def ordre_chaine(log: Dict):
+    return _entier(log['blockNumber']), _entier(log.get('logIndex', 0))
+
+
+class RecuperateurJournaux:
+    def __init__(self, fenetre: int = 2000, workers: int = 4, fenetre_min: int = 1,
+                 fenetre_max: int = 100000, cible: int = 5000):
+        """
+        `fenetre` : blocs par requête au départ ; `cible` : nombre de journaux
+        par réponse en dessous duquel la fenêtre peut grandir.
+        """
+        if not 1 <= fenetre_min <= fenetre_max:
+            raise ValueError("Il faut 1 <= fenetre_min <= fenetre_max")
+        self.fenetre = min(max(fenetre, fenetre_min), fenetre_max)
+        self.workers = max(workers, 1)
+        self.fenetre_min = fenetre_min
+        self.fenetre_max = fenetre_max
+        self.cible = cible
+        self._lock = threading.Lock()
+
+        self.requetes = 0
+        self.reductions = 0
+
+    def _reduire(self, taille: int):
+        with self._lock:
+            self.reductions += 1
+            self.fenetre = max(self.fenetre_min, min(self.fenetre, taille // 2))
+
+    def _ajuster(self, taille: int, n_logs: int):
+        with self._lock:
+            self.requetes += 1
+            # Seule une fenêtre pleine renseigne sur la marge : les fins de plage plus courtes sont ignorées
+            if taille >= self.fenetre and n_logs <= self.cible // 2:
+                self.fenetre = min(self.fenetre_max, self.fenetre * 2)
+
+    def recuperer(self, get_logs: Callable[[int, int], List[Dict]], depuis: int, jusqua: int) -> List[Dict]:
+        """
+        Journaux des blocs `depuis` à `jusqua` (inclus), dans l'ordre de la chaîne.
+        `get_logs(debut, fin)` interroge le nœud sur une plage ; il est appelé
+        depuis plusieurs threads à la fois.
+        """
+        if depuis > jusqua:
+            return []
+        logs = []
+        a_refaire = deque()
+        prochain = depuis
+        en_cours = {}
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='eth_getLogs') as pool:
+            while en_cours or a_refaire or prochain <= jusqua:
+                # Les fenêtres suivantes sont taillées au dernier moment, avec la taille apprise jusque-là
+                while len(en_cours) < self.workers and (a_refaire or prochain <= jusqua):
+                    if a_refaire:
+                        debut, fin = a_refaire.popleft()
+                    else:
+                        debut, fin = prochain, min(jusqua, prochain + self.fenetre - 1)
+                        prochain = fin + 1
+                    en_cours[pool.submit(get_logs, debut, fin)] = (debut, fin)
+
+                termines, _ = wait(en_cours, return_when=FIRST_COMPLETED)
+                for future in termines:
+                    debut, fin = en_cours.pop(future)
+                    try:
+                        resultat = future.result()
+                    except Exception as erreur:
+                        if debut == fin or not trop_de_resultats(erreur):
+                            # Un bloc seul ne se découpe plus : l'erreur remonte
+                            for autre in en_cours:
+                                autre.cancel()
+                            raise
+                        milieu = (debut + fin) // 2
+                        a_refaire.extend([(debut, milieu), (milieu + 1, fin)])
+                        self._reduire(fin - debut + 1)
+                        continue
+                    self._ajuster(fin - debut + 1, len(resultat))
+                    logs.extend(resultat)
+        logs.sort(key=ordre_chaine)
+        return logs
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {'fenetre': self.fenetre, 'requetes': self.requetes, 'reductions': self.reductions}
@@ -0,0 +1,231 @@
+"""
+Reconstruction des tables producteur / produit par rejeu de la blockchain.
+
+Chaque bloc sécurisé contient l'enregistrement complet (type, nom, région...).
+Les plages de blocs sont décodées en parallèle par des processus de travail,
+puis chargées par insertions groupées dans l'ordre de la chaîne : les
+producteurs d'une plage sont insérés avant ses produits, si bien qu'un produit
+ne référence jamais un producteur absent.
+
+Le rejeu est idempotent : une ligne dont le hash est déjà en base est ignorée,
+et un producteur ou un produit garde l'identifiant inscrit dans son bloc.
+
+Usage :
+    python replay.py --storage blockchain_data --database sqlite:///restauration.db --truncate
+"""
+import argparse
+import glob
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import create_engine, select
+
+from config import Config
+from init_db import Base, Producteur, Produit
+
+PRODUCTEUR_COLUMNS = ('nom', 'region', 'adresse', 'telephone', 'email')
+PRODUIT_COLUMNS = ('nom', 'region', 'qualite_score', 'est_bio', 'producteur_id')
+
+
+def _rows_from_block(block) -> List[Tuple[str, float, Dict]]:
+    from blockchain import MERKLE_BATCH_TYPE
+    from merkle import record_hash
+
+    data = block.data
+    if data.get("type") == MERKLE_BATCH_TYPE:
+        # Enregistrements d'un lot : le hash de la feuille identifie chaque ligne
+        records = [(record, record_hash(record)) for record in data.get("records", [])]
+    else:
+        records = [(data, block.hash)]
+
+    rows = []
+    for record, data_hash in records:
+        kind = record.get("type")
+        if kind == "producteur":
+            row = {column: record.get(column) for column in PRODUCTEUR_COLUMNS}
+        elif kind == "produit":
+            row = {column: record.get(column) for column in PRODUIT_COLUMNS}
+            row["est_bio"] = bool(row["est_bio"])
+        else:
+            continue
+        # Identifiant d'origine, absent des blocs écrits avant qu'il y soit inscrit
+        row["id"] = record.get("id")
+        row["data_hash"] = data_hash
+        rows.append((kind, block.timestamp, row))
+    return rows
+
+
+def _decode_range(path: str, start: int, stop: int, kinds: Tuple[str, ...]):
+    # Exécuté dans un processus de travail : lecture seule du stockage
+    from blockchain import Block
+    from chain_store import SegmentStore
+
+    store = SegmentStore(path, read_only=True)
+    try:
+        rows = []
+        for record in store.iter_range(start, stop):
+            rows.extend(r for r in _rows_from_block(Block.from_dict(record)) if r[0] in kinds)
+        return rows
+    finally:
+        store.close()
+
+
+def chain_sources(storage_path: str) -> List[str]:
+    """
+    Chaînes à rejouer : le stockage lui-même, ou chaque sous-chaîne en mode shardé
+    """
+    shards = sorted(glob.glob(os.path.join(storage_path, 'shards', '*')))
+    return shards or [storage_path]
+
+
+def _iter_decoded(executor, path: str, workers: int, chunk_size: int, kinds: Tuple[str, ...]):
+    """
+    Décode les plages en parallèle et les restitue dans l'ordre de la chaîne,
+    avec au plus 2 * workers plages en vol.
+    """
+    from chain_store import SegmentStore
+
+    store = SegmentStore(path, read_only=True)
+    length = len(store)
+    store.close()
+
+    ranges = [(start, min(start + chunk_size, length)) for start in range(1, length, chunk_size)]
+    in_flight = []
+    for start, stop in ranges:
+        in_flight.append(executor.submit(_decode_range, path, start, stop, kinds))
+        if len(in_flight) >= 2 * workers:
+            yield in_flight.pop(0).result()
+    for future in in_flight:
+        yield future.result()
+
+
+def _lookup(conn, key, columns, values, chunk_size: int = 1000) -> List:
+    """
+    Lignes dont la colonne `key` prend une des valeurs données, par paquets
+    """
+    rows = []
+    for start in range(0, len(values), chunk_size):
+        rows.extend(conn.execute(select(*columns).where(key.in_(values[start:start + chunk_size]))))
+    return rows
+
+
+def rebuild_database(engine, storage_path: str, workers: Optional[int] = None,
+                     chunk_size: int = 20000, insert_batch: int = 10000,
+                     truncate: bool = False, producteur_id_offset: int = 0,
+                     produit_id_offset: int = 0) -> Dict:
+    """
+    Rejoue la chaîne dans les tables producteur / produit.
+
+    Un producteur ou un produit reprend l'identifiant inscrit dans son bloc.
+    Les blocs plus anciens, sans identifiant, reçoivent dans l'ordre de la
+    chaîne offset + 1, + 2... comme l'auto-incrément d'origine (les lignes
+    absentes de la chaîne, ex. données de démonstration, doivent être
+    comptées dans l'offset). Les produits conservent leur producteur_id.
+
+    Les lignes déjà présentes (même hash) sont ignorées ; une ligne déjà en
+    base sous le même identifiant avec un autre contenu lève ValueError.
+    """
+    started = time.perf_counter()
+    workers = workers or os.cpu_count() or 1
+    Base.metadata.create_all(engine)
+    if truncate:
+        with engine.begin() as conn:
+            conn.execute(Produit.__table__.delete())
+            conn.execute(Producteur.__table__.delete())
+
+    counts = {'producteur': 0, 'produit': 0, 'present': 0}
+    next_ids = {Producteur: producteur_id_offset + 1, Produit: produit_id_offset + 1}
+    replayed_ids = {Producteur: set(), Produit: set()}
+
+    def insert(conn, table, rows):
+        for i in range(0, len(rows), insert_batch):
+            conn.execute(table.insert(), rows[i:i + insert_batch])
+
+    def load(conn, model, rows):
+        by_id = {}
+        for row in rows:
+            if row['id'] is None:
+                row['id'] = next_ids[model]
+            next_ids[model] = max(next_ids[model], row['id'] + 1)
+            # Identifiant réutilisé après une insertion échouée : le dernier bloc l'emporte
+            by_id[row['id']] = row
+        rows = list(by_id.values())
+        known_hashes = {h for (h,) in _lookup(conn, model.data_hash, [model.data_hash],
+                                              [row['data_hash'] for row in rows])}
+        stored = dict(_lookup(conn, model.id, [model.id, model.data_hash], [row['id'] for row in rows]))
+        new_rows = []
+        for row in rows:
+            if row['data_hash'] in known_hashes:
+                counts['present'] += 1
+            elif row['id'] not in stored:
+                new_rows.append(row)
+            elif row['id'] in replayed_ids[model]:
+                conn.execute(model.__table__.update().where(model.id == row['id']).values(**row))
+            else:
+                raise ValueError(f"{model.__tablename__} {row['id']} existe déjà avec un autre contenu "
+                                 f"(rejouer avec --truncate ou --{model.__tablename__}-id-offset)")
+        insert(conn, model.__table__, new_rows)
+        replayed_ids[model].update(by_id)
+        counts[model.__tablename__] += len(new_rows)
+
+    def load_producteurs(conn, rows):
+        load(conn, Producteur, rows)
+
+    def load_produits(conn, rows):
+        load(conn, Produit, rows)
+
+    sources = chain_sources(storage_path)
+    with ProcessPoolExecutor(max_workers=workers) as executor, engine.begin() as conn:
+        if len(sources) == 1:
+            # Une seule chaîne : une passe, plage par plage, producteurs avant produits
+            for rows in _iter_decoded(executor, sources[0], workers, chunk_size, ('producteur', 'produit')):
+                load_producteurs(conn, [row for kind, _, row in rows if kind == 'producteur'])
+                load_produits(conn, [row for kind, _, row in rows if kind == 'produit'])
+        else:
+            # Sous-chaînes régionales : tous les producteurs (ordonnés par date) puis les produits
+            producteurs = []
+            for path in sources:
+                for rows in _iter_decoded(executor, path, workers, chunk_size, ('producteur',)):
+                    producteurs.extend((timestamp, row) for _, timestamp, row in rows)
+            producteurs.sort(key=lambda entry: entry[0])
+            load_producteurs(conn, [row for _, row in producteurs])
+
+            for path in sources:
+                for rows in _iter_decoded(executor, path, workers, chunk_size, ('produit',)):
+                    load_produits(conn, [row for _, _, row in rows])
+
+    elapsed = time.perf_counter() - started
+    total = counts['producteur'] + counts['produit'] + counts['present']
+    return {
+        'producteurs': counts['producteur'],
+        'produits': counts['produit'],
+        'deja_presents': counts['present'],
+        'elapsed': elapsed,
+        'rows_per_second': total / elapsed if elapsed > 0 else float(total)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reconstruction de la base par rejeu de la blockchain")
+    parser.add_argument('--storage', default=Config.BLOCKCHAIN_STORAGE_PATH)
+    parser.add_argument('--database', default=Config.SQLALCHEMY_DATABASE_URI)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--chunk-size', type=int, default=20000)
+    parser.add_argument('--truncate', action='store_true', help="Vider les tables avant le rejeu")
+    parser.add_argument('--producteur-id-offset', type=int, default=0)
+    parser.add_argument('--produit-id-offset', type=int, default=0)
+    args = parser.parse_args()
+
+    rapport = rebuild_database(create_engine(args.database), args.storage, args.workers,
+                               args.chunk_size, truncate=args.truncate,
+                               producteur_id_offset=args.producteur_id_offset,
+                               produit_id_offset=args.produit_id_offset)
+    print(f"{rapport['producteurs']} producteurs et {rapport['produits']} produits restaurés, "
+          f"{rapport['deja_presents']} déjà présents, "
+          f"en {rapport['elapsed']:.1f}s ({rapport['rows_per_second']:.0f} lignes/s)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,183 @@
+"""
+Appels de lecture (view) du contrat regroupés en requêtes JSON-RPC batch.
+
+Au lieu d'un aller-retour HTTP par `contract.functions.f(...).call()`, les
+appels sont encodés localement (sélecteur + arguments ABI), envoyés par
+paquets de `batch_size` dans un seul POST, puis décodés comme le ferait
+web3. La durée d'une synchronisation dépend alors du débit du nœud et non
+plus de la latence multipliée par le nombre d'appels.
+
+Pour un fournisseur sans endpoint HTTP (ex. EthereumTesterProvider), les
+appels passent un par un par web3.
+"""
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import requests
+from web3 import Web3
+
+try:
+    from eth_abi import encode as abi_encode, decode as abi_decode
+except ImportError:  # eth-abi < 4
+    from eth_abi import encode_abi as abi_encode, decode_abi as abi_decode
+
+
+class BatchCallError(Exception):
+    """Erreur retournée par le nœud pour un appel du paquet"""
+
+
+def _abi_type(entry: Dict) -> str:
+    # Les structures Solidity sont des tuples de leurs composants
+    if entry['type'].startswith('tuple'):
+        inner = ','.join(_abi_type(component) for component in entry['components'])
+        return f"({inner}){entry['type'][len('tuple'):]}"
+    return entry['type']
+
+
+class ContractFunction:
+    __slots__ = ('selector', 'inputs', 'outputs')
+
+    def __init__(self, abi_entry: Dict):
+        self.inputs = [_abi_type(i) for i in abi_entry.get('inputs', [])]
+        self.outputs = [_abi_type(o) for o in abi_entry.get('outputs', [])]
+        signature = f"{abi_entry['name']}({','.join(self.inputs)})"
+        self.selector = bytes(Web3.keccak(text=signature)[:4])
+
+    def encode(self, args: Sequence) -> str:
+        return '0x' + (self.selector + abi_encode(self.inputs, list(args))).hex()
+
+    def decode(self, result) -> Any:
+        if isinstance(result, str):
+            result = bytes.fromhex(result[2:] if result.startswith('0x') else result)
+        raw = bytes(result)
+        values = abi_decode(self.outputs, raw)
+        # Même convention que web3 : une seule sortie est retournée telle quelle
+        return values[0] if len(values) == 1 else tuple(values)
+
+
+class ContractEvent:
+    """
+    Décodage des journaux (logs) d'un événement, au format des entrées web3
+    """
+    def __init__(self, abi_entry: Dict):
+        self.name = abi_entry['name']
+        self.inputs = abi_entry.get('inputs', [])
+        signature = f"{self.name}({','.join(_abi_type(i) for i in self.inputs)})"
+        self.topic = '0x' + bytes(Web3.keccak(text=signature)).hex()
+        self._data_inputs = [i for i in self.inputs if not i.get('indexed')]
+
+    def decode(self, log: Dict) -> Dict:
+        data = log['data']
+        raw = _to_bytes(data)
+        values = dict(zip((i['name'] for i in self._data_inputs),
+                          abi_decode([_abi_type(i) for i in self._data_inputs], raw)))
+        topics = iter(log['topics'][1:])
+        args = {}
+        for entry in self.inputs:
+            # Un argument indexé de type dynamique n'est disponible que sous forme de hash
+            args[entry['name']] = next(topics) if entry.get('indexed') else values[entry['name']]
+        return {
+            'event': self.name,
+            'args': args,
+            'blockNumber': _to_int(log['blockNumber']),
+            'blockHash': log.get('blockHash'),
+            'transactionHash': log.get('transactionHash'),
+            'logIndex': _to_int(log.get('logIndex', 0)),
+            'removed': bool(log.get('removed', False))
+        }
+
+
+def _to_int(value) -> int:
+    return int(value, 16) if isinstance(value, str) else int(value)
+
+
+def _to_bytes(value) -> bytes:
+    # Journaux bruts JSON (chaînes hexadécimales) ou formatés par web3 (HexBytes)
+    if isinstance(value, str):
+        return bytes.fromhex(value[2:] if value.startswith('0x') else value)
+    return bytes(value)
+
+
+def log_topic(log: Dict) -> str:
+    """
+    Premier topic d'un journal (signature de l'événement), en hexadécimal
+    """
+    return '0x' + _to_bytes(log['topics'][0]).hex()
+
+
+def contract_functions(abi: List[Dict]) -> Dict[str, ContractFunction]:
+    return {entry['name']: ContractFunction(entry) for entry in abi if entry.get('type') == 'function'}
+
+
+def contract_events(abi: List[Dict]) -> Dict[str, ContractEvent]:
+    return {entry['name']: ContractEvent(entry) for entry in abi if entry.get('type') == 'event'}
+
+
+class BatchCaller:
+    """
+    Regroupe les appels view d'un contrat.
+
+        caller = BatchCaller(contract, batch_size=100)
+        produits = caller.call_many('obtenirProduit', [(pid,) for pid in ids])
+    """
+    def __init__(self, contract, batch_size: int = 100, endpoint_uri: Optional[str] = None,
+                 session: Optional[requests.Session] = None, timeout: float = 30):
+        self.contract = contract
+        self.address = contract.address
+        self.batch_size = batch_size
+        self.timeout = timeout
+        # web3 >= 6 expose `w3`, web3 5 `web3`
+        self.w3 = getattr(contract, 'w3', None) or contract.web3
+        self.endpoint_uri = endpoint_uri or getattr(self.w3.provider, 'endpoint_uri', None)
+        self.session = session or requests.Session()
+        self._functions = contract_functions(contract.abi)
+        self.requests_sent = 0
+        self.calls_made = 0
+
+    def _post(self, payload: List[Dict]) -> Dict[int, Dict]:
+        response = self.session.post(self.endpoint_uri, json=payload, timeout=self.timeout)
+        response.raise_for_status()
+        body = response.json()
+        if isinstance(body, dict):
+            # Certains nœuds répondent par une erreur unique à un batch refusé
+            raise BatchCallError(body.get('error', body))
+        return {item['id']: item for item in body}
+
+    def _send(self, requests_: List[Dict]) -> List[str]:
+        self.requests_sent += 1
+        if self.endpoint_uri:
+            replies = self._post(requests_)
+        else:
+            replies = {r['id']: {'result': self.w3.eth.call(*r['params'])} for r in requests_}
+
+        results = []
+        for request in requests_:
+            reply = replies.get(request['id'])
+            if reply is None:
+                raise BatchCallError(f"Réponse manquante pour l'appel {request['id']}")
+            if reply.get('error'):
+                raise BatchCallError(reply['error'])
+            results.append(reply['result'])
+        return results
+
+    def call_batch(self, calls: Iterable[Tuple[str, Sequence]]) -> List[Any]:
+        """
+        Exécute des appels hétérogènes [(nom_fonction, args), ...] et retourne
+        leurs résultats dans le même ordre.
+        """
+        calls = list(calls)
+        results: List[Any] = []
+        for start in range(0, len(calls), self.batch_size):
+            chunk = calls[start:start + self.batch_size]
+            payload = [{
+                'jsonrpc': '2.0',
+                'id': i,
+                'method': 'eth_call',
+                'params': [{'to': self.address, 'data': self._functions[name].encode(args)}, 'latest']
+            } for i, (name, args) in enumerate(chunk)]
+            raw = self._send(payload)
+            results.extend(self._functions[name].decode(r) for (name, _), r in zip(chunk, raw))
+            self.calls_made += len(chunk)
+        return results
+
+    def call_many(self, fn_name: str, args_list: Iterable[Sequence]) -> List[Any]:
+        return self.call_batch((fn_name, args) for args in args_list)
@@ -0,0 +1,285 @@
+import os
+import threading
+import time
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from blockchain import Blockchain, DataSecurity
+from config import REGIONS
+
+# Type des blocs de la chaîne racine qui ancrent la tête d'une sous-chaîne
+ANCHOR_TYPE = "ancrage"
+# Sous-chaîne des enregistrements sans région connue
+DEFAULT_SHARD = "autres"
+
+
+def shard_name(region: Optional[str]) -> str:
+    """
+    Nom de répertoire ASCII d'une région (ex. 'Drâa-Tafilalet' -> 'draa-tafilalet')
+    """
+    normalized = unicodedata.normalize('NFKD', region).encode('ascii', 'ignore').decode()
+    return '-'.join(normalized.lower().replace("'", ' ').split())
+
+
+class ShardedDataSecurity:
+    """
+    Mode shardé : une sous-chaîne par région marocaine, chacune avec son
+    propre verrou, son index et son commit groupé, ce qui permet des ajouts
+    et des validations en parallèle. La tête de chaque sous-chaîne est
+    ancrée périodiquement dans une chaîne racine ; un audit régional ne lit
+    que sa sous-chaîne et ses ancres.
+
+    Expose la même interface que DataSecurity.
+    """
+    def __init__(self, storage_path: Optional[str] = None, regions: Optional[List[str]] = None,
+                 anchor_every: int = 100, batch_size: int = 1024, read_only: bool = False):
+        regions = regions or [r['value'] for r in REGIONS]
+        self.anchor_every = anchor_every
+        self.shards: Dict[str, DataSecurity] = {}
+        for region in regions + [DEFAULT_SHARD]:
+            path = os.path.join(storage_path, 'shards', shard_name(region)) if storage_path else None
+            self.shards[region] = DataSecurity(path, batch_size=batch_size, read_only=read_only)
+        self.root = Blockchain(os.path.join(storage_path, 'root') if storage_path else None, read_only=read_only)
+        self._anchor_lock = threading.Lock()
+        self._anchored_heights: Dict[str, int] = {}
+        # Position du prochain bloc de la chaîne racine à parcourir pour les ancres
+        self._anchors_scanned = 1
+        with self._anchor_lock:
+            self._refresh_anchors()
+
+    def _refresh_anchors(self):
+        """
+        Prend en compte les ancres ajoutées depuis le dernier passage, y compris
+        par les autres processus partageant la chaîne racine (sous _anchor_lock)
+        """
+        self.root.refresh()
+        for block in self.root.iter_blocks(self._anchors_scanned):
+            data = block.data
+            if data.get("type") == ANCHOR_TYPE:
+                self._anchored_heights[data["region"]] = max(
+                    data["height"], self._anchored_heights.get(data["region"], 0))
+        self._anchors_scanned = max(self._anchors_scanned, len(self.root.chain))
+
+    def shard_for(self, region: Optional[str]) -> DataSecurity:
+        return self.shards.get(region) or self.shards[DEFAULT_SHARD]
+
+    def _region_of(self, shard: DataSecurity) -> str:
+        for region, candidate in self.shards.items():
+            if candidate is shard:
+                return region
+        return DEFAULT_SHARD
+
+    # ------------------------------------------------------------------
+    # Écriture
+    # ------------------------------------------------------------------
+    def secure_data(self, data: Dict) -> str:
+        """
+        Sécurise les données dans la sous-chaîne de leur région
+        Retourne l'hash du bloc créé
+        """
+        shard = self.shard_for(data.get("region"))
+        data_hash = shard.secure_data(data)
+        self._maybe_anchor(self._region_of(shard))
+        return data_hash
+
+    def secure_batch(self, records: List[Dict]) -> List[Dict]:
+        """
+        Regroupe les enregistrements par région puis les scelle par lots de Merkle.
+        Les reçus sont retournés dans l'ordre des enregistrements.
+        """
+        by_region: Dict[str, List[int]] = {}
+        for position, record in enumerate(records):
+            region = self._region_of(self.shard_for(record.get("region")))
+            by_region.setdefault(region, []).append(position)
+
+        receipts: List[Optional[Dict]] = [None] * len(records)
+        for region, positions in by_region.items():
+            shard_receipts = self.shards[region].secure_batch([records[p] for p in positions])
+            for position, receipt in zip(positions, shard_receipts):
+                receipt["region"] = region
+                receipts[position] = receipt
+            self._maybe_anchor(region)
+        return receipts
+
+    def _maybe_anchor(self, region: str):
+        height = len(self.shards[region].blockchain.chain) - 1
+        # Pré-test sans verrou : une valeur périmée ne fait que déclencher la revérification
+        if height - self._anchored_heights.get(region, 0) < self.anchor_every:
+            return
+        with self._anchor_lock, self.root._exclusive():
+            self._refresh_anchors()
+            if height - self._anchored_heights.get(region, 0) >= self.anchor_every:
+                self._anchor([region])
+
+    def anchor(self, region: Optional[str] = None) -> List[str]:
+        """
+        Ancre dans la chaîne racine la tête des sous-chaînes qui ont avancé
+        depuis leur dernière ancre. Retourne les hash des blocs d'ancrage.
+        """
+        with self._anchor_lock, self.root._exclusive():
+            self._refresh_anchors()
+            return self._anchor([region] if region else list(self.shards))
+
+    def _anchor(self, regions: List[str]) -> List[str]:
+        # Appelé sous _anchor_lock et le verrou inter-processus de la chaîne racine
+        anchors = []
+        for name in regions:
+            blockchain = self.shards[name].blockchain
+            blockchain.refresh()
+            tip = blockchain.get_latest_block()
+            if tip.index <= self._anchored_heights.get(name, 0):
+                continue
+            anchors.append({
+                "type": ANCHOR_TYPE,
+                "region": name,
+                "height": tip.index,
+                "tip_hash": tip.hash,
+                "timestamp": time.time()
+            })
+        if not anchors:
+            return []
+        blocks = self.root.add_blocks(anchors)
+        for anchor in anchors:
+            self._anchored_heights[anchor["region"]] = anchor["height"]
+        return [block.hash for block in blocks]
+
+    # ------------------------------------------------------------------
+    # Vérification
+    # ------------------------------------------------------------------
+    def verify_data(self, data_hash: str) -> bool:
+        # Chaque sous-chaîne rejette un hash inconnu via son filtre de Bloom
+        return any(shard.verify_data(data_hash) for shard in self.shards.values())
+
+    def locate(self, data_hash: str, refresh: bool = True):
+        # La tête de chaîne pertinente est celle de la sous-chaîne du bloc
+        for shard in self.shards.values():
+            blockchain, position = shard.locate(data_hash, refresh)
+            if blockchain is not None:
+                return blockchain, position
+        return None, None
+
+    def verify_record(self, record: Dict, receipt: Dict) -> bool:
+        if receipt.get("region") in self.shards:
+            return self.shards[receipt["region"]].verify_record(record, receipt)
+        return any(shard.verify_record(record, receipt) for shard in self.shards.values())
+
+    def _check_anchors(self, region: str) -> Optional[int]:
+        """
+        Vérifie que chaque ancre de la région pointe vers un bloc existant
+        de sa sous-chaîne. Retourne la hauteur de la première ancre invalide.
+        """
+        chain = self.shards[region].blockchain.chain
+        for block in self.root.iter_blocks():
+            data = block.data
+            if data.get("type") != ANCHOR_TYPE or data.get("region") != region:
+                continue
+            height = data["height"]
+            if height >= len(chain) or chain[height].hash != data["tip_hash"]:
+                return height
+        return None
+
+    def _validate_shard(self, region: str, full: bool, workers: int) -> Dict:
+        report = self.shards[region].validation_report(full, workers)
+        report["region"] = region
+        report["invalid_anchor"] = self._check_anchors(region)
+        report["valid"] = report["valid"] and report["invalid_anchor"] is None
+        return report
+
+    def validation_report(self, full: bool = False, region: Optional[str] = None,
+                          workers: Optional[int] = None) -> Dict:
+        """
+        Valide les sous-chaînes en parallèle (ou une seule pour un audit
+        régional), la chaîne racine et la cohérence des ancres. `workers`
+        borne le parallélisme total : sous-chaînes validées à la fois, et
+        processus d'audit partagés entre elles en mode complet.
+        """
+        started = time.perf_counter()
+        regions = [region] if region else list(self.shards)
+        workers = workers or os.cpu_count() or 1
+        threads = min(len(regions), workers)
+        per_shard = max(1, workers // threads)
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            reports = list(executor.map(lambda name: self._validate_shard(name, full, per_shard), regions))
+        root_valid = self.root.is_chain_valid()
+
+        elapsed = time.perf_counter() - started
+        checked = sum(r["checked"] for r in reports)
+        invalid = [r for r in reports if not r["valid"]]
+        return {
+            "mode": "full" if full else "incremental",
+            "valid": root_valid and not invalid,
+            "root_valid": root_valid,
+            "first_invalid": invalid[0]["first_invalid"] if invalid else None,
+            "invalid_regions": [r["region"] for r in invalid],
+            "checked": checked,
+            "elapsed": elapsed,
+            "blocks_per_second": checked / elapsed if elapsed > 0 else float(checked),
+            "shards": reports
+        }
+
+    def is_valid(self) -> bool:
+        return self.validation_report()["valid"]
+
+    # ------------------------------------------------------------------
+    # Consultation
+    # ------------------------------------------------------------------
+    def get_history_page(self, cursor: Optional[Dict[str, int]] = None, limit: int = 20,
+                         record_type: Optional[str] = None, since: Optional[float] = None,
+                         until: Optional[float] = None, region: Optional[str] = None) -> Dict:
+        """
+        Historique paginé, du plus récent au plus ancien. Pour une région,
+        seule sa sous-chaîne est lue ; sinon les pages des sous-chaînes sont
+        fusionnées par horodatage. Le curseur associe à chaque région la
+        position du prochain bloc à lire (-1 : sous-chaîne épuisée).
+        """
+        cursor = dict(cursor or {})
+        regions = [region] if region else list(self.shards)
+        pages = {}
+        for name in regions:
+            if cursor.get(name) == -1:
+                continue
+            pages[name] = self.shards[name].get_history_page(cursor.get(name), limit, record_type, since, until)
+
+        merged = sorted(
+            ((item["timestamp"], name, item) for name, page in pages.items() for item in page["items"]),
+            key=lambda entry: entry[0],
+            reverse=True
+        )[:limit]
+        consumed: Dict[str, int] = {}
+        items = []
+        for _, name, item in merged:
+            consumed[name] = consumed.get(name, 0) + 1
+            items.append(dict(item, region=name))
+
+        for name, page in pages.items():
+            taken = consumed.get(name, 0)
+            if taken == len(page["items"]):
+                cursor[name] = -1 if page["next_cursor"] is None else page["next_cursor"]
+            elif taken:
+                cursor[name] = page["items"][taken - 1]["index"] - 1
+
+        exhausted = all(cursor.get(name) == -1 for name in regions)
+        return {"items": items, "next_cursor": None if exhausted else cursor}
+
+    def get_data_history(self) -> List[Dict]:
+        history = []
+        for shard in self.shards.values():
+            history.extend(shard.get_data_history())
+        return history
+
+    def index_stats(self) -> Dict[str, int]:
+        stats: Dict[str, int] = {}
+        for shard in self.shards.values():
+            for key, value in shard.index_stats().items():
+                if key != 'bloom_hashes':
+                    stats[key] = stats.get(key, 0) + value
+        return stats
+
+    def write_snapshot(self) -> List[Optional[str]]:
+        return [shard.write_snapshot() for shard in self.shards.values()] + [self.root.write_snapshot()]
+
+    def close(self):
+        for shard in self.shards.values():
+            shard.blockchain.close()
+        self.root.close()
@@ -1,10 +1,26 @@
+import os
+import shutil
+import tempfile
 import unittest
+
+# Base et chaîne des tests dans un répertoire temporaire, fixé avant d'importer config
+REPERTOIRE_TESTS = tempfile.mkdtemp()
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(REPERTOIRE_TESTS, 'tracabilite_agricole.db')
+os.environ['BLOCKCHAIN_STORAGE_PATH'] = os.path.join(REPERTOIRE_TESTS, 'blockchain_data')
+
+def tearDownModule():
+    shutil.rmtree(REPERTOIRE_TESTS, ignore_errors=True)
+
 from flask import Flask
 from dashboard import app
 from auth import User, login, register, logout
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from config import Config
+from blockchain import Blockchain, DataSecurity
+from chain_store import SegmentStore
+from sharded_chain import ShardedDataSecurity
+import threading
 
 class TestConfig(Config):
     TESTING = True
@@ -88,5 +104,1032 @@ class TestAuth(unittest.TestCase):
         logout()
         self.assertFalse(is_admin())
 
+class TestSegmentStore(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_chain_reopens_from_disk(self):
+        blockchain = Blockchain(self.path)
+        block = blockchain.add_block({'type': 'producteur', 'nom': 'Ferme Atlas'})
+        blockchain.close()
+
+        blockchain = Blockchain(self.path)
+        self.assertEqual(len(blockchain.chain), 2)
+        self.assertEqual(blockchain.chain[1].hash, block.hash)
+        self.assertTrue(blockchain.is_chain_valid())
+
+    def test_shared_storage_between_workers(self):
+        worker_a = DataSecurity(self.path)
+        worker_b = DataSecurity(self.path)
+        hash_a = worker_a.secure_data({'type': 'producteur', 'worker': 'a'})
+        hash_b = worker_b.secure_data({'type': 'producteur', 'worker': 'b'})
+
+        self.assertTrue(worker_b.verify_data(hash_a))
+        self.assertTrue(worker_a.verify_data(hash_b))
+        self.assertEqual(worker_b.blockchain.chain[2].previous_hash, hash_a)
+        self.assertTrue(worker_a.is_valid())
+        worker_a.blockchain.close()
+        worker_b.blockchain.close()
+
+    def test_snapshot_restore(self):
+        blockchain = Blockchain(self.path)
+        hashes = [block.hash for block in blockchain.add_blocks([{'i': i} for i in range(50)])]
+        self.assertTrue(blockchain.is_chain_valid())
+        self.assertIsNotNone(blockchain.write_snapshot())
+        late_hash = blockchain.add_block({'i': 50}).hash
+        blockchain.close()
+
+        blockchain = Blockchain(self.path)
+        self.assertEqual(blockchain.hash_index.snapshot.height, 51)
+        self.assertEqual(blockchain.validator.verified_height, 50)
+        self.assertEqual(blockchain.find_block_index(hashes[10]), 11)
+        self.assertEqual(blockchain.find_block_index(late_hash), 51)
+        blockchain.close()
+
+    def test_torn_tail_recovery(self):
+        store = SegmentStore(self.path, blocks_per_segment=4)
+        for i in range(10):
+            store.append({'i': i})
+        store.close()
+
+        # Simuler un crash au milieu d'une écriture
+        with open(os.path.join(self.path, 'segment-00000002.log'), 'ab') as f:
+            f.write(b'\x10\x00\x00')
+        with open(os.path.join(self.path, 'segment-00000002.idx'), 'ab') as f:
+            f.write(b'\x01')
+
+        store = SegmentStore(self.path, blocks_per_segment=4)
+        self.assertEqual(len(store), 10)
+        self.assertEqual(store.get(9), {'i': 9})
+        self.assertEqual(store.append({'i': 10}), 10)
+        store.close()
+
+class TestDataSecurity(unittest.TestCase):
+    def test_verify_data_uses_hash_index(self):
+        data_security = DataSecurity()
+        data_hash = data_security.secure_data({'type': 'produit', 'nom': 'Olives'})
+        self.assertTrue(data_security.verify_data(data_hash))
+        self.assertFalse(data_security.verify_data('0' * 64))
+        self.assertFalse(data_security.verify_data('hash-invalide'))
+        self.assertEqual(data_security.index_stats()['entries'], 2)
+
+    def test_concurrent_secure_data(self):
+        data_security = DataSecurity()
+        hashes = []
+
+        def writer(n):
+            for i in range(50):
+                hashes.append(data_security.secure_data({'type': 'produit', 'writer': n, 'i': i}))
+
+        threads = [threading.Thread(target=writer, args=(n,)) for n in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        chain = data_security.blockchain.chain
+        self.assertEqual(len(chain), 401)
+        self.assertEqual(len({block.previous_hash for block in chain}), 401)
+        self.assertTrue(all(data_security.verify_data(h) for h in hashes))
+        self.assertTrue(data_security.is_valid())
+
+class TestHashIndex(unittest.TestCase):
+    def test_bloom_grows_without_rehashing(self):
+        import hashlib
+        from chain_index import HashIndex
+
+        index = HashIndex(capacity=64)
+        hashes = [hashlib.sha256(str(i).encode()).hexdigest() for i in range(1000)]
+        index.add(hashes[0], 0)
+        first_stage = index.bloom.stages[0]
+        bits = bytes(first_stage.bits)
+        for position, data_hash in enumerate(hashes[1:], 1):
+            index.add(data_hash, position)
+
+        # Le premier filtre est conservé tel quel une fois plein
+        self.assertIs(index.bloom.stages[0], first_stage)
+        self.assertEqual(first_stage.count, 64)
+        self.assertNotEqual(bytes(first_stage.bits), bits)
+        self.assertGreater(len(index.bloom.stages), 1)
+        self.assertEqual(index.bloom.count, 1000)
+        self.assertTrue(all(index.get(h) == i for i, h in enumerate(hashes)))
+        self.assertIsNone(index.get(hashlib.sha256(b'absent').hexdigest()))
+
+    def test_replaced_snapshot_stays_readable(self):
+        import hashlib
+        from chain_index import HashIndex
+        from chain_snapshot import Snapshot, write_snapshot
+
+        path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, path)
+        index = HashIndex(path, capacity=16)
+        self.addCleanup(index.close)
+        hashes = [hashlib.sha256(str(i).encode()).hexdigest() for i in range(100)]
+
+        def snapshot(count):
+            for position in range(len(index), count):
+                index.add(hashes[position], position)
+            height, entries = index.snapshot_entries()
+            written = write_snapshot(os.path.join(path, 'snapshots'), height, hashes[height - 1], 0, None,
+                                     index.bloom, entries, keep=5)
+            index.install_snapshot(Snapshot(written))
+            return written
+
+        snapshot(60)
+        previous = index.snapshot
+        written = snapshot(100)
+        # Un lecteur qui tenait l'ancien instantané peut terminer sa lecture
+        self.assertEqual(previous.lookup(bytes.fromhex(hashes[10])), 10)
+        self.assertEqual(index.get(hashes[80]), 80)
+
+        # Les filtres successifs sont conservés dans l'instantané
+        reopened = HashIndex(path, snapshot=Snapshot(written), read_only=True)
+        self.addCleanup(reopened.close)
+        self.assertEqual(len(reopened.bloom.stages), len(index.bloom.stages))
+        self.assertGreater(len(reopened.bloom.stages), 1)
+        self.assertTrue(all(reopened.get(h) == i for i, h in enumerate(hashes)))
+
+class TestBlockVersions(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    @staticmethod
+    def v1_record(index, data, previous_hash):
+        # Bloc tel qu'écrit avant l'en-tête binaire : hash JSON du bloc complet
+        import hashlib
+        import json
+        timestamp = 1600000000.5 + index
+        block_hash = hashlib.sha256(json.dumps({
+            'index': index, 'timestamp': timestamp, 'data': data, 'previous_hash': previous_hash
+        }, sort_keys=True).encode()).hexdigest()
+        return {'index': index, 'timestamp': timestamp, 'data': data,
+                'previous_hash': previous_hash, 'hash': block_hash}
+
+    def test_round_trip(self):
+        from blockchain import Block
+        record = self.v1_record(1, {'type': 'produit', 'nom': 'Olives'}, '0' * 64)
+        v1 = Block.from_dict(record)
+        self.assertEqual(v1.version, 1)
+        self.assertEqual(v1.calculate_hash(), record['hash'])
+        self.assertEqual(Block.from_dict(v1.to_dict()).calculate_hash(), record['hash'])
+
+        v2 = Block(2, {'type': 'produit', 'nom': 'Argan'}, 1700000000.25, record['hash'])
+        copie = Block.from_dict(v2.to_dict())
+        self.assertEqual(copie.version, 2)
+        self.assertEqual(copie.data, v2.data)
+        self.assertEqual(copie.calculate_hash(), v2.hash)
+
+    def test_mixed_version_chain(self):
+        store = SegmentStore(self.path)
+        genesis = self.v1_record(0, {'message': 'Genesis Block'}, '0')
+        store.append(genesis)
+        store.append(self.v1_record(1, {'type': 'producteur', 'nom': 'Ferme Atlas'}, genesis['hash']))
+        store.close()
+
+        blockchain = Blockchain(self.path)
+        block = blockchain.add_block({'type': 'produit', 'nom': 'Argan'})
+        self.assertEqual(block.version, 2)
+        self.assertEqual([b.version for b in blockchain.chain], [1, 1, 2])
+        self.assertTrue(blockchain.is_chain_valid())
+        self.assertTrue(blockchain.audit(workers=1)['valid'])
+        blockchain.close()
+
+        # Un bloc v1 altéré sur disque est détecté
+        from blockchain import Block
+        store = SegmentStore(self.path)
+        record = store.get(1)
+        store.close()
+        record['data']['nom'] = 'Ferme falsifiée'
+        self.assertNotEqual(Block.from_dict(record).calculate_hash(), record['hash'])
+
+    def test_binary_header_hash_is_stable(self):
+        import hashlib
+        import struct
+        from blockchain import Block
+        block = Block(3, {'type': 'produit', 'nom': 'Argan', 'region': 'Souss-Massa'}, 1700000000.25, 'ab' * 32)
+        payload = b'{"nom":"Argan","region":"Souss-Massa","type":"produit"}'
+        header = struct.pack('<BQd32sI', 2, 3, 1700000000.25, bytes.fromhex('ab' * 32), len(payload))
+        self.assertEqual(block.payload, payload)
+        self.assertEqual(block.hash, hashlib.sha256(header + payload).hexdigest())
+        self.assertEqual(block.hash, 'fc9888b352536272279a113f31610db41cfc8d5d27a1fe5f3e17a43691c4bf4c')
+
+class TestHistoryPage(unittest.TestCase):
+    def test_cursor_pagination_with_type_filter(self):
+        data_security = DataSecurity()
+        for i in range(30):
+            data_security.secure_data({'type': 'producteur' if i % 3 == 0 else 'produit', 'i': i})
+
+        seen = []
+        cursor = None
+        while True:
+            page = data_security.get_history_page(cursor, limit=4, record_type='producteur')
+            seen.extend(item['data']['i'] for item in page['items'])
+            cursor = page['next_cursor']
+            if cursor is None:
+                break
+        self.assertEqual(seen, list(range(27, -1, -3)))
+
+class TestMerkleBatch(unittest.TestCase):
+    def test_batch_receipts(self):
+        data_security = DataSecurity(batch_size=4)
+        records = [{'type': 'produit', 'nom': f'Produit {i}'} for i in range(7)]
+        receipts = data_security.secure_batch(records)
+
+        self.assertEqual(len(data_security.blockchain.chain), 3)
+        for record, receipt in zip(records, receipts):
+            self.assertTrue(data_security.verify_record(record, receipt))
+        self.assertFalse(data_security.verify_record({'type': 'produit', 'nom': 'Faux'}, receipts[0]))
+
+class TestQRProof(unittest.TestCase):
+    def test_offline_verification(self):
+        from qr_proof import ProofIssuer, ProofVerifier, signing_key_from_secret, verification_key
+
+        data_security = DataSecurity()
+        data_hash = data_security.secure_data({'type': 'producteur', 'nom': 'Test', 'region': 'Souss-Massa'})
+        key = signing_key_from_secret('test')
+        proof = ProofIssuer(data_security, key).issue(data_hash)
+
+        verifier = ProofVerifier({0: verification_key(key)})
+        result = verifier.verify(proof)
+        self.assertTrue(result['valid'])
+        self.assertEqual(result['block_hash'], data_hash)
+        self.assertEqual(result['tip_height'], 1)
+        self.assertIsNone(result['payload'])
+
+        # Les données ne sont embarquées que sur demande explicite
+        with_payload = ProofIssuer(data_security, key, include_payload=True).issue(data_hash)
+        self.assertGreater(len(with_payload), len(proof))
+        result = verifier.verify(with_payload)
+        self.assertTrue(result['valid'])
+        self.assertEqual(result['block_hash'], data_hash)
+        self.assertIn('Souss-Massa', result['payload'])
+
+        tampered = proof[:-3] + ('0' if proof[-3] != '0' else '1') + proof[-2:]
+        self.assertFalse(verifier.verify(tampered)['valid'])
+        self.assertIsNone(ProofIssuer(data_security, key).issue('0' * 64))
+        # Identifiant de clé sur un octet
+        with self.assertRaises(ValueError):
+            ProofIssuer(data_security, key, key_id=256)
+
+    def test_payload_proof_for_v1_block(self):
+        from qr_proof import ProofIssuer, ProofVerifier, signing_key_from_secret, verification_key
+
+        path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, path)
+        store = SegmentStore(path)
+        genesis = TestBlockVersions.v1_record(0, {'message': 'Genesis Block'}, '0')
+        record = TestBlockVersions.v1_record(1, {'type': 'producteur', 'nom': 'Ferme Aït'}, genesis['hash'])
+        store.append(genesis)
+        store.append(record)
+        store.close()
+
+        data_security = DataSecurity(path)
+        self.addCleanup(data_security.blockchain.close)
+        key = signing_key_from_secret('test')
+        verifier = ProofVerifier({3: verification_key(key)})
+        for data_hash in (genesis['hash'], record['hash']):
+            result = verifier.verify(ProofIssuer(data_security, key, 3, include_payload=True).issue(data_hash))
+            self.assertTrue(result['valid'])
+            self.assertEqual(result['block_hash'], data_hash)
+
+class TestProductAuthentication(unittest.TestCase):
+    def test_lookup_cache_and_etag(self):
+        from app import create_app
+
+        storage = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, storage)
+        data_security = DataSecurity(storage)
+        data_hash = data_security.secure_data({'type': 'produit', 'nom': 'Argan', 'region': 'Souss-Massa'})
+        data_security.blockchain.close()
+
+        class APIConfig(Config):
+            SQLALCHEMY_DATABASE_URI = 'sqlite://'
+            BLOCKCHAIN_STORAGE_PATH = storage
+            BLOCKCHAIN_SHARDED = False
+            AUTH_REFRESH_INTERVAL = 0
+
+        def stockage():
+            return sorted((root, name, os.path.getsize(os.path.join(root, name)))
+                          for root, _, names in os.walk(storage) for name in names)
+
+        avant = stockage()
+        api = create_app(APIConfig)
+        with api.app_context():
+            from app.models import db
+            db.create_all()
+        client = api.test_client()
+        response = client.get(f'/api/authentification/{data_hash}')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json['authentique'])
+        self.assertEqual(response.json['enregistrement']['nom'], 'Argan')
+        self.assertIn('max-age', response.headers['Cache-Control'])
+
+        cached = client.get(f'/api/authentification/{data_hash}',
+                            headers={'If-None-Match': response.headers['ETag']})
+        self.assertEqual(cached.status_code, 304)
+        etag = response.headers['ETag']
+        for if_none_match in (f'"autre", W/{etag}', '*'):
+            self.assertEqual(client.get(f'/api/authentification/{data_hash}',
+                                        headers={'If-None-Match': if_none_match}).status_code, 304)
+        # Une étiquette contenant l'ETag n'est pas l'ETag
+        for if_none_match in (f'{etag}-gzip', f'"x{etag[1:]}'):
+            self.assertEqual(client.get(f'/api/authentification/{data_hash}',
+                                        headers={'If-None-Match': if_none_match}).status_code, 200)
+        self.assertEqual(client.get('/api/authentification/' + '0' * 64).status_code, 404)
+        # Schéma de l'API (sans data_hash) : identifiant inconnu, pas d'erreur SQL
+        self.assertEqual(client.get('/api/authentification/P1-X1').status_code, 404)
+        # La route n'écrit rien dans le stockage de la chaîne et voit les blocs ajoutés ensuite
+        self.assertEqual(stockage(), avant)
+        self.assertTrue(api.extensions['product_authenticator'].data_security.blockchain.read_only)
+        data_security = DataSecurity(storage)
+        nouveau = data_security.secure_data({'type': 'produit', 'nom': 'Safran', 'region': 'Souss-Massa'})
+        data_security.blockchain.close()
+        self.assertEqual(client.get(f'/api/authentification/{nouveau}').status_code, 200)
+
+    def test_refresh_rate_limited(self):
+        from unittest import mock
+        from product_authentication import ProductAuthenticator
+
+        storage = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, storage)
+        data_security = DataSecurity(storage, read_only=True)
+        self.addCleanup(data_security.blockchain.close)
+        authenticator = ProductAuthenticator(data_security, refresh_interval=3600)
+
+        # Des hash inconnus tous différents : une seule relecture du stockage
+        with mock.patch.object(data_security.blockchain, 'refresh', wraps=data_security.blockchain.refresh) as refresh:
+            for i in range(20):
+                self.assertEqual(authenticator.lookup('%064x' % i).status, 404)
+        self.assertEqual(refresh.call_count, 1)
+
+    def test_database_unavailable(self):
+        from product_authentication import ProductAuthenticator
+
+        authenticator = ProductAuthenticator(DataSecurity(), create_engine('sqlite:////inexistant/base.db'))
+        self.assertEqual(authenticator.lookup('42').status, 503)
+
+class TestBatchCaller(unittest.TestCase):
+    def test_batched_view_calls(self):
+        try:
+            from benchmarks.rpc_standin import StandInNode
+        except ImportError:
+            self.skipTest("eth-tester non installé")
+        from web3 import Web3
+        from rpc_batch import BatchCaller, BatchCallError
+
+        node = StandInNode().start()
+        self.addCleanup(node.stop)
+        node.seed(1, 2, 1)
+        contract = Web3(Web3.HTTPProvider(node.url)).eth.contract(address=node.contract.address, abi=node.abi)
+
+        caller = BatchCaller(contract, batch_size=2)
+        ids = ['P0-X0', 'P0-X1']
+        calls = [('obtenirProduit', (pid,)) for pid in ids] + [('nombreEtapes', ('P0-X1',))]
+        results = caller.call_batch(calls)
+        self.assertEqual(caller.requests_sent, 2)
+        self.assertEqual(tuple(results[1]), tuple(contract.functions.obtenirProduit('P0-X1').call()))
+        self.assertEqual(results[2], contract.functions.nombreEtapes('P0-X1').call())
+        with self.assertRaises(BatchCallError):
+            caller.call_many('obtenirProduit', [('inconnu',)])
+
+class TestAsyncOracle(unittest.TestCase):
+    def test_concurrent_streams_catch_up(self):
+        try:
+            from benchmarks.rpc_standin import StandInNode
+        except ImportError:
+            self.skipTest("eth-tester non installé")
+        import asyncio
+        import sqlite3
+        from async_oracle import AsyncContract, AsyncOracle, AsyncRPC, AsyncSQLiteWriter
+        from benchmarks.bench_async_oracle import create_database
+
+        node = StandInNode().start()
+        self.addCleanup(node.stop)
+        node.seed(2, 2, 1)
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'oracle.db')
+        create_database(path)
+
+        async def sync_twice():
+            writer = AsyncSQLiteWriter(path)
+            await writer.ensure_schema()
+            async with AsyncRPC(node.url, batch_size=3, concurrency=2) as rpc:
+                contract = AsyncContract(rpc, node.contract.address, node.abi)
+                oracle = AsyncOracle(contract, writer, window=2, fetch_concurrency=2, queue_size=1)
+                first, second = await oracle.sync(), await oracle.sync()
+            await writer.close()
+            return first, second
+
+        first, second = asyncio.run(sync_twice())
+        self.assertEqual(first, {'ProducteurAjoute': 2, 'ProduitEnregistre': 4, 'EtapeAjoutee': 4})
+        self.assertEqual(sum(second.values()), 0)
+        conn = sqlite3.connect(path)
+        self.addCleanup(conn.close)
+        self.assertEqual(conn.execute("SELECT COUNT(*) FROM produit").fetchone()[0], 4)
+        orphelins = conn.execute("SELECT COUNT(*) FROM produit WHERE producteur_id NOT IN "
+                                 "(SELECT id FROM producteur)").fetchone()[0]
+        self.assertEqual(orphelins, 0)
+
+class TestFluxEvenements(unittest.TestCase):
+    def _demarrer(self, node, confirmations=0):
+        """
+        Lance flux_evenements dans un thread sur une base SQLite neuve et
+        retourne une fonction d'attente sur une requête de comptage
+        """
+        from benchmarks.rpc_standin import CONTRACT_ARTIFACT
+        import sqlite3
+        import time
+        from unittest import mock
+        import oracle_service
+        from benchmarks.bench_async_oracle import create_database
+
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'oracle.db')
+        create_database(path)
+
+        config = mock.patch.multiple(oracle_service, WEB3_PROVIDER=node.url, CONTRACT_ADDRESS=node.contract.address,
+                                     CONTRACT_ARTIFACT=CONTRACT_ARTIFACT, SQLITE_PATH=path,
+                                     CONFIRMATIONS=confirmations)
+        config.start()
+        self.addCleanup(config.stop)
+        arret = threading.Event()
+        flux = threading.Thread(target=oracle_service.flux_evenements, kwargs={'intervalle': 0.05, 'arret': arret})
+        flux.start()
+        self.addCleanup(oracle_service.fermer_ressources)
+        self.addCleanup(flux.join)
+        self.addCleanup(arret.set)
+
+        conn = sqlite3.connect(path)
+        self.addCleanup(conn.close)
+
+        def attendre(requete, attendu):
+            limite = time.monotonic() + 10
+            while time.monotonic() < limite:
+                if conn.execute(requete).fetchone()[0] == attendu:
+                    return True
+                time.sleep(0.05)
+            return False
+        return attendre
+
+    def test_catch_up_then_stream(self):
+        try:
+            from benchmarks.rpc_standin import StandInNode
+        except ImportError:
+            self.skipTest("eth-tester non installé")
+
+        node = StandInNode().start()
+        self.addCleanup(node.stop)
+        node.seed(1, 1, 1)
+        attendre = self._demarrer(node)
+
+        # Historique rattrapé au démarrage, puis nouveaux événements reçus par le filtre
+        self.assertTrue(attendre("SELECT COUNT(*) FROM produit", 1))
+        node.transact('enregistrerProduit', 'P0-N', "Nouveau", "P0", "Souss-Massa", True)
+        node.transact('ajouterEtape', 'P0-N', "Transport", "Ali", "Agadir")
+        self.assertTrue(attendre("SELECT COUNT(*) FROM produit WHERE id = 'P0-N'", 1))
+        self.assertTrue(attendre("SELECT COUNT(*) FROM etape WHERE produit_id = 'P0-N' AND operation = 'Transport'", 1))
+        self.assertTrue(attendre("SELECT MIN(dernier_bloc) FROM sync_curseur", node.web3.eth.block_number))
+
+    def test_unconfirmed_blocks_at_startup(self):
+        try:
+            from benchmarks.rpc_standin import StandInNode
+        except ImportError:
+            self.skipTest("eth-tester non installé")
+
+        node = StandInNode().start()
+        self.addCleanup(node.stop)
+        node.seed(1, 1, 1)
+        # Trois produits dans les trois derniers blocs, pas encore confirmés au démarrage du flux
+        for i in range(3):
+            node.transact('enregistrerProduit', f'P0-A{i}', "Avant", "P0", "Souss-Massa", True)
+        attendre = self._demarrer(node, confirmations=3)
+
+        self.assertTrue(attendre("SELECT COUNT(*) FROM produit", 1))
+        node.transact('enregistrerProduit', 'P0-N', "Nouveau", "P0", "Souss-Massa", True)
+        for i in range(3):
+            node.transact('ajouterEtape', 'P0-N', f"Transport {i}", "Ali", "Agadir")
+        self.assertTrue(attendre("SELECT COUNT(*) FROM produit", 5))
+        self.assertTrue(attendre("SELECT MIN(dernier_bloc) FROM sync_curseur", node.web3.eth.block_number - 3))
+
+    def test_reconciliation_alongside_stream(self):
+        try:
+            from benchmarks.rpc_standin import StandInNode
+        except ImportError:
+            self.skipTest("eth-tester non installé")
+        import time
+        from contextlib import contextmanager
+        from unittest import mock
+        import oracle_service
+
+        node = StandInNode().start()
+        self.addCleanup(node.stop)
+        node.seed(1, 1, 1)
+
+        # Connexions d'écriture ouvertes en même temps par le flux et la synchronisation planifiée
+        actives, maximum, verrou = [0], [0], threading.Lock()
+        get_pool = oracle_service.get_pool
+
+        class Pool:
+            @contextmanager
+            def connection(self):
+                with get_pool().connection() as conn:
+                    with verrou:
+                        actives[0] += 1
+                        maximum[0] = max(maximum[0], actives[0])
+                    try:
+                        yield conn
+                    finally:
+                        with verrou:
+                            actives[0] -= 1
+
+        patch = mock.patch.object(oracle_service, 'get_pool', Pool)
+        patch.start()
+        self.addCleanup(patch.stop)
+        attendre = self._demarrer(node)
+        self.assertTrue(attendre("SELECT COUNT(*) FROM produit", 1))
+
+        arret = threading.Event()
+
+        def reconcilier():
+            while not arret.is_set():
+                oracle_service.synchroniser_blockchain()
+                time.sleep(0.01)
+
+        reconciliation = threading.Thread(target=reconcilier)
+        reconciliation.start()
+        self.addCleanup(reconciliation.join)
+        self.addCleanup(arret.set)
+        for i in range(5):
+            node.transact('ajouterEtape', 'P0-X0', f"Transport {i}", "Ali", "Agadir")
+        self.assertTrue(attendre("SELECT COUNT(*) FROM etape WHERE produit_id = 'P0-X0'", 7))
+        self.assertEqual(maximum[0], 1)
+
+class TestApiSync(unittest.TestCase):
+    def _client(self, node):
+        """
+        Application branchée sur `node` avec une base SQLite neuve
+        """
+        from benchmarks.rpc_standin import CONTRACT_ARTIFACT
+        from app import blockchain, create_app
+        from app.models import db
+
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        artefact = CONTRACT_ARTIFACT
+
+        class SyncConfig(Config):
+            SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(directory, 'api.db')
+            WEB3_PROVIDER = node.url
+            CONTRACT_ADDRESS = node.contract.address
+            CONTRACT_ARTIFACT = artefact
+            CONFIRMATIONS = 0
+
+        api = create_app(SyncConfig)
+        with api.app_context():
+            db.create_all()
+        blockchain.fermer_ressources()
+        self.addCleanup(blockchain.fermer_ressources)
+        return api, api.test_client()
+
+    def test_sync_resumes_from_cursor(self):
+        try:
+            from benchmarks.rpc_standin import StandInNode
+        except ImportError:
+            self.skipTest("eth-tester non installé")
+        from app.models import Etape, Produit, SyncCurseur
+
+        node = StandInNode().start()
+        self.addCleanup(node.stop)
+        node.seed(1, 2, 1)
+        api, client = self._client(node)
+
+        def etat():
+            with api.app_context():
+                return (Produit.query.count(), Etape.query.count(),
+                        {c.dernier_bloc for c in SyncCurseur.query.all()})
+
+        self.assertEqual(client.get('/api/sync').status_code, 200)
+        self.assertEqual(etat(), (2, 4, {node.web3.eth.block_number}))
+
+        node.transact('enregistrerProduit', 'P0-N', "Nouveau", "P0", "Souss-Massa", True)
+        node.transact('ajouterEtape', 'P0-X0', "Transport", "Ali", "Agadir")
+        self.assertEqual(client.get('/api/sync').status_code, 200)
+        self.assertEqual(etat(), (3, 6, {node.web3.eth.block_number}))
+        with api.app_context():
+            transport = Etape.query.filter_by(produit_id='P0-X0', operation='Transport').one()
+            self.assertEqual(transport.lieu, 'Agadir')
+
+        # Rien de nouveau : aucun journal relu
+        self.assertIn('Aucun bloc', client.get('/api/sync').json['message'])
+
+    def test_reorg_rolled_back(self):
+        try:
+            from benchmarks.rpc_standin import StandInNode
+        except ImportError:
+            self.skipTest("eth-tester non installé")
+        from app.models import Etape, Produit, SyncBloc
+
+        node = StandInNode().start()
+        self.addCleanup(node.stop)
+        node.seed(1, 1, 0)
+        api, client = self._client(node)
+        self.assertEqual(client.get('/api/sync').status_code, 200)
+
+        testeur = node.provider.ethereum_tester
+        avant = testeur.take_snapshot()
+        node.transact('enregistrerProduit', 'P0-O', "Orphelin", "P0", "Souss-Massa", True)
+        node.transact('ajouterEtape', 'P0-O', "Transport", "Ali", "Agadir")
+        self.assertEqual(client.get('/api/sync').status_code, 200)
+        with api.app_context():
+            self.assertEqual(SyncBloc.query.get(node.web3.eth.block_number).hash,
+                             '0x' + bytes(node.web3.eth.get_block('latest')['hash']).hex())
+
+        # Réorganisation : les deux blocs sont remplacés par une autre branche, plus longue
+        testeur.revert_to_snapshot(avant)
+        node.transact('enregistrerProduit', 'P0-N', "Nouveau", "P0", "Souss-Massa", True)
+        node.transact('ajouterEtape', 'P0-X0', "Tri", "Sara", "Agadir")
+        node.transact('ajouterEtape', 'P0-X0', "Transport", "Ali", "Agadir")
+        self.assertEqual(client.get('/api/sync').status_code, 200)
+        with api.app_context():
+            self.assertEqual(sorted(p.id for p in Produit.query.all()), ['P0-N', 'P0-X0'])
+            self.assertEqual(Etape.query.filter_by(produit_id='P0-O').count(), 0)
+            self.assertEqual([e.operation for e in Etape.query.filter_by(produit_id='P0-X0').order_by(Etape.id)],
+                             ['Recolte', 'Tri', 'Transport'])
+
+class TestBulkUpsert(unittest.TestCase):
+    def test_sqlite_duplicates_ignored(self):
+        import sqlite3
+        from datetime import datetime
+        from bulk_upsert import writer_for
+
+        conn = sqlite3.connect(':memory:')
+        conn.execute("CREATE TABLE etape (id INTEGER PRIMARY KEY, produit_id TEXT, date TIMESTAMP, "
+                     "operation TEXT, operateur TEXT, lieu TEXT, temperature FLOAT, humidite FLOAT)")
+        writer = writer_for(conn)
+        writer.ensure_schema()
+
+        columns = ('produit_id', 'date', 'operation', 'operateur', 'lieu', 'temperature', 'humidite',
+                   'bloc', 'bloc_hash', 'tx_hash', 'log_index')
+        date = datetime(2024, 1, 1)
+        # Deux opérations identiques issues de logs distincts restent deux lignes
+        rows = [('X1', date, 'Récolte', 'Ali', 'Agadir', 25.0, 60.0, 1, '0xb1', '0xt1', 0),
+                ('X1', date, 'Récolte', 'Ali', 'Agadir', 25.0, 60.0, 1, '0xb1', '0xt2', 1),
+                ('X2', date, 'Récolte', 'Ali', 'Agadir', 25.0, 60.0, 1, '0xb1', '0xt1', 0)]
+        self.assertEqual(writer.upsert('etape', columns, rows), 2)
+        self.assertEqual(writer.upsert('etape', columns, rows), 0)
+        self.assertEqual(writer.existing('etape', 'produit_id', ['X1', 'X3']), {'X1'})
+        self.assertIn('sqlite', writer.report()[0])
+
+class TestJournalEvenements(unittest.TestCase):
+    @staticmethod
+    def _event(produit, bloc, log_index):
+        return {'args': {'idProduit': produit}, 'blockNumber': bloc, 'blockHash': f'0xb{bloc}',
+                'transactionHash': f'0xt{bloc}{log_index}', 'logIndex': log_index}
+
+    def test_step_index_from_log_order(self):
+        from journal_evenements import cle, indexer_etapes
+
+        recolte = cle(self._event('P1', 1, 0))
+        deja = self._event('P1', 2, 0)
+        events = [self._event('P1', 3, 1), deja, self._event('P1', 3, 0), self._event('P2', 3, 2)]
+        nouvelles = indexer_etapes({'P1': [recolte, cle(deja)], 'P2': []}, events)
+        self.assertEqual([(e['args']['idProduit'], e['logIndex'], i) for e, i in nouvelles],
+                         [('P1', 0, 2), ('P1', 1, 3), ('P2', 2, 0)])
+
+    def test_legacy_steps_counted_first(self):
+        import sqlite3
+        from bulk_upsert import writer_for
+        from journal_evenements import cle, indexer_etapes
+        import oracle_service
+
+        # Étapes écrites avant l'identité par log : colonnes ajoutées restées NULL
+        conn = sqlite3.connect(':memory:')
+        conn.execute("CREATE TABLE etape (id INTEGER PRIMARY KEY, produit_id TEXT, operation TEXT)")
+        conn.executemany("INSERT INTO etape (produit_id, operation) VALUES (?, ?)",
+                         [('P1', 'Recolte'), ('P1', 'Lavage'), ('P2', 'Recolte')])
+        writer = writer_for(conn)
+        writer.ensure_schema()
+        deja = self._event('P1', 5, 0)
+        conn.execute("INSERT INTO etape (produit_id, operation, bloc, bloc_hash, tx_hash, log_index) "
+                     "VALUES ('P1', 'Tri', ?, ?, ?, ?)", cle(deja))
+
+        connues = oracle_service.etapes_connues(writer, ['P1', 'P2', 'P3'])
+        self.assertEqual(len(connues['P1']), 3)
+        events = [self._event('P1', 7, 0), deja, self._event('P2', 7, 1)]
+        nouvelles = indexer_etapes(connues, events)
+        self.assertEqual([(e['args']['idProduit'], i) for e, i in nouvelles], [('P1', 3), ('P2', 1)])
+
+    def test_fork_point_and_rollback(self):
+        import sqlite3
+        from bulk_upsert import writer_for
+        from journal_evenements import point_de_fork
+        import oracle_service
+
+        chaine = {1: '0xa', 2: '0xb', 3: '0xc2'}
+        hash_chaine = lambda numeros: {n: chaine[n] for n in numeros}
+        self.assertIsNone(point_de_fork([(1, '0xa'), (3, '0xc2')], hash_chaine))
+        self.assertEqual(point_de_fork([(1, '0xa'), (2, '0xb'), (3, '0xc')], hash_chaine), 2)
+
+        conn = sqlite3.connect(':memory:')
+        conn.execute("CREATE TABLE producteur (id TEXT PRIMARY KEY, nom TEXT, region TEXT, est_verifie BOOLEAN)")
+        conn.execute("CREATE TABLE produit (id TEXT PRIMARY KEY, nom TEXT)")
+        conn.execute("CREATE TABLE etape (id INTEGER PRIMARY KEY, produit_id TEXT)")
+        writer = writer_for(conn)
+        oracle_service.init_curseurs(writer)
+        writer.ensure_schema()
+        writer.upsert('producteur', ('id', 'nom', 'region', 'est_verifie', 'bloc'),
+                      [('A', 'A', 'Souss', 1, 2), ('B', 'B', 'Souss', 1, 3)])
+        for numero in (2, 3):
+            oracle_service.enregistrer_bloc(writer, numero, chaine[numero])
+        oracle_service.avancer_curseur(writer, 'ProducteurAjoute', 3)
+
+        oracle_service.annuler_blocs(writer, 2)
+        self.assertEqual([r[0] for r in conn.execute("SELECT id FROM producteur")], ['A'])
+        self.assertEqual(oracle_service.lire_curseur(writer, 'ProducteurAjoute'), 2)
+        self.assertEqual(oracle_service.blocs_enregistres(writer), [(2, '0xb')])
+
+class TestRecuperationJournaux(unittest.TestCase):
+    def test_split_on_limit_and_merge_in_chain_order(self):
+        from recuperation_journaux import RecuperateurJournaux
+
+        # Deux journaux par bloc ; le nœud refuse plus de 10 résultats par requête
+        plages = []
+        def get_logs(debut, fin):
+            plages.append((debut, fin))
+            if 2 * (fin - debut + 1) > 10:
+                raise ValueError({'code': -32005, 'message': 'query returned more than 10 results'})
+            return [{'blockNumber': hex(bloc), 'logIndex': hex(i)} for bloc in range(fin, debut - 1, -1)
+                    for i in (1, 0)]
+
+        recuperateur = RecuperateurJournaux(fenetre=40, workers=4)
+        logs = recuperateur.recuperer(get_logs, 3, 102)
+        self.assertEqual([(int(l['blockNumber'], 16), int(l['logIndex'], 16)) for l in logs],
+                         [(bloc, i) for bloc in range(3, 103) for i in (0, 1)])
+        self.assertGreater(recuperateur.stats()['reductions'], 0)
+        self.assertLessEqual(recuperateur.fenetre, 10)
+
+        def en_panne(debut, fin):
+            raise ValueError({'code': -32000, 'message': 'header not found'})
+        with self.assertRaises(ValueError):
+            recuperateur.recuperer(en_panne, 0, 10)
+
+class TestConnectionPool(unittest.TestCase):
+    def test_reuse_and_bounded_wait(self):
+        import sqlite3
+        from db_pool import ConnectionPool, PoolTimeout
+
+        pool = ConnectionPool(lambda: sqlite3.connect(':memory:', check_same_thread=False),
+                              minconn=1, maxconn=2, timeout=0.05)
+        self.addCleanup(pool.closeall)
+        with pool.connection() as first:
+            pass
+        with pool.connection() as again:
+            self.assertIs(again, first)
+
+        held = [pool.getconn(), pool.getconn()]
+        with self.assertRaises(PoolTimeout):
+            pool.getconn()
+        threading.Timer(0.01, pool.putconn, args=(held.pop(),)).start()
+        pool.timeout = 1
+        held.append(pool.getconn())
+        for conn in held:
+            pool.putconn(conn)
+
+        stats = pool.stats()
+        self.assertEqual(stats['created'], 2)
+        self.assertEqual(stats['in_use'], 0)
+        self.assertEqual(stats['waits'], 1)
+        self.assertEqual(stats['timeouts'], 1)
+        self.assertGreater(stats['wait_max'], 0)
+
+class TestPrixHistorique(unittest.TestCase):
+    def test_ticks_and_rollups(self):
+        import sqlite3
+        from datetime import datetime, timedelta
+        from prix_historique import PrixHistorique
+
+        conn = sqlite3.connect(':memory:')
+        self.addCleanup(conn.close)
+        conn.execute("CREATE TABLE produit (id VARCHAR(64) PRIMARY KEY, prix_marche FLOAT)")
+        conn.executemany("INSERT INTO produit (id) VALUES (?)", [('X1',), ('X2',)])
+        historique = PrixHistorique.pour_connexion(conn)
+        historique.creer_schema(conn)
+
+        origine = datetime(2025, 3, 1, 10, 0)
+        for minutes, prix in [(0, 12.0), (0.5, 15.0), (1, 9.0), (70, 11.0)]:
+            historique.enregistrer_tick(conn, origine + timedelta(minutes=minutes), prix=[('X1', prix)])
+        historique.enregistrer_tick(conn, origine + timedelta(minutes=71))
+        conn.commit()
+
+        heure = historique.historique(conn, 'X1', origine, origine + timedelta(hours=2), pas=3600)
+        self.assertEqual(heure['resolution'], 'heure')
+        premiere = heure['points'][0]
+        self.assertEqual((premiere['ouverture'], premiere['haut'], premiere['bas'], premiere['cloture']),
+                         (12.0, 15.0, 9.0, 9.0))
+        self.assertEqual(len(heure['points']), 2)
+
+        minute = historique.historique(conn, 'X1', origine, origine + timedelta(minutes=2), pas=60)
+        self.assertEqual([p['cloture'] for p in minute['points']], [15.0, 9.0])
+        self.assertEqual(historique.historique(conn, 'X1', origine, origine + timedelta(days=365))['resolution'],
+                         'heure')
+        self.assertEqual(len(historique.historique(conn, 'X1', origine, origine + timedelta(hours=2),
+                                                   pas=1)['points']), 5)
+
+        dernier = conn.execute("SELECT prix FROM prix_historique WHERE produit_id = 'X1' ORDER BY ts DESC").fetchone()
+        self.assertEqual(conn.execute("SELECT prix_marche FROM produit WHERE id = 'X1'").fetchone(), dernier)
+
+    def test_tick_at_recorded_instant(self):
+        import sqlite3
+        from datetime import datetime
+        from prix_historique import PrixHistorique
+
+        conn = sqlite3.connect(':memory:')
+        self.addCleanup(conn.close)
+        conn.execute("CREATE TABLE produit (id VARCHAR(64) PRIMARY KEY, prix_marche FLOAT)")
+        conn.execute("INSERT INTO produit (id) VALUES ('X1')")
+        historique = PrixHistorique.pour_connexion(conn)
+        historique.creer_schema(conn)
+
+        # Deux ticks au même instant : chacun n'est agrégé qu'une fois
+        ts = datetime(2025, 3, 1, 10, 0)
+        historique.enregistrer_tick(conn, ts, prix=[('X1', 12.0)])
+        historique.enregistrer_tick(conn, ts, prix=[('X1', 15.0)])
+        conn.commit()
+
+        rows = conn.execute("SELECT resolution, haut, bas, nb FROM prix_ohlc ORDER BY resolution").fetchall()
+        self.assertEqual(rows, [('heure', 15.0, 12.0, 2), ('jour', 15.0, 12.0, 2), ('minute', 15.0, 12.0, 2)])
+        self.assertEqual(conn.execute("SELECT prix_marche FROM produit").fetchone(), (15.0,))
+
+class TestShardedDataSecurity(unittest.TestCase):
+    def test_region_shards_and_anchors(self):
+        data_security = ShardedDataSecurity(anchor_every=2)
+        hashes = [data_security.secure_data({'type': 'produit', 'region': region, 'i': i})
+                  for i, region in enumerate(['Souss-Massa', 'Fès-Meknès', 'Souss-Massa', 'Inconnue'])]
+
+        self.assertTrue(all(data_security.verify_data(h) for h in hashes))
+        self.assertEqual(len(data_security.shards['Souss-Massa'].blockchain.chain), 3)
+        self.assertEqual(len(data_security.shards['autres'].blockchain.chain), 2)
+        self.assertEqual(len(data_security.root.chain), 2)
+
+        report = data_security.validation_report(region='Souss-Massa')
+        self.assertTrue(report['valid'])
+        self.assertEqual(report['checked'], 2)
+
+    def test_anchors_shared_between_processes(self):
+        path = tempfile.mkdtemp()
+        try:
+            worker_a = ShardedDataSecurity(path, regions=['Souss-Massa'], anchor_every=2)
+            worker_b = ShardedDataSecurity(path, regions=['Souss-Massa'], anchor_every=2)
+            for i in range(2):
+                worker_a.secure_data({'type': 'produit', 'region': 'Souss-Massa', 'i': i})
+            # worker_b n'a pas vu l'ancre de worker_a : il la relit avant de décider
+            worker_b.secure_data({'type': 'produit', 'region': 'Souss-Massa', 'i': 2})
+
+            worker_b.root.refresh()
+            anchors = [block.data['height'] for block in worker_b.root.iter_blocks()]
+            self.assertEqual(anchors, [2])
+            report = worker_b.validation_report(full=True, workers=2)
+            self.assertTrue(report['valid'])
+            worker_a.close()
+            worker_b.close()
+        finally:
+            shutil.rmtree(path)
+
+class TestReconciliation(unittest.TestCase):
+    def test_orphans_unreferenced_and_duplicates(self):
+        from sqlalchemy import text
+        from reconcile import reconcile
+
+        data_security = DataSecurity()
+        hashes = [data_security.secure_data({'type': 'produit', 'i': i}) for i in range(4)]
+        engine = create_engine('sqlite:///:memory:')
+        with engine.begin() as conn:
+            conn.execute(text('CREATE TABLE producteur (id INTEGER PRIMARY KEY, data_hash VARCHAR(64))'))
+            conn.execute(text('CREATE TABLE produit (id INTEGER PRIMARY KEY, data_hash VARCHAR(64))'))
+            conn.execute(text('INSERT INTO producteur VALUES (1, :a), (2, :b)'), {'a': hashes[0], 'b': 'f' * 64})
+            conn.execute(text('INSERT INTO produit VALUES (1, :a), (2, :c)'), {'a': hashes[0], 'c': hashes[1]})
+
+        rapport = reconcile(engine, data_security=data_security, chunk_size=1)
+        self.assertEqual(rapport['rows_checked'], 4)
+        self.assertEqual(rapport['orphaned_rows'], 1)
+        self.assertEqual(rapport['unreferenced_blocks'], 2)
+        self.assertEqual(rapport['duplicated_hashes'], 1)
+
+class TestReplay(unittest.TestCase):
+    def test_rebuild_keeps_ids_and_is_idempotent(self):
+        from sqlalchemy import text
+        from replay import rebuild_database
+
+        path = tempfile.mkdtemp()
+        try:
+            data_security = DataSecurity(os.path.join(path, 'chaine'))
+            # Bloc ancien sans identifiant, puis identifiants inscrits avec un trou (insertion 3 échouée)
+            data_security.secure_data({'type': 'producteur', 'nom': 'Ferme Atlas', 'region': 'Souss-Massa'})
+            for producteur_id in (2, 4):
+                data_security.secure_data({'type': 'producteur', 'id': producteur_id,
+                                           'nom': f'Ferme {producteur_id}', 'region': 'Souss-Massa'})
+            data_security.secure_data({'type': 'produit', 'nom': 'Argan', 'region': 'Souss-Massa',
+                                       'qualite_score': 9.0, 'producteur_id': 4, 'est_bio': True})
+            data_security.secure_data({'type': 'produit', 'id': 7, 'nom': 'Safran', 'region': 'Souss-Massa',
+                                       'qualite_score': 8.0, 'producteur_id': 2, 'est_bio': False})
+            data_security.blockchain.close()
+
+            engine = create_engine('sqlite:///' + os.path.join(path, 'restauration.db'))
+            rapport = rebuild_database(engine, os.path.join(path, 'chaine'), workers=1)
+            self.assertEqual((rapport['producteurs'], rapport['produits']), (3, 2))
+
+            def keys():
+                with engine.connect() as conn:
+                    return (conn.execute(text('SELECT id, data_hash FROM producteur ORDER BY id')).fetchall(),
+                            conn.execute(text('SELECT id, producteur_id, data_hash FROM produit ORDER BY id')).fetchall())
+
+            producteurs, produits = keys()
+            self.assertEqual([row[0] for row in producteurs], [1, 2, 4])
+            self.assertEqual([row[:2] for row in produits], [(1, 4), (7, 2)])
+
+            # Un second rejeu sans --truncate ne change rien
+            rapport = rebuild_database(engine, os.path.join(path, 'chaine'), workers=1)
+            self.assertEqual((rapport['producteurs'], rapport['produits'], rapport['deja_presents']), (0, 0, 5))
+            self.assertEqual(keys(), (producteurs, produits))
+            engine.dispose()
+        finally:
+            shutil.rmtree(path)
+
+class TestChainReplay(unittest.TestCase):
+    def test_record_then_replay_offline(self):
+        try:
+            from benchmarks.rpc_standin import StandInNode
+        except ImportError:
+            self.skipTest("eth-tester non installé")
+        from web3 import Web3
+        from benchmarks.chain_replay import Enregistrement, ReplayNode, enregistrer
+        from journal_evenements import cle
+        from rpc_batch import BatchCallError, BatchCaller, contract_events, log_topic
+
+        node = StandInNode().start()
+        self.addCleanup(node.stop)
+        node.seed(2, 2, 2)
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        chemin = os.path.join(directory, 'historique.json.gz')
+        enregistrer(node.url, node.contract.address, node.abi, chemin)
+
+        decodeurs = {decodeur.topic: decodeur for decodeur in contract_events(node.abi).values()}
+        produits = [f"P{p}-X{q}" for p in range(2) for q in range(2)]
+        appels = ([('obtenirProducteur', (f"P{p}",)) for p in range(2)]
+                  + [('obtenirProduit', (pid,)) for pid in produits]
+                  + [('nombreEtapes', (pid,)) for pid in produits]
+                  + [('obtenirEtape', (pid, k)) for pid in produits for k in range(3)])
+
+        def reponses(url):
+            web3 = Web3(Web3.HTTPProvider(url))
+            contract = web3.eth.contract(address=node.contract.address, abi=node.abi)
+            tete = web3.eth.block_number
+            logs = web3.eth.get_logs({'address': contract.address, 'fromBlock': 0, 'toBlock': tete})
+            events = [decodeurs[log_topic(log)].decode(log) for log in logs]
+            return (tete, web3.eth.get_block(tete)['hash'],
+                    [(event['event'], event['args'], cle(event)) for event in events],
+                    BatchCaller(contract).call_batch(appels))
+
+        attendu = reponses(node.url)
+        node.stop()
+
+        # Rejeu sans le nœud : mêmes réponses que le nœud enregistré
+        replay = ReplayNode(Enregistrement.charger(chemin)).start()
+        self.addCleanup(replay.stop)
+        self.assertEqual(reponses(replay.url), attendu)
+        self.assertEqual(len(attendu[2]), 2 + 4 + 8)
+
+        # Un appel absent de l'enregistrement échoue explicitement, sans se faire passer pour un revert
+        contract = Web3(Web3.HTTPProvider(replay.url)).eth.contract(address=node.contract.address, abi=node.abi)
+        with self.assertRaisesRegex(BatchCallError, 'non enregistré'):
+            BatchCaller(contract).call_many('obtenirProduit', [('P9-X9',)])
+
+class TestChainValidator(unittest.TestCase):
+    def test_incremental_and_full_audit(self):
+        blockchain = Blockchain()
+        for i in range(20):
+            blockchain.add_block({'type': 'produit', 'i': i})
+        self.assertTrue(blockchain.is_chain_valid())
+        self.assertEqual(blockchain.validator.verified_height, 20)
+
+        blockchain.add_block({'type': 'produit', 'i': 20})
+        report = blockchain.validator.validate_incremental()
+        self.assertTrue(report['valid'])
+        self.assertEqual(report['checked'], 1)
+
+        blockchain.chain[7].data = {'type': 'produit', 'i': 'falsifié'}
+        report = blockchain.audit(workers=2)
+        self.assertFalse(report['valid'])
+        self.assertEqual(report['first_invalid'], 7)
+
 if __name__ == '__main__':
     unittest.main() 
\ No newline at end of file